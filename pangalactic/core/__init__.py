@@ -4,13 +4,6 @@ The Pan Galactic Engineering Framework (PGEF) core package.
 """
 import os
 
-# RDFLib
-from rdflib import URIRef
-
-# SqlAlchemy
-from sqlalchemy import (Boolean, Date, DateTime, Float, Integer, LargeBinary,
-                        String, Time)
-
 # ruamel_yaml
 import ruamel_yaml as yaml
 
@@ -21,33 +14,45 @@ __version__ = '4.4.dev0'
 # diagram cache (see pangalactic.node.gui.diagrams.view for more detail)
 diagramz = {}
 
-datatypes = {
-    # (is_datatype, range, functional) : Column datatype
-    (True, 'bool', True)      : Boolean,
-    (True, 'bool', False)     : set,
-    (True, 'int', True)       : Integer,  # BigInteger ?
-    (True, 'int', False)      : set,
-    (True, 'float', True)     : Float,    # ***
-                                # *** cf. sa notes about Numeric/Decimal
-    (True, 'float', False)    : set,
-    # kb.py maps xsd:base64Binary to Python 'bytes', which is here mapped to sa
-    # 'LargeBinary'.  The 'bytes' datatype is intended for data values which
-    # may be used as Python identifiers
-    (True, 'bytes', True)     : LargeBinary,
-    (True, 'str', True)       : String,
-                                # narrative -> "Text" (multi-line)
-    (True, 'str', False)      : set,
-    (True, 'date', True)      : Date,
-    (True, 'date', False)     : set,
-    (True, 'time', True)      : Time,
-    (True, 'time', False)     : set,
-    (True, 'datetime', True)  : DateTime,
-    (True, 'datetime', False) : set,
-    # TODO:  figure out what this should be for sqlalchemy automap classes ...
-    #        meanwhile, not used
-    (False, None, True)       : String,   # MAYBE!
-    (False, None, False)      : set
-    }
+# NOTE:  `datatypes` and `xsd_datatypes` (below) are built when first accessed
+# (see `__getattr__` at the end of this module) so that importing
+# pangalactic.core does not import SqlAlchemy and RDFLib -- modules that only
+# need, e.g., `names` or `parametrics` should not pay for them.
+
+def _build_datatypes():
+    """
+    Build the `datatypes` table, which maps (is_datatype, range, functional)
+    to a SqlAlchemy Column datatype (or `set`).
+    """
+    from sqlalchemy import (Boolean, Date, DateTime, Float, Integer,
+                            LargeBinary, String, Time)
+    return {
+        # (is_datatype, range, functional) : Column datatype
+        (True, 'bool', True)      : Boolean,
+        (True, 'bool', False)     : set,
+        (True, 'int', True)       : Integer,  # BigInteger ?
+        (True, 'int', False)      : set,
+        (True, 'float', True)     : Float,    # ***
+                                    # *** cf. sa notes about Numeric/Decimal
+        (True, 'float', False)    : set,
+        # kb.py maps xsd:base64Binary to Python 'bytes', which is here mapped
+        # to sa 'LargeBinary'.  The 'bytes' datatype is intended for data
+        # values which may be used as Python identifiers
+        (True, 'bytes', True)     : LargeBinary,
+        (True, 'str', True)       : String,
+                                    # narrative -> "Text" (multi-line)
+        (True, 'str', False)      : set,
+        (True, 'date', True)      : Date,
+        (True, 'date', False)     : set,
+        (True, 'time', True)      : Time,
+        (True, 'time', False)     : set,
+        (True, 'datetime', True)  : DateTime,
+        (True, 'datetime', False) : set,
+        # TODO:  figure out what this should be for sqlalchemy automap
+        #        classes ... meanwhile, not used
+        (False, None, True)       : String,   # MAYBE!
+        (False, None, False)      : set
+        }
 
 # xsd_datatypes was adapted from XSDtoPythonTypeNames in sparta.py, which is
 # the mapping used by RDFLib, too.
@@ -76,46 +81,52 @@ datatypes = {
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-xsd_datatypes = {  #  (schema->python, python->schema)  Does not validate.
-    URIRef('http://www.w3.org/2001/XMLSchema#string') : ('str', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#normalizedString') : ('str',
+def _build_xsd_datatypes():
+    """
+    Build the `xsd_datatypes` table, which maps XML Schema datatype URIs to
+    (python datatype name, python->schema function).
+    """
+    from rdflib import URIRef
+    return {  #  (schema->python, python->schema)  Does not validate.
+        URIRef('http://www.w3.org/2001/XMLSchema#string') : ('str', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#normalizedString') : ('str',
+                                                                       str),
+        # 'token' added -- maps to single-word text values
+        URIRef('http://www.w3.org/2001/XMLSchema#token') : ('str', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#language') : ('str', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#boolean') : ('bool', 
+                                                    lambda i:str(i).lower()),
+        URIRef('http://www.w3.org/2001/XMLSchema#decimal') : ('float', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#integer') : ('long', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#nonPositiveInteger') : ('int',
+                                                                         str),
+        URIRef('http://www.w3.org/2001/XMLSchema#long') : ('long', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#nonNegativeInteger') : ('int',
+                                                                         str),
+        URIRef('http://www.w3.org/2001/XMLSchema#negativeInteger') : ('int',
+                                                                      str),
+        URIRef('http://www.w3.org/2001/XMLSchema#int') : ('int', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#unsignedLong') : ('long',
                                                                    str),
-    # 'token' added -- maps to single-word text values
-    URIRef('http://www.w3.org/2001/XMLSchema#token') : ('str', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#language') : ('str', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#boolean') : ('bool', 
-                                                lambda i:str(i).lower()),
-    URIRef('http://www.w3.org/2001/XMLSchema#decimal') : ('float', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#integer') : ('long', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#nonPositiveInteger') : ('int',
-                                                                     str),
-    URIRef('http://www.w3.org/2001/XMLSchema#long') : ('long', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#nonNegativeInteger') : ('int',
-                                                                     str),
-    URIRef('http://www.w3.org/2001/XMLSchema#negativeInteger') : ('int',
-                                                                  str),
-    URIRef('http://www.w3.org/2001/XMLSchema#int') : ('int', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#unsignedLong') : ('long',
-                                                               str),
-    URIRef('http://www.w3.org/2001/XMLSchema#positiveInteger') : ('int',
-                                                                  str),
-    URIRef('http://www.w3.org/2001/XMLSchema#short') : ('int', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#unsignedInt') : ('long', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#byte') : ('bytes', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#unsignedShort') : ('int',
-                                                                str),
-    URIRef('http://www.w3.org/2001/XMLSchema#unsignedByte') : ('int', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#float') : ('float', str),
-    # doesn't do the whole range:
-    URIRef('http://www.w3.org/2001/XMLSchema#double') : ('float', str),
-    URIRef('http://www.w3.org/2001/XMLSchema#dateTime') : ('datetime', str),
-    # base64Binary modified for use in PGEF
-    URIRef('http://www.w3.org/2001/XMLSchema#base64Binary') : (
-                                        'bytes', str),
-                                        # base64.decodestring,
-                                        # lambda i:base64.encodestring(i)[:-1]),
-    URIRef('http://www.w3.org/2001/XMLSchema#anyURI') : ('str', str),
-}
+        URIRef('http://www.w3.org/2001/XMLSchema#positiveInteger') : ('int',
+                                                                      str),
+        URIRef('http://www.w3.org/2001/XMLSchema#short') : ('int', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#unsignedInt') : ('long', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#byte') : ('bytes', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#unsignedShort') : ('int',
+                                                                    str),
+        URIRef('http://www.w3.org/2001/XMLSchema#unsignedByte') : ('int', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#float') : ('float', str),
+        # doesn't do the whole range:
+        URIRef('http://www.w3.org/2001/XMLSchema#double') : ('float', str),
+        URIRef('http://www.w3.org/2001/XMLSchema#dateTime') : ('datetime', str),
+        # base64Binary modified for use in PGEF
+        URIRef('http://www.w3.org/2001/XMLSchema#base64Binary') : (
+                                            'bytes', str),
+                                            # base64.decodestring,
+                                            # lambda i:base64.encodestring(i)[:-1]),
+        URIRef('http://www.w3.org/2001/XMLSchema#anyURI') : ('str', str),
+        }
 
 # `config`, `deleted`, `prefs`, `state`, and `trash` are module-level vars for
 # application configuration, oids of deleted objects, user preferences, state,
@@ -135,6 +146,123 @@ def my_unicode_repr(self, data):
 
 yaml.representer.Representer.add_representer(str, my_unicode_repr)
 
+
+class OidSet(set):
+    """
+    A set of oids, used for `state['synced_oids']`, which can hold tens of
+    thousands of oids and is mostly used for membership tests.  It also
+    supports `append()` and `extend()` so that code written for the list it
+    replaces still works.
+
+    Attributes:
+        version (int):  incremented by every in-place change, so that
+            write_synced_oids() can skip writing an unchanged set without
+            comparing its contents
+    """
+    version = 0
+
+    def add(self, oid):
+        super().add(oid)
+        self.version += 1
+
+    def update(self, *oid_iterables):
+        super().update(*oid_iterables)
+        self.version += 1
+
+    def discard(self, oid):
+        super().discard(oid)
+        self.version += 1
+
+    def remove(self, oid):
+        super().remove(oid)
+        self.version += 1
+
+    def pop(self):
+        oid = super().pop()
+        self.version += 1
+        return oid
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+    def difference_update(self, *oid_iterables):
+        super().difference_update(*oid_iterables)
+        self.version += 1
+
+    def intersection_update(self, *oid_iterables):
+        super().intersection_update(*oid_iterables)
+        self.version += 1
+
+    def symmetric_difference_update(self, oids):
+        super().symmetric_difference_update(oids)
+        self.version += 1
+
+    def __ior__(self, oids):
+        self.update(oids)
+        return self
+
+    def __iand__(self, oids):
+        self.intersection_update(oids)
+        return self
+
+    def __isub__(self, oids):
+        self.difference_update(oids)
+        return self
+
+    def __ixor__(self, oids):
+        self.symmetric_difference_update(oids)
+        return self
+
+    def append(self, oid):
+        self.add(oid)
+
+    def extend(self, oids):
+        self.update(oids)
+
+
+# `synced_oids` is not written to the state file (it can be very large):  it
+# is written to a separate file, one oid per line, only when it has changed
+# since it was last read or written -- _synced_oids_written maps the path of
+# the file to the OidSet last read or written there and its version then.
+SYNCED_OIDS_FILE = 'synced_oids'
+_synced_oids_written = {}
+
+def _synced_oids_path(statepath):
+    return os.path.join(os.path.dirname(statepath), SYNCED_OIDS_FILE)
+
+def read_synced_oids(statepath):
+    """
+    Read `state['synced_oids']` from the synced oids file in the directory of
+    the state file (if any) and make it an OidSet.
+    """
+    # a list of synced oids in an older state file is kept
+    synced = OidSet(state.get('synced_oids') or [])
+    path = _synced_oids_path(statepath)
+    if os.path.exists(path):
+        with open(path) as f:
+            synced.update(line.strip() for line in f if line.strip())
+        _synced_oids_written[path] = (synced, synced.version)
+    state['synced_oids'] = synced
+
+def write_synced_oids(statepath):
+    """
+    Write `state['synced_oids']` to the synced oids file in the directory of
+    the state file, if it has changed since it was last read or written (any
+    value that is not an OidSet is always written).
+    """
+    synced = state.get('synced_oids')
+    if not isinstance(synced, OidSet):
+        synced = OidSet(synced or [])
+    path = _synced_oids_path(statepath)
+    written, version = _synced_oids_written.get(path, (None, None))
+    if (written is synced and version == synced.version
+        and os.path.exists(path)):
+        return
+    with open(path, 'w') as f:
+        f.write(''.join(oid + '\n' for oid in sorted(synced)))
+    _synced_oids_written[path] = (synced, synced.version)
+
 def read_config(configpath):
     """
     Read node config from the config file.
@@ -230,6 +358,7 @@ def read_state(statepath):
                 del saved_state[item]
             state.update(saved_state)
         f.close()
+    read_synced_oids(statepath)
 
 def write_state(statepath):
     """
@@ -242,9 +371,12 @@ def write_state(statepath):
     # data this is not supported by yaml)
     if state.get('sys_trees'):
         del state['sys_trees']
-    f.write(yaml.safe_dump(state, allow_unicode=True,
-                           default_flow_style=False))
+    # "synced_oids" is written to its own file
+    f.write(yaml.safe_dump({k: v for k, v in state.items()
+                            if k != 'synced_oids'},
+                           allow_unicode=True, default_flow_style=False))
     f.close()
+    write_synced_oids(statepath)
     # except:
     # raise ValueError, 'Could not write state.'
 
@@ -272,3 +404,15 @@ def write_trash(trashpath):
     # except:
     # raise ValueError, 'Could not write trash.'
 
+_lazy_tables = dict(datatypes=_build_datatypes,
+                    xsd_datatypes=_build_xsd_datatypes)
+
+def __getattr__(name):
+    """
+    Build the lazily-constructed module attributes (`datatypes` and
+    `xsd_datatypes`) when first accessed.
+    """
+    if name in _lazy_tables:
+        value = globals()[name] = _lazy_tables[name]()
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
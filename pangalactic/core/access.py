@@ -2,7 +2,10 @@
 Functions related to object access permissions
 """
 import traceback
-from pangalactic.core import orb, state, config
+from pangalactic.core import orb, state, config, OidSet
+
+# Louie: dispatcher
+from pydispatch import dispatcher
 
 
 modifiables = [
@@ -11,6 +14,177 @@ modifiables = [
         'RepresentationFile',
         'RequirementAncestry']
 
+# memo of permissions computed by get_perms() -- see _memo_key() for the keys
+_perms_memo = {}
+# the memo is simply cleared if it reaches this size
+PERMS_MEMO_SIZE = 100000
+# cache of the roles of each user:  maps user oid to _UserRoles
+_user_rolez = {}
+
+
+def clear_perms_cache(**kw):
+    """
+    Clear the memo of permissions and the cache of user roles.  This is
+    connected to the "role assignments changed" signal, which the orb sends
+    when RoleAssignments are saved or deleted; it must also be called if roles
+    or role assignments are changed by any other means.
+    """
+    _perms_memo.clear()
+    _user_rolez.clear()
+
+dispatcher.connect(clear_perms_cache, 'role assignments changed')
+
+
+class _UserRoles(object):
+    """
+    The role ids of a user, by role assignment context, and the ids of the
+    product types the user is authorized for by those roles (see
+    `orb.role_product_types`).
+
+    Attributes:
+        by_context (dict):  maps the oid of each role assignment context (None
+            for global role assignments) to the set of the user's role ids in
+            that context
+        all (set):  ids of the user's roles in any context
+        global_admin (bool):  True if the user is a global admin
+    """
+    def __init__(self, user):
+        ras = orb.search_exact(cname='RoleAssignment', assigned_to=user)
+        self.by_context = {}
+        self._types_by_context = {}
+        self._all_types = None
+        for ra in ras:
+            context_oid = getattr(ra.role_assignment_context, 'oid', None)
+            self.by_context.setdefault(context_oid, set()).add(
+                                        getattr(ra.assigned_role, 'id', None))
+        self.all = set().union(*self.by_context.values())
+        self.global_admin = any(
+            (ra.role_assignment_context is None and
+             getattr(ra.assigned_role, 'oid', None) ==
+                                    'pgefobjects:Role.Administrator')
+            for ra in ras)
+
+    def in_context(self, context):
+        """
+        Get the ids of the user's roles in the specified context.
+
+        Args:
+            context (Organization):  the role assignment context (None for
+                global role assignments)
+        """
+        return self.by_context.get(getattr(context, 'oid', None), set())
+
+    @staticmethod
+    def _product_types(role_ids):
+        rpt = [orb.role_product_types.get(r, set()) for r in role_ids]
+        return set().union(*rpt)
+
+    def product_types_in_context(self, context):
+        """
+        Get the ids of the product types for which the user is authorized by
+        their roles in the specified context.
+
+        Args:
+            context (Organization):  the role assignment context (None for
+                global role assignments)
+        """
+        context_oid = getattr(context, 'oid', None)
+        if context_oid not in self._types_by_context:
+            self._types_by_context[context_oid] = self._product_types(
+                                    self.by_context.get(context_oid, set()))
+        return self._types_by_context[context_oid]
+
+    @property
+    def all_product_types(self):
+        """
+        The ids of the product types for which the user is authorized by their
+        roles in any context.
+        """
+        if self._all_types is None:
+            self._all_types = self._product_types(self.all)
+        return self._all_types
+
+
+def get_user_roles(user):
+    """
+    Get the roles of the specified user (cached until role assignments
+    change -- see clear_perms_cache()).
+
+    Args:
+        user (Person):  the user
+
+    Returns:
+        _UserRoles
+    """
+    if user.oid not in _user_rolez:
+        _user_rolez[user.oid] = _UserRoles(user)
+    return _user_rolez[user.oid]
+
+
+class _PermsContext(object):
+    """
+    The data used by get_perms() that do not depend on the object:  these are
+    resolved once for each call to get_perms() or get_perms_bulk().
+    """
+    def __init__(self):
+        self.client = state.get('client')
+        self.server = not self.client
+        self.connected = state.get('connected')
+        self.synced_oids = state.get('synced_oids')
+        if not isinstance(self.synced_oids, set):
+            # e.g. a list assigned by older code -- convert it once
+            self.synced_oids = state['synced_oids'] = OidSet(
+                                                    self.synced_oids or [])
+        self._tbd = None
+        self._unmodifiables = None
+
+    @property
+    def TBD(self):
+        if self._tbd is None:
+            self._tbd = orb.get('pgefobjects:TBD')
+        return self._tbd
+
+    @property
+    def unmodifiables(self):
+        # Instances of these classes are refdata and cannot be modified or
+        # deleted.  NOTE that ParameterDefinition is a subclass of
+        # DataElementDefinition, so is implicitly included here.
+        if self._unmodifiables is None:
+            self._unmodifiables = tuple(orb.classes[cname] for cname in [
+                'ActivityType',
+                'DataElementDefinition',
+                'Discipline',
+                'DisciplineProductType',
+                'DisciplineRole',
+                'ModelType',
+                'ParameterContext',
+                'PortTemplate',
+                'PortType',
+                'ProductType',
+                'Role'])
+        return self._unmodifiables
+
+
+def _memo_key(obj, user, ctx):
+    """
+    Get the key of the permissions of a user relative to an object in the
+    permissions memo, or None if they should not be memoized.  The key
+    includes the 'mod_datetime' of the object (and of the related objects
+    that its permissions depend on) and the client/connected/synced state.
+    """
+    if isinstance(obj, (orb.classes['Port'], orb.classes['Flow'],
+                        orb.classes['Activity'])):
+        # perms are those of related objects, which are memoized
+        return None
+    related = ()
+    if isinstance(obj, orb.classes['Acu']):
+        related = (str(getattr(obj.assembly, 'mod_datetime', '')),
+                   str(getattr(obj.component, 'mod_datetime', '')))
+    elif isinstance(obj, orb.classes['ProjectSystemUsage']):
+        related = (str(getattr(obj.project, 'mod_datetime', '')),)
+    return (user.oid, obj.oid, str(getattr(obj, 'mod_datetime', '')),
+            related, ctx.client, ctx.connected, obj.oid in ctx.synced_oids)
+
 
 def get_perms(obj, user=None, permissive=False, debugging=False):
     """
@@ -38,6 +212,46 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
             'add models'
             'delete'
     """
+    return _get_perms(obj, user, permissive, debugging, _PermsContext())
+
+
+def get_perms_bulk(objs, user=None, permissive=False):
+    """
+    Get the permissions of the specified user relative to each of the
+    specified objects (see get_perms()).  The user's role assignments and the
+    relevant state are resolved only once.
+
+    Args:
+        objs (iterable of Identifiable):  the objects
+
+    Keyword Args:
+        user (Person):  the user object (None -> local user)
+        permissive (bool):  sets "permissive" mode
+
+    Returns:
+        dict:  maps the oid of each object to its permissions
+    """
+    ctx = _PermsContext()
+    if not user and state.get('local_user_oid'):
+        # look up the local user once (if not found, each object gets the
+        # same result it would get from get_perms())
+        user = orb.get(state['local_user_oid'])
+    return {obj.oid: _get_perms(obj, user, permissive, False, ctx)
+            for obj in objs if obj}
+
+
+def _get_perms(obj, user, permissive, debugging, ctx):
+    """
+    Get the permissions of a user relative to an object (see get_perms()).
+
+    Args:
+        obj (Identifiable):  the object
+        user (Person):  the user object (None -> local user)
+        permissive (bool):  sets "permissive" mode
+        debugging (bool):  add explanation string if debugging
+        ctx (_PermsContext):  data resolved for this call of get_perms() or
+            get_perms_bulk()
+    """
     # NOTE:  the authoritative source for data on roles and role assignments
     # will typically be an administrative service, unless the repository is
     # fulfilling the role of the administrative service.  Therefore, because
@@ -47,10 +261,8 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
     # empty or None objects have no permissions
     if not obj:
         return ['no obj']
-    if obj:
-        cname = obj.__class__.__name__
-        # orb.log.debug('  for {} object, id: {}, oid: {}'.format(cname,
-                                                        # obj.id, obj.oid))
+    # orb.log.debug('  for {} object, id: {}, oid: {}'.format(
+                  # obj.__class__.__name__, obj.id, obj.oid))
     if obj.oid == 'pgefobjects:SANDBOX':
         # anyone can "modify" the SANDBOX (i.e. add systems to it)
         return ['view', 'modify', 'object is SANDBOX']
@@ -70,10 +282,6 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
         # orb.log.debug('  perms: {}'.format(perms))
         return perms
     perms = set()
-    frozen = getattr(obj, 'frozen', False)
-    # Products can be "frozen", in which case if they would otherwise be
-    # viewable (i.e. either "public" or the user has a role in the project that
-    # owns them) then they are view-only
     # an Acu in a frozen assembly
     if (hasattr(obj, 'assembly') and
         getattr(obj.assembly, 'frozen', False)):
@@ -115,6 +323,34 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
             if debugging:
                 perms.append('no local user object found')
             return perms
+    key = None if debugging else _memo_key(obj, user, ctx)
+    if key is None:
+        return _get_user_perms(obj, user, perms, debugging, ctx)
+    if key not in _perms_memo:
+        if len(_perms_memo) >= PERMS_MEMO_SIZE:
+            _perms_memo.clear()
+        _perms_memo[key] = _get_user_perms(obj, user, perms, False, ctx)
+    return list(_perms_memo[key])
+
+
+def _get_user_perms(obj, user, perms, debugging, ctx):
+    """
+    Get the permissions of a user relative to an object, once the user is
+    known (see get_perms()).
+
+    Args:
+        obj (Identifiable):  the object
+        user (Person):  the user object
+        perms (set):  permissions determined so far
+        debugging (bool):  add explanation string if debugging
+        ctx (_PermsContext):  data resolved for this call of get_perms() or
+            get_perms_bulk()
+    """
+    cname = obj.__class__.__name__
+    # Products can be "frozen", in which case if they would otherwise be
+    # viewable (i.e. either "public" or the user has a role in the project that
+    # owns them) then they are view-only
+    frozen = getattr(obj, 'frozen', False)
     # avoid crash if PSU instances have 'project' attr of None -- this has been
     # observed, although the PSU is obviously corrupted in this case
     if (isinstance(obj, orb.classes['ProjectSystemUsage'])
@@ -123,21 +359,7 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
         perms = ['view', 'modify', 'delete', 'SANDBOX PSU']
         return perms
     # Instances of these classes are refdata and cannot be modified or deleted.
-    # NOTE that ParameterDefinition is a subclass of DataElementDefinition, so is
-    # implicitly included here.
-    unmodifiables = (
-        orb.classes['ActivityType'],
-        orb.classes['DataElementDefinition'],
-        orb.classes['Discipline'],
-        orb.classes['DisciplineProductType'],
-        orb.classes['DisciplineRole'],
-        orb.classes['ModelType'],
-        orb.classes['ParameterContext'],
-        orb.classes['PortTemplate'],
-        orb.classes['PortType'],
-        orb.classes['ProductType'],
-        orb.classes['Role'])
-    if isinstance(obj, unmodifiables):
+    if isinstance(obj, ctx.unmodifiables):
         # orb.log.debug('  *** reference data cannot be modified or deleted.')
         perms = ['view', 'ref data: view only']
         return perms
@@ -150,12 +372,14 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
     # if we get this far, we have a user_oid and a user object
 
     # set up some convenience values
-    server = not state.get('client')
-    client = state.get('client')
-    connected = state.get('connected')
+    server = ctx.server
+    client = ctx.client
+    connected = ctx.connected
     server_or_connected_client = server or (client and connected)
-    object_not_synced = obj.oid not in state.get('synced_oids', [])
-    if is_global_admin(user):
+    object_not_synced = obj.oid not in ctx.synced_oids
+    roles = get_user_roles(user)
+    role_ids = set()
+    if roles.global_admin:
         # global admin is omnipotent, except for deleting projects ...
         # orb.log.debug('  ******* user is a global admin.')
         perms = ['view', 'add docs', 'add models']
@@ -201,11 +425,10 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
         # only users with an appropriate discipline role assigned in the
         # context of the project (obj.owner) have "modify" permission
         # --------------------------------------------------------------------
+        subsystem_types = set()
         if isinstance(obj, orb.classes['ManagedObject']):
-            ras = orb.search_exact(cname='RoleAssignment',
-                                   assigned_to=user,
-                                   role_assignment_context=obj.owner)
-            role_ids = set([ra.assigned_role.id for ra in ras])
+            role_ids = roles.in_context(obj.owner)
+            subsystem_types = roles.product_types_in_context(obj.owner)
         # --------------------------------------------------------------------
         # NOTE: THIS OVERRIDES ROLE_IDS FOR NON-PROJECT (I.E. REUSABLE) ITEMS:
         # users with an appropriate discipline role in ANY context (not just
@@ -215,12 +438,11 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
         # --------------------------------------------------------------------
         if (isinstance(obj, orb.classes['HardwareProduct'])
             and not isinstance(obj.owner, orb.classes['Project'])):
-            ras = orb.search_exact(cname='RoleAssignment',
-                                   assigned_to=user)
-            role_ids = set([ra.assigned_role.id for ra in ras])
+            role_ids = roles.all
+            subsystem_types = roles.all_product_types
         # From here on, access depends on roles, product_types, and "public"
         # status of the object
-        TBD = orb.get('pgefobjects:TBD')
+        TBD = ctx.TBD
         # [1] is the object a Product?
         if isinstance(obj, orb.classes['Product']):
             # orb.log.debug('  - object is a Product ...')
@@ -230,12 +452,6 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
             # orb.log.debug('  user has roles: {}'.format(role_ids))
             if isinstance(obj, orb.classes['HardwareProduct']):
                 # permissions determined by product_type only apply to HW
-                subsystem_types = set()
-                if role_ids:
-                    rpt = [orb.role_product_types.get(r, set())
-                           for r in role_ids]
-                    if rpt:
-                        subsystem_types = set.union(*rpt)
                 # orb.log.debug('  user is authorized for subsystem types:')
                 # orb.log.debug('  {}'.format(subsystem_types))
                 pt_id = getattr(obj.product_type, 'id', 'unknown')
@@ -306,17 +522,12 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
             if not obj.assembly.owner:
                 # orb.log.debug('    assmb. owner not specified -- view only!')
                 return ['view']
-            ras = orb.search_exact(cname='RoleAssignment',
-                                   assigned_to=user,
-                                   role_assignment_context=obj.assembly.owner)
-            role_ids = set([ra.assigned_role.id for ra in ras])
+            role_ids = roles.in_context(obj.assembly.owner)
             # orb.log.debug('    + assigned roles of user "{}" on {}:'.format(
                                             # user.id, obj.assembly.owner.id))
             # orb.log.debug('      {}'.format(str(role_ids)))
-            subsystem_types = []
-            rpt = [orb.role_product_types.get(r, set()) for r in role_ids]
-            if rpt:
-                subsystem_types = set.union(*rpt)
+            subsystem_types = roles.product_types_in_context(
+                                                        obj.assembly.owner)
             # orb.log.debug('    + authorized subsystem types: {}:'.format(
                                                     # str(subsystem_types)))
             assembly_type = getattr(obj.assembly.product_type, 'id', '')
@@ -370,19 +581,14 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
             # orb.log.debug('  - object is a Project or ProjectSystemUsage')
             # access will depend on the user's role in the project
             if isinstance(obj, orb.classes['ProjectSystemUsage']):
-                ras = orb.search_exact(cname='RoleAssignment',
-                                       assigned_to=user,
-                                       role_assignment_context=obj.project)
+                role_ids = roles.in_context(obj.project)
             elif isinstance(obj, orb.classes['Project']):
-                ras = orb.search_exact(cname='RoleAssignment',
-                                       assigned_to=user,
-                                       role_assignment_context=obj)
-            roles = set([ra.assigned_role.id for ra in ras])
+                role_ids = roles.in_context(obj)
             auth_roles = set(['administrator', 'lead_engineer',
                               'systems_engineer'])
-            if roles & auth_roles:
+            if role_ids & auth_roles:
                 # orb.log.debug('  - user is authorized by role(s) ...')
-                # orb.log.debug('    {}'.format(list(roles & auth_roles)))
+                # orb.log.debug('    {}'.format(list(role_ids & auth_roles)))
                 perms = ['view']
                 if server_or_connected_client:
                     perms += ['modify', 'add docs', 'delete']
@@ -393,7 +599,7 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
         # [4] is it a Port?
         elif cname == 'Port':
             # access will depend on the user's permissions on 'of_product'
-            perms = get_perms(obj.of_product, user=user)
+            perms = _get_perms(obj.of_product, user, False, False, ctx)
             if debugging:
                 perms.append('[4] role-based perms (Port)')
             return perms
@@ -404,10 +610,12 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
             # Flow will have the superset of those permissions
             perms = []
             try:
-                s = set(get_perms(obj.start_port_context, user=user))
-                s |= set(get_perms(obj.end_port_context, user=user))
-                s |= set(get_perms(obj.end_port.of_product, user=user))
-                s |= set(get_perms(obj.start_port.of_product, user=user))
+                s = set(_get_perms(obj.start_port_context, user, False,
+                                   False, ctx))
+                for related in (obj.end_port_context,
+                                obj.end_port.of_product,
+                                obj.start_port.of_product):
+                    s |= set(_get_perms(related, user, False, False, ctx))
                 perms = list(s)
                 # orb.log.debug(f'  perms: {perms}')
             except:
@@ -420,15 +628,12 @@ def get_perms(obj, user=None, permissive=False, debugging=False):
             return perms
         # [6] is it an Activity?
         elif isinstance(obj, orb.classes['Activity']):
-            ras = orb.search_exact(cname='RoleAssignment',
-                                   assigned_to=user,
-                                   role_assignment_context=obj.owner)
-            roles = set([ra.assigned_role.id for ra in ras])
+            role_ids = roles.in_context(obj.owner)
             auth_roles = set(['administrator', 'lead_engineer',
                               'systems_engineer'])
-            if roles & auth_roles:
+            if role_ids & auth_roles:
                 # orb.log.debug('  - user is authorized by role(s) ...')
-                # orb.log.debug('    {}'.format(list(roles & auth_roles)))
+                # orb.log.debug('    {}'.format(list(role_ids & auth_roles)))
                 perms = ['view', 'add docs']
                 if server_or_connected_client:
                     perms += ['modify', 'delete']
@@ -479,12 +684,9 @@ def is_global_admin(user):
     Returns:
         boolean
     """
-    admin_role = orb.get('pgefobjects:Role.Administrator')
-    global_admin = orb.select('RoleAssignment',
-                              assigned_role=admin_role,
-                              assigned_to=user,
-                              role_assignment_context=None)
-    return bool(global_admin)
+    if not getattr(user, 'oid', None):
+        return False
+    return get_user_roles(user).global_admin
 
 
 def is_cloaked(obj):
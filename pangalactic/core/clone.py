@@ -12,7 +12,7 @@ from pangalactic.core             import orb, state
 from pangalactic.core.names       import (get_acu_id, get_acu_name,
                                           get_next_port_seq, get_next_ref_des,
                                           get_port_abbr, get_port_id,
-                                          get_port_name)
+                                          get_port_name, release_seqz)
 from pangalactic.core.parametrics import (add_default_data_elements,
                                           add_default_parameters,
                                           data_elementz, get_pval,
@@ -205,7 +205,8 @@ def clone(what, include_ports=True, include_components=True,
             if include_ports and getattr(obj, 'ports', None):
                 Port = orb.classes['Port']
                 for port in obj.ports:
-                    seq = get_next_port_seq(new_obj, port.type_of_port)
+                    seq = get_next_port_seq(new_obj, port.type_of_port,
+                                            reserve=True)
                     port_oid = str(uuid4())
                     port_id = get_port_id(port.of_product.id,
                                           port.type_of_port.id,
@@ -245,7 +246,8 @@ def clone(what, include_ports=True, include_components=True,
                         orb.log.debug(f'    non-Acu skipped: {acu.id}')
                         continue
                     acu_oid = str(uuid4())
-                    ref_des = get_next_ref_des(new_obj, acu.component)
+                    ref_des = get_next_ref_des(new_obj, acu.component,
+                                               reserve=True)
                     if orb.is_fastorb:
                         acu = orb.create_or_update_thing('Acu',
                                   oid=acu_oid, id=get_acu_id(new_obj.id,
@@ -277,7 +279,8 @@ def clone(what, include_ports=True, include_components=True,
                 Acu = orb.classes['Acu']
                 for acu in obj.components:
                     acu_oid = str(uuid4())
-                    ref_des = get_next_ref_des(new_obj, acu.component)
+                    ref_des = get_next_ref_des(new_obj, acu.component,
+                                               reserve=True)
                     if orb.is_fastorb:
                         acu = orb.create_or_update_thing('Acu',
                                   oid=acu_oid, id=get_acu_id(new_obj.id,
@@ -310,6 +313,10 @@ def clone(what, include_ports=True, include_components=True,
                     pid_cbe = pid + '[CBE]'
                     cbe_val = get_pval(obj.oid, pid_cbe)
                     set_pval(new_obj.oid, pid, cbe_val)
+            # the new ports and acus have been given distinct values -- the
+            # values still reserved (of those that have not been saved) are
+            # released, since clone() does not save them
+            release_seqz()
         new_obj.id = orb.gen_product_id(new_obj)
         new_objs = []
         new_objs += new_ports
@@ -6,59 +6,85 @@ Pan Galactic speedy hub for object metadata and storage operations.
 NOTE:  Only the `orb` instance created in this module should be imported (it is
 intended to be a singleton).
 """
-import json, os, shutil, sys, traceback
+import hashlib, json, os, shutil, sys, traceback
 # import pprint
 from copy      import deepcopy
-from functools import reduce
 from pathlib   import Path
 from uuid      import uuid4
 
 # ruamel_yaml
 import ruamel_yaml as yaml
 
+# Louie: dispatcher
+from pydispatch import dispatcher
+
 # PanGalactic
 # core
 from pangalactic.core             import __version__
 from pangalactic.core             import diagramz
-from pangalactic.core             import read_config
+from pangalactic.core             import config, read_config
 from pangalactic.core             import prefs, read_prefs
 from pangalactic.core             import state, read_state, write_state
 from pangalactic.core             import trash, read_trash
 from pangalactic.core             import refdata
 from pangalactic.core.mapping     import schema_maps, schema_version
 from pangalactic.core.meta        import TEXT_PROPERTIES
+from pangalactic.core.names       import (clear_seqz,
+                                          get_next_product_id_suffix,
+                                          get_product_id_suffixes,
+                                          note_deleted, note_saved,
+                                          product_id_suffix_is_unique)
 from pangalactic.core.parametrics import (add_default_parameters,
                                           add_default_data_elements,
+                                          allocz,
                                           Comp, componentz,
                                           System, systemz,
                                           data_elementz, de_defz,
+                                          deserialize_compz,
+                                          deserialize_rqt_allocz,
+                                          deserialize_systemz,
                                           get_parameter_id,
                                           get_parameter_name,
                                           get_parameter_description,
+                                          invalidate_assembly_metrics,
                                           get_dval_as_str,
                                           get_pval_as_str,
                                           load_allocz,
                                           load_rqt_allocz, load_data_elementz,
-                                          load_parmz,
+                                          load_defz, load_parmz, mode_defz,
                                           parameterz, parm_defz, parmz_by_dimz,
-                                          rqt_allocz, save_allocz,
-                                          save_rqt_allocz,
-                                          save_data_elementz, save_parmz)
+                                          rqt_allocz, save_allocz, save_defz,
+                                          save_mode_defz, save_rqt_allocz,
+                                          save_data_elementz, save_parmz,
+                                          serialize_compz,
+                                          serialize_rqt_allocz,
+                                          serialize_systemz)
 from pangalactic.core.smerializers import (DESERIALIZATION_ORDER,
                                            serialize, deserialize)
 from pangalactic.core.tachistry    import Tachistry, matrix, schemas
-from pangalactic.core.test         import data as test_data_mod
-from pangalactic.core.test         import vault as test_vault_mod
-from pangalactic.core.test.utils   import gen_test_dvals, gen_test_pvals
+from pangalactic.core.tachistry    import ABSENT
 from pangalactic.core.units        import in_si
 from pangalactic.core.utils.datetimes import (dtstamp, file_dts,
                                               file_date_stamp, dt2local_tz_str)
+from pangalactic.core.utils.profiling import StartupProfiler
 from pangalactic.core.log          import get_loggers
-from pangalactic.core.validation   import get_assembly
+from pangalactic.core.validation   import (IdIndex, find_cycles,
+                                           format_cycles, get_assembly,
+                                           get_assembly_oids, get_bom)
 
 DEPRECATED_PARAMETERS = ['P[max]', 'P[min]',
                          'T', 'T[max]', 'T[min]', 'T[Survival]']
 
+# warm image:  a snapshot of the orb's caches, written by shutdown() and loaded
+# by start() if it is still valid -- see save_warm_image() / load_warm_image()
+WARM_IMAGE = 'warm_image.json'
+WARM_IMAGE_VERSION = 1
+# cache files whose content is in the warm image -- if any of them has been
+# written since the image was, the image is stale
+WARM_IMAGE_SOURCES = ['matrix.json', 'parameters.json', 'data_elements.json',
+                      'allocs.json', 'rqt_allocs.json', 'mode_defs.json',
+                      'diagrams.json', 'user_roles.json']
+
 dtypes = {'str': str, 'float': float, 'int': int, 'bool': bool}
 
 NULL_VALUE = {'str' : '',
@@ -88,61 +114,131 @@ NULL_VALUE = {'str' : '',
 inverses = {}
 
 
-def matrix_setattr(self, a, val):
-    schema = schemas[self.__class__.__name__]
-    if a in ['oid', '_cname']:
-        object.__setattr__(self, a, val)
-    elif a in schema['field_names']:
-        if schema['fields'][a]['field_type'] == 'object':
-            # 'a' is an object-valued attribute
-            if schema['fields'][a]['range'] in schemas:
-                if schema['fields'][a]['functional']:
-                    # if an object value is specified, replace with its oid
-                    allowed_types = orb.get_subclass_names(
-                                                schema['fields'][a]['range'])
-                    if (getattr(val, '_cname', None)
-                        and val._cname in allowed_types):
-                        matrix[self.oid][a] = getattr(val, 'oid', None)
-                    elif val is None:
-                        # if None is assigned, set to empty string
-                        matrix[self.oid][a] = ''
-                    elif isinstance(val, str):
-                        # not object, must be an oid (str); if not, ignore
-                        matrix[self.oid][a] = val
+class MatrixField:
+    """
+    Data descriptor for an attribute (field) of a class created by the
+    "metathing" metaclass:  the attribute's value is stored in `matrix` (for an
+    object-valued attribute, the oid of the object is stored).  Everything the
+    descriptor needs to know about the field (range, functional, coercion
+    function) is bound when the class is created, so attribute access only has
+    to look up the object's entry in `matrix`.  The allowed types are resolved
+    when first needed and again whenever the registry's subclass closure is
+    rebuilt (i.e. when classes have been added, e.g. from app ontologies).
+
+    Attributes:
+        name (str):  name of the field
+        range (str):  range of the field (class name or datatype name)
+        is_object (bool):  True if the field is object-valued
+        functional (bool):  True if the field is single-valued
+        null (object):  value returned for a datatype field that has no value
+        coerce (callable):  function to coerce a value assigned to a datatype
+            field (None for an object-valued field)
+        inverse_of (str):  for a non-functional object-valued field, the name
+            of the attribute of which it is the inverse
+        allowed_types (frozenset):  for a functional object-valued field, the
+            names of the classes whose instances can be assigned to it
+    """
+    __slots__ = ('name', 'range', 'is_object', 'functional', 'null', 'coerce',
+                 'inverse_of', '_allowed_types', '_subclasses')
+
+    def __init__(self, name, field):
+        self.name = name
+        self.range = field['range']
+        self.is_object = self.range in schemas
+        self.functional = field['functional']
+        self.null = NULL_VALUE.get(self.range)
+        self.inverse_of = field.get('inverse_of', '')
+        self._allowed_types = frozenset()
+        # the registry subclass closure from which _allowed_types was resolved
+        self._subclasses = None
+        self.coerce = None
+        if not self.is_object:
+            if self.range in ['datetime', 'time']:
+                self.coerce = str
+            else:
+                self.coerce = field['field_type']
+
+    @property
+    def allowed_types(self):
+        if not (self.is_object and self.functional):
+            return self._allowed_types
+        # NOTE:  the registry replaces its `subclasses` closure (dict) when
+        # classes are added, so an identity check is enough
+        if (self._subclasses is None or
+            self._subclasses is not orb.registry.subclasses):
+            self._allowed_types = frozenset(
+                                        orb.get_subclass_names(self.range))
+            self._subclasses = orb.registry.subclasses
+        return self._allowed_types
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        entry = matrix.index.get(obj.oid)
+        if entry is None:
+            # the object has no matrix entry
+            return None if self.is_object else self.null
+        table, i = entry
+        col = table.columns.get(self.name)
+        value = None if col is None else col[i]
+        if value is ABSENT:
+            value = None
+        if self.is_object:
+            # ObjectProperty
+            if self.functional:
+                return orb.get(value)
+            else:
+                # return orb.get(oids=inverses.get[self.oid][a])
+                return [o for o in db.values()
+                        if getattr(o, self.inverse_of, None) is obj]
+        return value or self.null
+
+    def _column(self, obj):
+        # the object's table row index and the column for this field
+        table, i = matrix.index[obj.oid]
+        return i, (table.columns.get(self.name) or table.column(self.name))
+
+    def __set__(self, obj, val):
+        if self.is_object:
+            if self.functional:
+                # if an object value is specified, replace with its oid
+                if getattr(val, '_cname', None) in self.allowed_types:
+                    i, col = self._column(obj)
+                    col[i] = getattr(val, 'oid', None)
+                elif val is None:
+                    # if None is assigned, set to empty string
+                    i, col = self._column(obj)
+                    col[i] = ''
+                elif isinstance(val, str):
+                    # not object, must be an oid (str); if not, ignore
+                    i, col = self._column(obj)
+                    col[i] = val
         else:
-            # a is a datatype attribute, coerce correct datatype
+            # a datatype attribute, coerce correct datatype
             if val is None:
-                val = NULL_VALUE.get(schema['fields'][a]['range'])
+                val = self.null
             try:
-                if schema['fields'][a]['range'] in ['datetime', 'time']:
-                    matrix[self.oid][a] = str(val)
-                else:
-                    matrix[self.oid][a] = schema['fields'][
-                                                    a]['field_type'](val)
+                table, i = matrix.index[obj.oid]
+                col = table.columns.get(self.name) or table.column(self.name)
+                col[i] = self.coerce(val)
             except:
                 pass
 
 
+def matrix_setattr(self, a, val):
+    # fields are set by their MatrixField descriptors; assignments to other
+    # attributes (except 'oid') are ignored
+    field = self._fields.get(a)
+    if field is not None:
+        field.__set__(self, val)
+    elif a in ['oid', '_cname']:
+        object.__setattr__(self, a, val)
+
+
 def matrix_getattr(self, a):
-    cname = self.__class__.__name__
-    if ((a not in ('oid', '_cname')) and
-        a in schemas[cname]['field_names']):
-        if schemas[cname]['fields'][a]['range'] in schemas:
-            # ObjectProperty
-            if matrix.get(self.oid) is None:
-                return None
-            elif schemas[cname]['fields'][a]['functional']:
-                return orb.get(matrix[self.oid].get(a))
-            else:
-                # return orb.get(oids=inverses.get[self.oid][a])
-                inverse = schemas[cname]['fields'][a]['inverse_of']
-                return [o for o in db.values()
-                        if getattr(o, inverse, None) is self]
-        else:
-            if matrix.get(self.oid) is None:
-                return NULL_VALUE.get(schemas[cname]['fields'][a]['range'])
-            return (matrix[self.oid].get(a) or
-                    NULL_VALUE.get(schemas[cname]['fields'][a]['range']))
+    # only called if normal attribute lookup fails -- i.e. if `a` is not a
+    # field (fields have MatrixField descriptors) or is an unset 'oid'
+    return None
 
 
 def thing_init(self, **kw):
@@ -152,23 +248,30 @@ def thing_init(self, **kw):
         kw['oid'] = oid
     # IMPORTANT: check if there is already a matrix entry for that oid; if so,
     # don't replace it, just update it
-    if not matrix.get(oid):
-        matrix[oid] = dict(oid=oid)
-        matrix[oid]['_cname'] = self._cname
+    if oid not in matrix:
+        matrix[oid] = dict(oid=oid, _cname=self._cname)
     self.oid = oid
+    fields = self._fields
     for a in kw:
-        if a in self.schema['field_names']:
-            setattr(self, a, kw[a])
+        if a in fields:
+            fields[a].__set__(self, kw[a])
 
 
 class metathing(type):
     def __new__(cls, cname, bases,  namespace):
+        schema = schemas[cname]
         namespace['_cname'] = cname
-        namespace['schema'] = schemas[cname]
+        namespace['schema'] = schema
         namespace['__init__'] = thing_init
         namespace['__slots__'] = ['oid']
         namespace['__setattr__'] = matrix_setattr
         namespace['__getattr__'] = matrix_getattr
+        # create a MatrixField descriptor for each field (except 'oid', which
+        # is a slot)
+        fields = {a : MatrixField(a, schema['fields'][a])
+                  for a in schema['field_names'] if a not in ('oid', '_cname')}
+        namespace['_fields'] = fields
+        namespace.update(fields)
         return super().__new__(cls, cname, bases, namespace)
 
 
@@ -219,8 +322,12 @@ class FastOrb(object):
         role_oids_to_ids (dict): cache that maps Role oids to their ids (mainly
             for use by the 'access' module
         schemas (dict): pangalactic.core.tachistry.schemas
+        startup_profile (dict):  per-phase timing of the last orb.start() --
+            see p.core.utils.profiling.StartupProfiler.finish()
         user_raz (list): cache of serialized RoleAssignment objects for roles
             assigned to the local user
+        warm_image_status (str): result of loading the warm image in start()
+            (see load_warm_image), or 'not used'
     """
     is_fastorb = True
     started = False
@@ -231,28 +338,44 @@ class FastOrb(object):
     data_elementz_status = 'unknown'
     parmz_status = 'unknown'
     new_oids = []
+    # startup_profile is populated by start(); _profiler only exists while
+    # start() is running
+    startup_profile = None
+    _profiler = None
+    # _id_index:  index of ids and versions by class, used by id_exists() --
+    # built on first use and updated (along with the caches used to allocate
+    # ids -- see p.core.names) by save(), delete() and
+    # create_or_update_thing()
+    _id_index = None
 
     def save_matrix(self, dir_path):
         """
-        Save 'matrix' dict to a json file.
+        Save 'matrix' to a json file (in columnar form -- see
+        ColumnarMatrix.to_columns).
         """
         self.log.debug(f'* saving matrix ({len(matrix)} objects) ...')
         fpath = os.path.join(dir_path, 'matrix.json')
         with open(fpath, 'w') as f:
-            f.write(json.dumps(matrix, separators=(',', ':'),
-                               indent=4))
+            f.write(json.dumps(dict(format='columnar',
+                                    tables=matrix.to_columns()),
+                               separators=(',', ':')))
         self.log.debug('  matrix saved.')
 
     def load_matrix(self, dir_path):
         """
-        Load the 'matrix' dict from a json file.
+        Load 'matrix' from a json file (either in columnar form or in the
+        older form, {oid: object structure}).
         """
         self.log.debug('* loading matrix ...')
         fpath = os.path.join(dir_path, 'matrix.json')
         if os.path.exists(fpath):
             with open(fpath) as f:
                 try:
-                    matrix.update(json.loads(f.read()))
+                    data = json.loads(f.read())
+                    if data.get('format') == 'columnar':
+                        matrix.load_columns(data['tables'])
+                    else:
+                        matrix.update(data)
                     self.log.debug(f'  {len(matrix)} objects loaded.')
                 except:
                     return 'fail'
@@ -260,6 +383,121 @@ class FastOrb(object):
         else:
             return 'not found'
 
+    def get_warm_image_key(self):
+        """
+        Return the key that identifies the inputs to the caches in the warm
+        image:  the app, schema and warm image versions, the reference data
+        digest, the hash of the ontology (which keys the registry's schema
+        bundle), and the default parameters and data elements in state (which
+        are applied when objects are saved).
+        """
+        defaults = json.dumps([state.get('default_parms') or [],
+                               state.get('default_data_elements') or []])
+        return dict(version=__version__,
+                    schema_version=schema_version,
+                    image_version=WARM_IMAGE_VERSION,
+                    refdata_digest=refdata.ref_digest,
+                    onto_hash=self.registry.onto_hash,
+                    defaults=hashlib.sha256(
+                                defaults.encode('utf-8')).hexdigest())
+
+    def save_warm_image(self, dir_path):
+        """
+        Save a snapshot of the orb's caches (matrix, parameterz, data_elementz,
+        componentz, systemz, parm_defz, de_defz, parmz_by_dimz, mode_defz,
+        allocz, rqt_allocz, diagramz and user_raz) to the warm image file.  The
+        file has two lines:  a json header containing the key (see
+        get_warm_image_key) and the sha256 hash of the second line, and the
+        json-serialized caches.
+        """
+        self.log.debug('* saving warm image ...')
+        caches = dict(matrix=matrix.to_columns(),
+                      parameterz=parameterz,
+                      data_elementz=data_elementz,
+                      componentz=serialize_compz(componentz),
+                      systemz=serialize_systemz(systemz),
+                      parm_defz=parm_defz,
+                      de_defz=de_defz,
+                      parmz_by_dimz=parmz_by_dimz,
+                      mode_defz=mode_defz,
+                      allocz=allocz,
+                      rqt_allocz=serialize_rqt_allocz(rqt_allocz),
+                      diagramz=diagramz,
+                      user_raz=self.user_raz)
+        body = json.dumps(caches, separators=(',', ':')).encode('utf-8')
+        header = json.dumps(dict(key=self.get_warm_image_key(),
+                                 sha256=hashlib.sha256(body).hexdigest()))
+        fpath = os.path.join(dir_path, WARM_IMAGE)
+        with open(fpath, 'wb') as f:
+            f.write(header.encode('utf-8') + b'\n' + body)
+        self.log.debug('  warm image saved.')
+
+    def load_warm_image(self, dir_path):
+        """
+        Load the orb's caches from the warm image file (see save_warm_image).
+
+        Returns:
+            str:  'success', 'not found', 'stale' (the key does not match or a
+                cache file has been written since the image), or 'fail'
+        """
+        self.log.debug('* loading warm image ...')
+        fpath = os.path.join(dir_path, WARM_IMAGE)
+        if not os.path.exists(fpath):
+            return 'not found'
+        image_mtime = os.path.getmtime(fpath)
+        for fname in WARM_IMAGE_SOURCES:
+            src = os.path.join(dir_path, fname)
+            if os.path.exists(src) and os.path.getmtime(src) > image_mtime:
+                self.log.debug(f'  stale:  "{fname}" is newer.')
+                return 'stale'
+        with open(fpath, 'rb') as f:
+            header, _, body = f.read().partition(b'\n')
+        try:
+            header = json.loads(header)
+            if header['key'] != self.get_warm_image_key():
+                self.log.debug('  stale:  key does not match.')
+                return 'stale'
+            if hashlib.sha256(body).hexdigest() != header['sha256']:
+                self.log.debug('  fail:  content hash does not match.')
+                return 'fail'
+            caches = json.loads(body)
+        except:
+            return 'fail'
+        matrix.load_columns(caches['matrix'])
+        parameterz.update(caches['parameterz'])
+        data_elementz.update(caches['data_elementz'])
+        componentz.update(deserialize_compz(caches['componentz']))
+        invalidate_assembly_metrics()
+        systemz.update(deserialize_systemz(caches['systemz']))
+        parm_defz.update(caches['parm_defz'])
+        de_defz.update(caches['de_defz'])
+        parmz_by_dimz.update(caches['parmz_by_dimz'])
+        mode_defz.update(caches['mode_defz'])
+        allocz.update(caches['allocz'])
+        rqt_allocz.update(deserialize_rqt_allocz(caches['rqt_allocz']))
+        diagramz.update(caches['diagramz'])
+        self.user_raz += caches['user_raz']
+        self.log.debug(f'  {len(matrix)} objects loaded.')
+        return 'success'
+
+    def shutdown(self):
+        """
+        Clean shutdown:  save the caches to the home directory and write the
+        warm image, so that the next start() can load everything from it.
+        """
+        self.log.info('* shutdown()')
+        save_data_elementz(self.home)
+        save_parmz(self.home)
+        self.save_matrix(self.home)
+        self.save_user_raz(self.home)
+        save_allocz(self.home)
+        save_rqt_allocz(self.home)
+        save_mode_defz(self.home)
+        self._save_diagramz()
+        # the warm image must be written last (see load_warm_image)
+        self.save_warm_image(self.home)
+        self.log.info('  caches and warm image saved.')
+
     def start(self, home=None, console=False, debug=False, log_msgs=None,
               **kw):
         """
@@ -275,6 +513,11 @@ class FastOrb(object):
         """
         if self.started:
             return
+        # counting objects walks the gc object list at each lap, so is only
+        # done when the profile is to be written (see _finish_profile)
+        self._profiler = StartupProfiler(
+                            version=__version__,
+                            count_objects=bool(config.get('profile_startup')))
         self.log_msgs = log_msgs or []
         # initialize user_raz
         self.user_raz = []
@@ -376,6 +619,7 @@ class FastOrb(object):
         if 'units' not in prefs:
             prefs['units'] = {}
         self.cache_path = os.path.join(marv_home, 'cache')
+        self._lap('config, state, logging')
         home_schema_version = state.get('schema_version')
         if (home_schema_version is None or
             home_schema_version == schema_version):
@@ -402,8 +646,8 @@ class FastOrb(object):
             dump_path = os.path.join(marv_home, 'db.yaml')
             # [1] remove .json caches and "cache" directory:
             self.log.debug('  [1] removing caches ...')
-            for prefix in ['data_elements', 'diagrams', 'parameters',
-                           'schemas']:
+            for prefix in ['data_elements', 'definitions', 'diagrams',
+                           'parameters', 'schemas']:
                 fpath = os.path.join(marv_home, prefix + '.json')
                 if os.path.exists(fpath):
                     os.remove(fpath)
@@ -453,10 +697,15 @@ class FastOrb(object):
                 shutil.rmtree(os.path.join(marv_home, '.creds'),
                               ignore_errors=True)
                 self.log.debug('      done with keys.')
+        self._lap('registry')
         #############################################
         # POST registry-initialization operations ...
         #############################################
         # * copy test data files from 'p.test.data' module to test_data_dir
+        # (test modules are imported here, not at module level, so that the
+        # orb module does not depend on the test package at import time)
+        from pangalactic.core.test import data as test_data_mod
+        from pangalactic.core.test import vault as test_vault_mod
         self.test_data_dir = os.path.join(marv_home, 'test_data')
         current_test_files = set()
         self.log.debug('* checking for test data in [marv_home]/test_data...')
@@ -511,34 +760,28 @@ class FastOrb(object):
                            # str(vault_files_copied)))
         # else:
             # self.log.debug('  - all test vault files already installed.')
+        self._id_index = None
+        clear_seqz()
         # basically, versionables == {Product and all its subclasses}
         self.versionables = [cname for cname in schemas if 'version' in
                              schemas[cname]['field_names']]
-        # load the "matrix" and initialize the db
-        self.matrix_status = self.load_matrix(self.home)
-        if self.matrix_status == 'success':
-            self.log.debug(f'* matrix loaded with {len(matrix)} entries.')
-            # NOTE: initializing db objects MUST be done using orb.save() !!!
-            self.log.debug('  initializing "db" (object cache) ...')
-            objs = []
-            for oid in matrix:
-                cname = matrix[oid]['_cname']
-                # self.create_or_update_thing(matrix[oid]['_cname'], oid=oid)
-                cls = self.classes[cname]
-                objs.append(cls(oid=oid))
-            self.save(objs)
-            self.log.debug(f'  - initialized with {len(db)} objects.')
-        # load (and update) ref data ... note that this must be done AFTER
-        # config and state have been created and updated (except in the case
-        # that the schema version doesn't match and we have to load data from a
+        self._lap('test data, vault')
+        # if there is a valid warm image (written by shutdown()), load all
+        # caches from it and skip the matrix load, reference data checks and
+        # cache rebuilds (unless the db was already populated above from a
         # dump)
-        self.load_user_raz(self.home)
-        self.load_reference_data()
-        # load allocation-related caches
-        # NOTE: BAD IDEA: THIS SHOULD BE DONE BY orb.save() ...!
-        self.load_allocz_cache_data()
-        # load the cached block diagrams
-        self._load_diagramz()
+        self.warm_image_status = 'not used'
+        if not db:
+            self.warm_image_status = self.load_warm_image(self.home)
+        if self.warm_image_status == 'success':
+            # NOTE: orb.save() is not needed here because its side-effects
+            # (default parameters, componentz, systemz) are in the image
+            for oid in matrix:
+                db[oid] = self.classes[matrix[oid]['_cname']](oid=oid)
+            self.log.debug(f'* warm image loaded ({len(db)} objects).')
+            self._lap('warm image')
+        else:
+            self._cold_start_caches()
         # populate 'role_oids_to_ids' cache
         self.role_oids_to_ids.update({role.oid : role.id
                                       for role in self.get_by_type('Role')})
@@ -573,14 +816,77 @@ class FastOrb(object):
                     else:
                         self.role_product_types[role_id] = set(
                             discipline_subsystems.get(discipline_id))
+        self._lap('role caches')
         self.started = True
-        # TODO:  clean up boilerplate ...
-        save_data_elementz(self.home)
-        save_parmz(self.home)
-        self.save_matrix(self.home)
+        if self.warm_image_status != 'success':
+            # TODO:  clean up boilerplate ...
+            save_data_elementz(self.home)
+            save_parmz(self.home)
+            self.save_matrix(self.home)
+            self._lap('save caches')
+        self._finish_profile()
         self.log.debug('* orb startup completed.')
         return self.home
 
+    def _cold_start_caches(self):
+        """
+        Load the matrix and initialize the db, then load (and update) the
+        reference data and the cached data -- done by start() when there is
+        no valid warm image.
+        """
+        # load the "matrix" and initialize the db
+        self.matrix_status = self.load_matrix(self.home)
+        if self.matrix_status == 'success':
+            self.log.debug(f'* matrix loaded with {len(matrix)} entries.')
+            # NOTE: initializing db objects MUST be done using orb.save() !!!
+            self.log.debug('  initializing "db" (object cache) ...')
+            objs = []
+            for oid in matrix:
+                cname = matrix[oid]['_cname']
+                # self.create_or_update_thing(matrix[oid]['_cname'], oid=oid)
+                cls = self.classes[cname]
+                objs.append(cls(oid=oid))
+            self.save(objs)
+            self.log.debug(f'  - initialized with {len(db)} objects.')
+        self._lap('matrix')
+        # load (and update) ref data ... note that this must be done AFTER
+        # config and state have been created and updated (except in the case
+        # that the schema version doesn't match and we have to load data from a
+        # dump)
+        self.load_user_raz(self.home)
+        self.load_reference_data()
+        # load allocation-related caches
+        # NOTE: BAD IDEA: THIS SHOULD BE DONE BY orb.save() ...!
+        self.load_allocz_cache_data()
+        # load the cached block diagrams
+        self._load_diagramz()
+        self._lap('allocz, diagrams')
+
+    def _lap(self, name):
+        """
+        Record the end of a startup phase (no-op when start() is not running).
+
+        Args:
+            name (str):  name of the phase that just ended
+        """
+        if self._profiler is not None:
+            self._profiler.lap(name)
+
+    def _finish_profile(self):
+        """
+        Set `startup_profile` from the startup profiler and, if the
+        'profile_startup' config item is set, write it to
+        "startup_profile.json" in the home directory.
+        """
+        self.startup_profile = self._profiler.finish()
+        if config.get('profile_startup'):
+            self._profiler.dump(os.path.join(self.home,
+                                             'startup_profile.json'))
+        self.log.debug('* startup profile:')
+        for line in self._profiler.report().split('\n'):
+            self.log.debug('  ' + line)
+        self._profiler = None
+
     def init_registry(self, home, force_new_core=False, version='', log=None,
                       debug=False, console=False):
         self.registry = Tachistry(home=home, cache_path=self.cache_path,
@@ -732,6 +1038,7 @@ class FastOrb(object):
                 self.log.debug(f'  valid kw: "{valid_kw}"')
                 valid_kw['mod_datetime'] = str(kw_dt)
                 matrix[oid].update(valid_kw)
+                self._index_id(thing)
             return thing
         # NOTE: unnecessary to generate an oid here -- __init__ will do that
         # else:
@@ -739,6 +1046,7 @@ class FastOrb(object):
         # class instantiation will update the matrix
         thing = self.classes[cname](**valid_kw)
         db[thing.oid] = thing
+        self._index_id(thing)
         return thing
 
     def assign_test_parameters(self, objs, parms=None, des=None):
@@ -751,6 +1059,7 @@ class FastOrb(object):
                 elements will be assigned to
         """
         self.log.debug('* assign_test_parameters()')
+        from pangalactic.core.test.utils import gen_test_dvals, gen_test_pvals
         for o in objs:
             cname = o.__class__.__name__
             ptid = getattr(getattr(o, 'product_type', None), 'id', None)
@@ -848,7 +1157,7 @@ class FastOrb(object):
         """
         self.log.info('* checking reference data ...')
         # first get the oids of everything in the db ...
-        db_oids = list(db)
+        db_oids = set(db)
         # [0] load initial reference data (Orgs, Persons, Roles,
         # RoleAssignments)
         missing_i = [so for so in refdata.initial if so['oid'] not in db_oids]
@@ -895,9 +1204,8 @@ class FastOrb(object):
         # [2] XXX IMPORTANT!  Load the parameter definitions caches
         # ('parmz_by_dimz' 'de_defz') before loading parameters
         # from 'parameters.json' -- the deserializer uses these caches.
-        self.create_parm_defz()
-        self.create_de_defz()
-        self.create_parmz_by_dimz()
+        self.init_defz_caches()
+        self._lap('ref data: initial, definitions')
         # *** NOTE ***********************************************************
         # [3] run _load_parmz() and _load_data_elementz() before checking for
         # updates to data element definitions and parameter definitions and
@@ -908,6 +1216,7 @@ class FastOrb(object):
         # ********************************************************************
         self.data_elementz_status = load_data_elementz(self.home)
         self.parmz_status = load_parmz(self.home)
+        self._lap('ref data: load parmz, data elementz')
         # self.log.debug('  dmz: {}'.format(str(dmz)))
         # --------------------------------------------------------------------
         # NOTE: STEP [4] IS NOW UNNECESSARY SINCE WE ARE RECREATING ALL
@@ -967,13 +1276,13 @@ class FastOrb(object):
         #     NOTE:  DON'T DO THIS STEP UNTIL ALL DATA RELATED TO THE
         #     DEPRECATED DATA HAS BEEN REMOVED FROM THE CURRENT DATABASE
         #     **********************************************************
-        db_oids = list(db)
-        deprecated = [oid for oid in refdata.deprecated if oid in db_oids]
+        deprecated = [oid for oid in refdata.deprecated if oid in db]
         if deprecated:
             self.log.debug('  + deleting deprecated reference data:')
             self.log.debug('  {}'.format([oid for oid in deprecated]))
             for oid in deprecated:
                 self.delete([self.get(oid) for oid in deprecated])
+        self._lap('ref data: updates')
         self.log.info('  + all reference data loaded.')
 
     def load_allocz_cache_data(self):
@@ -992,6 +1301,25 @@ class FastOrb(object):
     # to the parametrics module ...
     #########################################################################
 
+    def init_defz_caches(self):
+        """
+        Initialize the `parm_defz`, `de_defz` and `parmz_by_dimz` caches:  load
+        them from the definitions cache ("definitions.json") if it was saved
+        for the current app version and reference data, otherwise create them
+        from refdata and save them.
+        """
+        key = dict(version=__version__, refdata_digest=refdata.ref_digest)
+        if load_defz(self.home) == key:
+            self.log.debug('* definitions caches loaded.')
+            return
+        self.log.debug('* creating definitions caches ...')
+        for cache in (parm_defz, de_defz, parmz_by_dimz):
+            cache.clear()
+        self.create_parm_defz()
+        self.create_de_defz()
+        self.create_parmz_by_dimz()
+        save_defz(self.home, key)
+
     def create_parm_defz(self):
         """
         Create the `parm_defz` cache of ParameterDefinitions from refdata, in
@@ -1149,6 +1477,7 @@ class FastOrb(object):
                                     acu.oid,
                                     acu.quantity or 1,
                                     acu.reference_designator))]
+        invalidate_assembly_metrics(acu.assembly.oid)
         # comps = ''
         # for c in componentz[acu.assembly.oid]:
             # comp = self.get(c.oid)
@@ -1236,6 +1565,29 @@ class FastOrb(object):
             self.adjust_systemz(psu)
         self.log.debug(f'    systemz cache has {len(systemz)} items.')
 
+    def _check_acu_for_cycles(self, acu):
+        """
+        Log an error if a saved Acu makes its assembly a component of itself
+        at any level (uses the 'componentz' cache, so only the assembly
+        structure of the Acu's component is searched).
+
+        Args:
+            acu (Acu): the Acu that was saved
+
+        Returns:
+            list:  the cycles found (see `validation.find_cycles`)
+        """
+        comp_oid = getattr(acu.component, 'oid', None)
+        if not comp_oid or comp_oid not in componentz:
+            return []
+        cycles = find_cycles(componentz, roots=[comp_oid])
+        if cycles:
+            self.log.error('  - Acu "{}" creates an assembly cycle:'.format(
+                                                                    acu.oid))
+            self.log.error(format_cycles(cycles, get_id=lambda oid: getattr(
+                                                self.get(oid), 'id', None)))
+        return cycles
+
     def save(self, objs, recompute=True):
         """
         Save the specified objects.  (CAVEAT: this will update the object if it
@@ -1315,6 +1667,7 @@ class FastOrb(object):
                 else:
                     comp_changed = True
                 self.adjust_componentz(obj)
+                self._check_acu_for_cycles(obj)
                 if not new:
                     # NOTE: when an existing Acu is modified and the component
                     # is changed, the associated Flows must be deleted first,
@@ -1366,8 +1719,12 @@ class FastOrb(object):
                     # else:
                         # self.log.debug('   system not changed.')
             db[obj.oid] = obj
+            self._index_id(obj)
             if obj.oid in self.new_oids:
                 self.new_oids.remove(obj.oid)
+        if any(obj.__class__.__name__ == 'RoleAssignment'
+               for obj in ordered_objs):
+            dispatcher.send('role assignments changed')
         return True
 
     def obj_view_to_dict(self, obj, view):
@@ -1564,18 +1921,15 @@ class FastOrb(object):
         Template = self.classes['Template']
         if not isinstance(obj, (HW, Template)):
             return ''
-        all_ids = self.get_ids(cname='HardwareProduct')
-        all_ids += self.get_ids(cname='Template')
-        # self.log.debug('  all_ids:')
-        # self.log.debug('  {}'.format(str(all_ids)))
-        id_suffixes = [(i or '').split('-')[-1] for i in all_ids]
-        # self.log.debug('  id_suffixes:')
-        # self.log.debug('  {}'.format(str(id_suffixes)))
+        # the id suffixes of all saved products are cached (see p.core.names)
+        id_suffixes = get_product_id_suffixes(
+                lambda: [o for o in db.values()
+                         if o.__class__.__name__ in ('HardwareProduct',
+                                                     'Template')])
         current_id_parts = (obj.id or '').split('-')
         # self.log.debug('  current_id_parts: {}'.format(
                                                 # str(current_id_parts)))
-        if current_id_parts[-1] in id_suffixes:
-            id_suffixes.remove(current_id_parts[-1])
+        unique = product_id_suffix_is_unique(obj.id, id_suffixes)
         owner_id = getattr(obj.owner, 'id', 'Owner-unspecified')
         # self.log.debug('  owner_id: {}'.format(owner_id))
         pt_abbr = getattr(obj.product_type, 'abbreviation', 'TBD') or 'TBD'
@@ -1585,28 +1939,56 @@ class FastOrb(object):
         # and last part (suffix) is unique
         if (len(current_id_parts) >= 3 and
             ((obj.id or '').startswith(owner_id + '-' + pt_abbr + '-')) and
-            # suffix is unique (has been removed from id_suffixes once)
-            current_id_parts[-1] not in id_suffixes):
+            unique):
             return obj.id
-        hw_id_ints = [0]
-        for i in id_suffixes:
-            try:
-                hw_id_ints.append(int(i))
-            except:
-                continue
-        next_sufx = str(max(hw_id_ints)).zfill(7)
-        while 1:
-            if next_sufx not in id_suffixes:
-                break
-            else:
-                next_int = max(hw_id_ints) + 1
-                next_sufx = str(next_int).zfill(7)
+        next_sufx = get_next_product_id_suffix(obj.id, id_suffixes)
         owner_id = owner_id or 'Vendor'
         abbrev = getattr(obj.product_type, 'abbreviation', 'TBD') or 'TBD'
         if obj.__class__.__name__ == 'Template':
             abbrev += '-Template'
         return '-'.join([owner_id, abbrev, next_sufx])
 
+    def id_exists(self, cname, id_value, version=None, oid=None):
+        """
+        Check whether an object of the specified class has the specified id
+        (and version, if one is specified), using the orb's id index (built on
+        the first call) rather than scanning the db.
+
+        Args:
+            cname (str):  class name
+            id_value (str):  the id
+
+        Keyword Args:
+            version (str):  the version (None -> any version; '' -> blank)
+            oid (str):  oid of an object to be ignored (e.g. the object being
+                edited)
+
+        Returns:
+            bool
+        """
+        if self._id_index is None:
+            self._id_index = IdIndex(
+                (o.oid, o.__class__.__name__, o.id, self._idx_version(o))
+                for o in db.values())
+        return self._id_index.exists(cname, id_value, version=version,
+                                     oid=oid)
+
+    def _idx_version(self, obj):
+        if obj.__class__.__name__ in self.versionables:
+            return obj.version
+        return ''
+
+    def _index_id(self, obj):
+        """
+        Add (or update) an object in the id index, if it has been built (see
+        id_exists()), and in the caches used to allocate ids (see
+        p.core.names).
+        """
+        if self._id_index is not None:
+            self._id_index.add(obj.oid, obj.__class__.__name__, obj.id,
+                               self._idx_version(obj))
+        note_saved(obj)
+
     def get_idvs(self, cname=None):
         """
         Return a list of (id, version) tuples:
@@ -2070,8 +2452,8 @@ class FastOrb(object):
                     res = [o for o in set(objs) if o]
                     return res
             for system in systems:
-                # NOTE:  get_assembly is recursive, gets *all* sub-assemblies
-                assemblies += get_assembly(system)
+                # NOTE:  gets *all* sub-assemblies
+                assemblies += self.get_assembly_from_compz(system)
             if assemblies:
                 self.log.debug('  - {} assemblies found'.format(
                                len(assemblies)))
@@ -2181,16 +2563,24 @@ class FastOrb(object):
         self.log.debug('* orb.delete() called ...')
         # TODO: make sure appropriate relationships in which these objects
         # are the parent or child are also deleted
+        roles_changed = False
         for obj in objs:
             oid = obj.oid
+            if obj.__class__.__name__ == 'RoleAssignment':
+                roles_changed = True
             if obj:
                 del obj
             if oid in db:
                 del db[oid]
+            if self._id_index is not None:
+                self._id_index.remove(oid)
+            note_deleted(oid)
             if oid in matrix:
                 del matrix[oid]
             else:
                 self.log.debug(f'  - oid "{oid}" not found,')
+        if roles_changed:
+            dispatcher.send('role assignments changed')
 
     def is_versionable(self, obj):
         """
@@ -2240,150 +2630,51 @@ class FastOrb(object):
     def check_for_cycles(self, product):
         """
         Check for cyclical data structures among all [known] components used at
-        up to 5 levels of assembly of the specified product.
+        every level of assembly of the specified product (uses the
+        'componentz' cache).
 
         Args:
             product (Product): the Product in which to look for cycles
+
+        Returns:
+            str:  a message describing the cycles found, or None
         """
         if product and getattr(product, 'oid', None) in componentz:
-            comps = [self.get(comp.oid) for comp in componentz[product.oid]]
-            # acus_by_comp_oid = {acu.component.oid : acu
-                                # for acu in product.components}
-            if product.oid in [getattr(c, 'oid', None) for c in comps]:
-                txt = 'is a component of itself.'
-                msg = 'product oid "{}" (id: "{}" {}'.format(
-                          product.oid, product.id or 'no id', txt)
-                self.log.debug(msg)
-                return msg
-            # else:
-                # self.log.debug('  - level 1 components ok.')
-            comps1 = []
-            acus1_by_comp_oid = {}
-            for comp in comps:
-                if comp:
-                    comps1 += [self.get(c.oid)
-                               for c in (componentz.get(comp.oid) or [])]
-                    acus1_by_comp_oid.update(
-                     {c.oid : self.get(c.usage_oid)
-                      for c in (componentz.get(comp.oid) or [])})
-            if comps1:
-                comps += comps1
-            else:
-                # self.log.debug('  - no more levels.')
-                return
-            if product.oid in [getattr(c, 'oid', None) for c in comps1]:
-                txt = 'is a 2nd-level component of itself.'
-                msgs = []
-                msg = ' *** product {} (id: "{}" {}'.format(
-                          product.oid, product.id or 'no id', txt)
-                msgs.append(msg)
-                self.log.debug(msg)
-                acu1 = acus1_by_comp_oid[product.oid]
-                msg1 = ' *** offending Acu is:'
-                msgs.append(msg1)
-                self.log.debug(msg1)
-                msg2 = '     id: {}'.format(str(acu1.id))
-                msgs.append(msg2)
-                self.log.debug(msg2)
-                msg3 = '     creator: {}'.format(acu1.creator.id)
-                msgs.append(msg3)
-                self.log.debug(msg3)
-                assy1 = acu1.assembly
-                msg4 = '     assembly: {}'.format(str(assy1.id))
-                msgs.append(msg4)
-                self.log.debug(msg4)
-                msg5 = '     assembly oid: {}'.format(str(assy1.oid))
-                msgs.append(msg5)
-                self.log.debug(msg5)
-                # acu = acus_by_comp_oid[assy1.oid]
-                return '<br>'.join(msgs)
-            # else:
-                # self.log.debug('  - level 2 components ok.')
-            comps2 = []
-            for comp in comps1:
-                comps2 += [self.get(getattr(c, 'oid', None))
-                           for c in (
-                           componentz.get(getattr(comp, 'oid', None)) or [])]
-            if comps2:
-                comps += comps2
-            else:
-                # self.log.debug('  - no more levels.')
-                return
-            if product.oid in [getattr(c, 'oid', None) for c in comps2]:
-                txt = 'is a 3nd-level component of itself.'
-                msg = 'product {} (id: "{}" {}'.format(
-                          product.oid, product.id or 'no id', txt)
+            cycles = find_cycles(componentz, roots=[product.oid])
+            if cycles:
+                msg = format_cycles(cycles, get_id=lambda oid: getattr(
+                                                self.get(oid), 'id', None))
                 self.log.debug(msg)
                 return msg
-            # else:
-                # self.log.debug('  - level 3 components ok.')
-            comps3 = []
-            for comp in comps2:
-                comps3 += [self.get(getattr(c, 'oid', None))
-                           for c in (
-                           componentz.get(getattr(comp, 'oid', None)) or [])]
-            if comps3:
-                comps += comps3
-            else:
-                # self.log.debug('  - no more levels.')
-                return
-            if product.oid in [getattr(c, 'oid', None) for c in comps3]:
-                txt = 'is a 4th-level component of itself.'
-                msg = 'product {} (id: "{}" {}'.format(
-                          product.oid, product.id or 'no id', txt)
-                self.log.debug(msg)
-                return msg
-            else:
-                # self.log.debug('no cycles')
-                return
-        # self.log.debug('no cycles')
 
     def get_bom_from_compz(self, product):
         """
         Return a list of all known components at every level of assembly in the
-        specified product.
+        specified product, computed from the 'componentz' cache (see
+        `validation.get_bom`).
 
         Args:
             product (Product) the subject product
         """
-        try:
-            # NOTE: this will explode if assembly contains cycles!
-            if product:
-                comps = [self.get(comp.oid)
-                         for comp in (componentz.get(product.oid) or [])]
-                if comps:
-                    comps = reduce(lambda x,y: x+y,
-                                   [self.get_bom_from_compz(c)
-                                    for c in comps],
-                                   comps)
-                return comps
-            return []
-        except:
-            # self.log.debug('bom exploded -- probably contained a cycle.')
-            return []
+        return get_bom(product, orb=self)
 
     def get_assembly_from_compz(self, product):
         """
         Return the product's assembly structure, including all Acu instances plus
         all (known) components used at every level of assembly of the specified
-        product.
-        """
-        if product:
-            comps = self.get_bom_from_compz(product)
-            base_acus = [self.get(c.usage_oid)
-                         for c in (componentz.get(product.oid) or [])]
-            acus = reduce(lambda x,y: x + y,
-                          [[self.get(comp.usage_oid) for comp in
-                            (componentz.get(c.oid) or [])]
-                           for c in comps],
-                          base_acus)
-            return comps + acus
-        return []
+        product, computed from the 'componentz' cache (see
+        `validation.get_assembly`).
+        """
+        return get_assembly(product, orb=self)
 
     def get_bom_oids(self, product):
-        return set([getattr(p, 'oid', '')
-                    for p in self.get_bom_from_compz(product)
-                    if getattr(p, 'oid', '')])
+        """
+        Return the set of oids of all known components at every level of
+        assembly in the specified product (no objects are loaded).
+        """
+        if not product:
+            return set()
+        return set(get_assembly_oids(product.oid)[0])
 
 
 # A node has only one instance of FastOrb, called 'orb', which is intended to
@@ -7,7 +7,6 @@ import json
 import string
 import unicodedata
 
-from pangalactic.core       import datatypes
 from pangalactic.core.units import in_si
 
 # NOTE:  As a "simplest thing that works", this module adds interface default
@@ -695,6 +694,8 @@ def property_to_field(name, pe):
     field['editable'] = not name in READONLY
     field['external_name'] = ' '.join(pe['id'].split('_'))
     if pe['is_datatype']:
+        # NOTE:  imported here -- `datatypes` is built on first use
+        from pangalactic.core import datatypes
         field['field_type'] = datatypes[(pe['is_datatype'],
                                          pe['range'],
                                          pe['functional'])]
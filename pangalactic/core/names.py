@@ -5,13 +5,10 @@ Objects and services for handling identifiers, addresses, and namespaces.
 import re
 import xml.etree.ElementTree as ET
 
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 from textwrap import wrap
 from urllib.parse import urlparse
 
-# rdflib
-from rdflib.term import URIRef
-
 from pangalactic.core                import prefs
 from pangalactic.core.datastructures import OrderedSet
 from pangalactic.core.meta           import asciify
@@ -375,6 +372,8 @@ def q2u(qname):
                 uri = ''.join([ns.uri, '#', name])
         else:
             raise ValueError('unknown prefix: {}'.format(prefix))
+    # rdflib is imported only when needed (it is slow to import)
+    from rdflib.term import URIRef
     return URIRef(uri)
 
 def q2eturi(qname):
@@ -415,6 +414,7 @@ def get_uri(identifier):
     else:
         # identifier is either a qname or a local name
         uri = q2u(identifier)
+    from rdflib.term import URIRef
     return URIRef(uri)
 
 # Special external names of PGEF classes
@@ -868,7 +868,249 @@ def get_ra_id(ra_context_id, role_id, fname, mi, lname):
     else:
         return '-'.join([role_id, '_'.join([lname, fname, mi])])
 
-def get_next_ref_des(assembly, component, prefix=None, product_type=None):
+# The caches below hold the values (reference designators, sequence numbers,
+# id suffixes) used by existing objects, so that the next value can be
+# allocated without rescanning the objects:  each is seeded from the objects
+# when first needed and is then kept up to date by the orb, which calls
+# note_saved() and note_deleted() for the objects it saves and deletes.
+# Allocating a value does not change the caches, so the same value is returned
+# until an object that uses it is saved -- unless the caller asks for it to be
+# "reserved" (`reserve=True`), so that objects that are created together and
+# saved later (e.g. by clone()) get distinct values.  A reserved value is
+# released when an object that uses it is saved or when release_seqz() is
+# called.
+
+# ref_desz:      assembly oid -> reference designators of its Acus
+# port_seqz:     (product oid, port type oid) -> sequence numbers of its Ports
+# rqt_seqz:      (owner oid, level) -> sequence numbers of its Requirements
+# product_sfxz:  {None: id suffixes of all HardwareProducts and Templates}
+ref_desz = {}
+port_seqz = {}
+rqt_seqz = {}
+product_sfxz = {}
+# maps the oid of each object in a cache to (cache, key)
+_seq_owners = {}
+# the _UsedValues that have reserved values
+_reserving = set()
+# the value of a port whose id does not end in an integer
+_BAD_SEQ = 'bad seq'
+# "max not known" marker
+_UNKNOWN = object()
+
+
+class _UsedValues(object):
+    """
+    The values used by a group of objects, by object oid, plus reserved
+    values (see above).  Each value is also counted in a group (the prefix of
+    a reference designator, the integer value of an id suffix, etc.).
+
+    Attributes:
+        by_oid (dict):  maps object oid to value
+        uses (Counter):  number of uses of each value (including reservations)
+        groups (Counter):  number of uses of each group
+        reserved (Counter):  number of reservations of each value
+    """
+    def __init__(self, items=(), group=None):
+        """
+        Args:
+            items (iterable):  (oid, value) tuples
+
+        Keyword Args:
+            group (function):  gets the group of a value (default: the value)
+        """
+        self.group = group or (lambda value: value)
+        self.by_oid = {}
+        self.uses = Counter()
+        self.groups = Counter()
+        self.reserved = Counter()
+        self._max = _UNKNOWN
+        for oid, value in items:
+            self.set(oid, value)
+
+    def _count(self, value, n):
+        self.uses[value] += n
+        if not self.uses[value]:
+            del self.uses[value]
+        g = self.group(value)
+        self.groups[g] += n
+        if not self.groups[g]:
+            del self.groups[g]
+            if g == self._max:
+                self._max = _UNKNOWN
+        elif (n > 0 and type(g) is int and self._max is not _UNKNOWN
+              and (self._max is None or g > self._max)):
+            self._max = g
+
+    def set(self, oid, value):
+        """
+        Set the value used by an object (consuming a reservation of the value
+        if there is one).
+        """
+        if oid in self.by_oid:
+            if self.by_oid[oid] == value:
+                return
+            self._count(self.by_oid[oid], -1)
+        if self.reserved[value]:
+            self.reserved[value] -= 1
+            if not self.reserved[value]:
+                del self.reserved[value]
+            self._count(value, -1)
+        self.by_oid[oid] = value
+        self._count(value, 1)
+
+    def remove(self, oid):
+        """
+        Remove the value used by an object.
+        """
+        if oid in self.by_oid:
+            self._count(self.by_oid.pop(oid), -1)
+
+    def reserve(self, value):
+        """
+        Reserve a value that has been allocated.
+        """
+        self.reserved[value] += 1
+        self._count(value, 1)
+        _reserving.add(self)
+
+    def release(self):
+        """
+        Release all reserved values.
+        """
+        for value, n in self.reserved.items():
+            self._count(value, -n)
+        self.reserved.clear()
+
+    def max_int(self, exclude=None):
+        """
+        Get the greatest integer group (None if there are none), optionally
+        excluding one use of a group.
+        """
+        if self._max is _UNKNOWN:
+            self._max = max((g for g in self.groups if type(g) is int),
+                            default=None)
+        if (exclude is not None and exclude == self._max
+            and self.groups[exclude] == 1):
+            return max((g for g in self.groups
+                        if type(g) is int and g != exclude), default=None)
+        return self._max
+
+
+def _get_used_values(cache, key, items, group=None):
+    """
+    Get the used values for a key of a cache, seeding them from the specified
+    (oid, value) items if they are not cached.
+    """
+    if key not in cache:
+        items = list(items() if callable(items) else items)
+        cache[key] = _UsedValues(items, group=group)
+        for oid, value in items:
+            _seq_owners[oid] = (cache, key)
+    return cache[key]
+
+
+def _ref_des_prefix(ref_des):
+    # product_type abbreviation should not contain '-', but it can
+    if ref_des:
+        return ''.join(ref_des.split('-')[:-1])
+    return None
+
+
+def _int_or_none(s):
+    try:
+        return int(s)
+    except:
+        return None
+
+
+def _port_seq(port):
+    try:
+        return int(port.id.split('-')[-1])
+    except:
+        return _BAD_SEQ
+
+
+def _rqt_seq(rqt):
+    rqt_id = getattr(rqt, 'id', None) or 'unknown'
+    if rqt_id == 'unknown':
+        return None
+    return _int_or_none(rqt_id.split('.')[-1])
+
+
+def _product_sfx(product):
+    return (product.id or '').split('-')[-1]
+
+
+def note_saved(obj):
+    """
+    Update the caches of used values (see above) for an object that has been
+    saved.  Objects that are not Acus, Ports, Requirements, HardwareProducts
+    or Templates are ignored.
+
+    Args:
+        obj (Identifiable):  the saved object
+    """
+    cname = obj.__class__.__name__
+    if cname == 'Acu':
+        cache, key = ref_desz, getattr(obj.assembly, 'oid', None)
+        value = obj.reference_designator
+    elif cname == 'Port':
+        cache = port_seqz
+        key = (getattr(obj.of_product, 'oid', None),
+               getattr(obj.type_of_port, 'oid', None))
+        value = _port_seq(obj)
+    elif cname == 'Requirement':
+        cache = rqt_seqz
+        key = (getattr(obj.owner, 'oid', None),
+               getattr(obj, 'level', 0) or 0)
+        value = _rqt_seq(obj)
+    elif cname in ('HardwareProduct', 'Template'):
+        cache, key, value = product_sfxz, None, _product_sfx(obj)
+    else:
+        return
+    prev = _seq_owners.get(obj.oid)
+    if prev and (prev[0] is not cache or prev[1] != key):
+        note_deleted(obj.oid)
+    if key in cache:
+        cache[key].set(obj.oid, value)
+        _seq_owners[obj.oid] = (cache, key)
+
+
+def note_deleted(oid):
+    """
+    Update the caches of used values (see above) for an object that has been
+    deleted.
+
+    Args:
+        oid (str):  oid of the deleted object
+    """
+    prev = _seq_owners.pop(oid, None)
+    if prev and prev[1] in prev[0]:
+        prev[0][prev[1]].remove(oid)
+
+
+def clear_seqz():
+    """
+    Clear the caches of used values (see above) -- they will be seeded again
+    when next needed.
+    """
+    for cache in (ref_desz, port_seqz, rqt_seqz, product_sfxz,
+                  _seq_owners, _reserving):
+        cache.clear()
+
+
+def release_seqz():
+    """
+    Release all the values reserved by the allocators (see above) that have
+    not been used by a saved object.
+    """
+    for used in _reserving:
+        used.release()
+    _reserving.clear()
+
+
+def get_next_ref_des(assembly, component, prefix=None, product_type=None,
+                     reserve=False):
     """
     Get the next reference designator for the specified assembly and component.
 
@@ -884,6 +1126,9 @@ def get_next_ref_des(assembly, component, prefix=None, product_type=None):
             designator
         product_type (ProductType): a product type to use if component is None
             or does not have a product_type
+        reserve (bool): if True, reserve the reference designator until an Acu
+            that uses it is saved or release_seqz() is called (so that the
+            next call gets a different one)
     """
     prefix = ''
     if getattr(component, 'product_type', None):
@@ -893,23 +1138,21 @@ def get_next_ref_des(assembly, component, prefix=None, product_type=None):
         prefix = product_type.abbreviation or product_type.name
     if not prefix:
         prefix = 'Generic'
-    acus = assembly.components
-    if acus:
-        rds = [acu.reference_designator for acu in acus]
-        # product_type abbreviation should not contain '-', but it can
-        all_prefixes = [(''.join(rd.split('-')[:-1])) for rd in rds if rd]
-        these_prefixes = [p for p in all_prefixes if p == prefix]
-        n = len(these_prefixes) + 1
-        refdes = f'{prefix}-{n:03}'
-        while 1:
-            if refdes not in rds:
-                break
-            else:
-                n += 1
-                refdes = f'{prefix}-{n:02}'
-        return refdes
-    else:
-        return prefix + '-001'
+    rds = _get_used_values(ref_desz, assembly.oid,
+                           lambda: [(acu.oid, acu.reference_designator)
+                                    for acu in assembly.components],
+                           group=_ref_des_prefix)
+    n = rds.groups[prefix] + 1
+    refdes = f'{prefix}-{n:03}'
+    while 1:
+        if not rds.uses[refdes]:
+            break
+        else:
+            n += 1
+            refdes = f'{prefix}-{n:02}'
+    if reserve:
+        rds.reserve(refdes)
+    return refdes
 
 def get_ra_name(ra_context_id, role_id, fname, mi, lname):
     """
@@ -1052,25 +1295,107 @@ def get_parm_rel_name(rel_name, pname):
     """
     return rel_name + ' ' + pname + ' Parameter Relation'
 
-def get_next_port_seq(obj, port_type):
+def get_next_port_seq(obj, port_type, reserve=False):
     """
     Get the next sequence number for an object and a type of port.
 
     Args:
         obj (Modelable):  object that may have ports
         port_type (PortType):  the PortType to be considered
+
+    Keyword Args:
+        reserve (bool):  if True, reserve the sequence number until a Port
+            that uses it is saved or release_seqz() is called (so that the
+            next call gets a different one)
     """
-    if not getattr(obj, 'ports', None):
-        return 0
-    try:
-        seq_ints = [int(port.id.split('-')[-1]) for port in obj.ports
-                    if port.type_of_port is port_type]
-        if seq_ints:
-            return max(seq_ints) + 1
-        else:
-            return 0
-    except:
+    # NOTE:  check the class -- getting 'ports' may be expensive
+    if not hasattr(obj.__class__, 'ports'):
         return 0
+    seqs = _get_used_values(port_seqz,
+                            (obj.oid, getattr(port_type, 'oid', None)),
+                            lambda: [(port.oid, _port_seq(port))
+                                     for port in obj.ports or []
+                                     if port.type_of_port is port_type])
+    if seqs.groups[_BAD_SEQ] or seqs.max_int() is None:
+        seq = 0
+    else:
+        seq = seqs.max_int() + 1
+    if reserve:
+        seqs.reserve(seq)
+    return seq
+
+def get_next_rqt_seq(owner, level, get_reqs, reserve=False):
+    """
+    Get the next sequence number for a given owner (project) and requirement
+    level, for use in creating a new requirement "id" in the format:
+
+        [owner.id]-[level].[seq]
+
+    Args:
+        owner (Organization or Project):  the owner of the requirement
+        level (int):  the level of the requirement
+        get_reqs (function):  function that returns the requirements of the
+            owner at the specified level (only called if they are not cached)
+
+    Keyword Args:
+        reserve (bool):  if True, reserve the sequence number until a
+            Requirement that uses it is saved or release_seqz() is called (so
+            that the next call gets a different one)
+    """
+    level = level or 0
+    seqs = _get_used_values(rqt_seqz, (getattr(owner, 'oid', None), level),
+                            lambda: [(req.oid, _rqt_seq(req))
+                                     for req in get_reqs()])
+    seq = max(1, (seqs.max_int() or 0) + 1)
+    if reserve:
+        seqs.reserve(seq)
+    return seq
+
+def get_product_id_suffixes(get_products):
+    """
+    Get the id suffixes of all HardwareProducts and Templates (used by the
+    orb's gen_product_id()).
+
+    Args:
+        get_products (function):  function that returns all HardwareProducts
+            and Templates (only called if their suffixes are not cached)
+    """
+    return _get_used_values(product_sfxz, None,
+                            lambda: [(p.oid, _product_sfx(p))
+                                     for p in get_products()],
+                            group=_int_or_none)
+
+def product_id_suffix_is_unique(product_id, sfxs):
+    """
+    Check whether the suffix of a product id is unique (used by no other
+    product), assuming it is used by the product.
+
+    Args:
+        product_id (str):  the product id
+        sfxs (_UsedValues):  result of get_product_id_suffixes()
+    """
+    return sfxs.uses[(product_id or '').split('-')[-1]] <= 1
+
+def get_next_product_id_suffix(product_id, sfxs):
+    """
+    Get a new product id suffix:  one greater than the greatest integer suffix
+    in use by other products.
+
+    Args:
+        product_id (str):  the current id of the product
+        sfxs (_UsedValues):  result of get_product_id_suffixes()
+    """
+    current = (product_id or '').split('-')[-1]
+    # the current suffix is assumed to be used by the product itself
+    exclude = None
+    if sfxs.uses[current]:
+        exclude = current
+    n = sfxs.max_int(exclude=_int_or_none(exclude)) or 0
+    n = max(0, n)
+    sfx = str(n).zfill(7)
+    if sfxs.uses[sfx] - (sfx == exclude):
+        sfx = str(n + 1).zfill(7)
+    return sfx
 
 def get_port_id(of_product_id, port_type_id, seq):
     """
@@ -1,7 +1,7 @@
 """
 Functions to support Parameters, Relations, and Data Elements
 """
-import json, os
+import json, os, threading
 from collections import namedtuple
 from copy        import deepcopy
 from decimal     import Decimal
@@ -16,13 +16,18 @@ from pangalactic.core.meta            import (SELECTABLE_VALUES,
                                               DEFAULT_PRODUCT_TYPE_DATA_ELMTS,
                                               DEFAULT_PRODUCT_TYPE_PARAMETERS,
                                               intconv)
-from pangalactic.core.units           import in_si, ureg
+from pangalactic.core.units           import (get_ureg, in_si,
+                                              parse_units_expr)
 from pangalactic.core.utils.datetimes import dtstamp
 
 # dispatcher (Louie)
 from pydispatch import dispatcher
 
-Q_ = ureg.Quantity
+def Q_(*args, **kw):
+    """
+    Create a pint Quantity (the pint unit registry is created on first use).
+    """
+    return get_ureg().Quantity(*args, **kw)
 
 class logger:
     def info(self, s):
@@ -120,6 +125,32 @@ def make_de_html(deid, tag='p', style=''):
 componentz = {}
 Comp = namedtuple('Comp', 'oid usage_oid quantity reference_designator')
 
+# _refreshed:  while the 'componentz' and 'systemz' caches are being built in
+# the background (see orb.start(deferred=True)), the oids of the entries that
+# have been refreshed or removed since the build began -- the background build
+# reads a snapshot of the db that may predate those changes, so it must not
+# overwrite them (see track_cache_refreshes() and merge_startup_caches())
+_cachez_lock = threading.Lock()
+_refreshed = None
+
+def get_comps(product):
+    """
+    Return the `componentz` entry for a Product instance (see
+    refresh_componentz) without caching it.
+
+    Args:
+        product (Product):  the Product instance
+
+    Returns:
+        list of Comp namedtuples
+    """
+    return [Comp._make((getattr(acu.component, 'oid', None),
+                        acu.oid,
+                        acu.quantity or 1,
+                        acu.reference_designator))
+            for acu in product.components
+            if acu.component]
+
 def refresh_componentz(product):
     """
     Refresh the `componentz` cache for a Product instance. This must be called
@@ -139,13 +170,97 @@ def refresh_componentz(product):
     """
     if product:
         # log.debug('* refresh_componentz({})'.format(product.id))
-        componentz[product.oid] = [Comp._make((
-                                        getattr(acu.component, 'oid', None),
-                                        acu.oid,
-                                        acu.quantity or 1,
-                                        acu.reference_designator))
-                                   for acu in product.components
-                                   if acu.component]
+        comps = get_comps(product)
+        with _cachez_lock:
+            componentz[product.oid] = comps
+            if _refreshed is not None:
+                _refreshed['componentz'].add(product.oid)
+        invalidate_assembly_metrics(product.oid)
+
+def remove_componentz(product_oid):
+    """
+    Remove the `componentz` entry (if any) of a Product that has been deleted.
+
+    Args:
+        product_oid (str):  oid of the Product
+    """
+    with _cachez_lock:
+        found = componentz.pop(product_oid, None) is not None
+        if _refreshed is not None:
+            _refreshed['componentz'].add(product_oid)
+    if found:
+        invalidate_assembly_metrics(product_oid)
+
+# format:  {product.oid : (levels, nodes)}
+#          ... derived from 'componentz', where:
+#            levels (int): number of levels of assembly (1 for a product with
+#                          no components)
+#            nodes (int): number of nodes (Acus) at every level of assembly
+assembly_metricz = {}
+# format:  {product.oid : set of oids of the assemblies whose metrics in
+#                         'assembly_metricz' were computed from it}
+_metric_users = {}
+
+def get_assembly_metrics(product_oid):
+    """
+    Get the number of levels of assembly and the number of nodes in the
+    assembly tree of the product with the specified oid, using (and filling)
+    the `assembly_metricz` cache -- the metrics of each sub-assembly are
+    computed only once.  An Acu that closes a cycle is counted as a node but
+    its component's assembly is ignored.
+
+    Args:
+        product_oid (str):  oid of a Product instance
+
+    Returns:
+        tuple:  (levels, nodes)
+    """
+    if product_oid in assembly_metricz:
+        return assembly_metricz[product_oid]
+    on_path = set()
+    todo = [(product_oid, False)]
+    while todo:
+        oid, expanded = todo.pop()
+        if oid in assembly_metricz:
+            continue
+        comp_oids = [c.oid for c in componentz.get(oid) or [] if c.oid]
+        if not expanded:
+            if oid in on_path:
+                continue
+            on_path.add(oid)
+            todo.append((oid, True))
+            todo += [(comp_oid, False) for comp_oid in comp_oids
+                     if comp_oid not in assembly_metricz
+                     and comp_oid not in on_path]
+            continue
+        on_path.discard(oid)
+        levels, nodes = 1, 0
+        for comp_oid in comp_oids:
+            comp_levels, comp_nodes = assembly_metricz.get(comp_oid, (0, 0))
+            levels = max(levels, comp_levels + 1)
+            nodes += comp_nodes + 1
+            _metric_users.setdefault(comp_oid, set()).add(oid)
+        assembly_metricz[oid] = (levels, nodes)
+    return assembly_metricz[product_oid]
+
+def invalidate_assembly_metrics(product_oid=None):
+    """
+    Discard the cached assembly metrics of a product and of every assembly
+    that uses it at any level.  This must be called whenever the `componentz`
+    entry of a product is changed (refresh_componentz() calls it).
+
+    Keyword Args:
+        product_oid (str):  oid of the product (if None, discard all metrics)
+    """
+    if product_oid is None:
+        assembly_metricz.clear()
+        _metric_users.clear()
+        return
+    todo = [product_oid]
+    while todo:
+        oid = todo.pop()
+        assembly_metricz.pop(oid, None)
+        todo += _metric_users.pop(oid, ())
 
 def node_count(product_oid):
     """
@@ -155,13 +270,7 @@ def node_count(product_oid):
     Args:
         product_oid (str):  oid of a Product instance
     """
-    count = 0
-    if componentz.get(product_oid):
-        count += len(componentz[product_oid])
-        if count:
-            for c in componentz[product_oid]:
-                count += node_count(c.oid)
-    return count
+    return get_assembly_metrics(product_oid)[1]
 
 def serialize_compz(compz_data):
     """
@@ -218,6 +327,7 @@ def load_compz(dir_path):
             except:
                 return 'fail'
         componentz.update(deserialize_compz(stored_componentz))
+        invalidate_assembly_metrics()
         return 'success'
     else:
         log.debug('  - "components.json" was not found.')
@@ -236,6 +346,23 @@ def load_compz(dir_path):
 systemz = {}
 System = namedtuple('System', 'oid usage_oid system_role')
 
+def get_systems(project):
+    """
+    Return the `systemz` entry for a Project instance (see refresh_systemz)
+    without caching it.
+
+    Args:
+        project (Project):  the Project instance
+
+    Returns:
+        list of System namedtuples
+    """
+    return [System._make((getattr(psu.system, 'oid', ''),
+                          psu.oid,
+                          psu.system_role))
+            for psu in project.systems
+            if psu.system]
+
 def refresh_systemz(project):
     """
     Refresh the `systemz` cache for a Project instance. This must be called
@@ -255,12 +382,58 @@ def refresh_systemz(project):
     """
     if project:
         # log.debug('* refresh_systemz({})'.format(project.id))
-        systemz[project.oid] = [System._make((
-                                        getattr(psu.system, 'oid', ''),
-                                        psu.oid,
-                                        psu.system_role))
-                                   for psu in project.systems
-                                   if psu.system]
+        systems = get_systems(project)
+        with _cachez_lock:
+            systemz[project.oid] = systems
+            if _refreshed is not None:
+                _refreshed['systemz'].add(project.oid)
+
+def remove_systemz(project_oid):
+    """
+    Remove the `systemz` entry (if any) of a Project that has been deleted.
+
+    Args:
+        project_oid (str):  oid of the Project
+    """
+    with _cachez_lock:
+        systemz.pop(project_oid, None)
+        if _refreshed is not None:
+            _refreshed['systemz'].add(project_oid)
+
+def track_cache_refreshes():
+    """
+    Begin tracking the `componentz` and `systemz` entries that are refreshed
+    or removed, until merge_startup_caches() is called.  Called before the
+    caches are built in the background, so that the main thread's changes
+    made during the build are not overwritten by the merge.
+    """
+    global _refreshed
+    with _cachez_lock:
+        _refreshed = dict(componentz=set(), systemz=set())
+
+def merge_startup_caches(compz=None, sysz=None):
+    """
+    Merge `componentz` and `systemz` entries built in the background into the
+    caches, skipping those refreshed or removed since track_cache_refreshes()
+    was called, and stop tracking.  (Called with no arguments, just stops
+    tracking.)
+
+    Keyword Args:
+        compz (dict):  maps Product oids to lists of Comp namedtuples
+        sysz (dict):  maps Project oids to lists of System namedtuples
+    """
+    global _refreshed
+    with _cachez_lock:
+        refreshed = _refreshed or dict(componentz=set(), systemz=set())
+        _refreshed = None
+        for oid, comps in (compz or {}).items():
+            if oid not in refreshed['componentz']:
+                componentz[oid] = comps
+        for oid, systems in (sysz or {}).items():
+            if oid not in refreshed['systemz']:
+                systemz[oid] = systems
+    if compz:
+        invalidate_assembly_metrics()
 
 def project_node_count(project_oid):
     """
@@ -270,13 +443,9 @@ def project_node_count(project_oid):
     Args:
         project_oid (str):  oid of a Project instance
     """
-    count = 0
-    if systemz.get(project_oid):
-        count += len(systemz[project_oid])
-        if count:
-            for system in systemz[project_oid]:
-                count += node_count(system.oid)
-    return count
+    systems = systemz.get(project_oid) or []
+    return len(systems) + sum(node_count(system.oid) for system in systems
+                              if system.oid)
 
 def serialize_systemz(systemz_data):
     """
@@ -574,6 +743,67 @@ def save_parmz_by_dimz(dir_path):
         f.write(json.dumps(parmz_by_dimz, separators=(',', ':'),
                            indent=4, sort_keys=True))
 
+# definitions cache:  the `parm_defz`, `de_defz` and `parmz_by_dimz` caches
+# persisted together in the file 'definitions.json', with a key that
+# identifies the definitions they were created from, so that at startup the
+# orb can load them instead of recreating them -- see orb.load_defz()
+DEFZ_CACHE_VERSION = 1
+
+def save_defz(dir_path, key):
+    """
+    Save the `parm_defz`, `de_defz` and `parmz_by_dimz` caches to the
+    "definitions.json" file.
+
+    Args:
+        dir_path (str):  path of the directory to save the file in
+        key (dict):  json-serializable key of the definitions from which the
+            caches were created
+    """
+    log.debug('* save_defz() ...')
+    fpath = os.path.join(dir_path, 'definitions.json')
+    try:
+        with open(fpath, 'w') as f:
+            f.write(json.dumps(dict(version=DEFZ_CACHE_VERSION, key=key,
+                                    parm_defz=parm_defz, de_defz=de_defz,
+                                    parmz_by_dimz=parmz_by_dimz),
+                               separators=(',', ':')))
+        log.debug('  ... definitions.json file written.')
+    except:
+        log.debug('  ... writing definitions.json file failed!')
+
+def load_defz(dir_path):
+    """
+    Load the `parm_defz`, `de_defz` and `parmz_by_dimz` caches from the
+    "definitions.json" file, replacing their current content.
+
+    Args:
+        dir_path (str):  path of the directory containing the file
+
+    Returns:
+        dict:  the key that the caches were saved with (see save_defz), or
+            None if the file was not found or could not be read, in which
+            case the caches are not changed
+    """
+    log.debug('* load_defz() ...')
+    fpath = os.path.join(dir_path, 'definitions.json')
+    if not os.path.exists(fpath):
+        log.debug('  - "definitions.json" was not found.')
+        return None
+    try:
+        with open(fpath) as f:
+            data = json.loads(f.read())
+        if data.get('version') != DEFZ_CACHE_VERSION:
+            return None
+    except:
+        log.debug('  - reading of "definitions.json" failed.')
+        return None
+    for cache, name in [(parm_defz, 'parm_defz'), (de_defz, 'de_defz'),
+                        (parmz_by_dimz, 'parmz_by_dimz')]:
+        cache.clear()
+        cache.update(data[name])
+    log.debug('  - definitions caches loaded.')
+    return data['key']
+
 # rqt_allocz:  runtime requirement allocations cache
 # purpose:  optimize performance of margin calculations
 # format:  {rqt_oid : [usage_oid, obj_oid, alloc_ref, pid, constraint]}
@@ -945,11 +1175,33 @@ def update_parmz_by_dimz(pd):
         pd (ParameterDefinition):  ParameterDefinition being added or modified
     """
     # log.debug('* refresh_parmz_by_dimz')
+    # if the dimensions of an existing pd were modified, remove it from its
+    # previous dimension
+    for dim, pids in parmz_by_dimz.items():
+        if dim != pd.dimensions and pd.id in pids:
+            pids.remove(pd.id)
     if pd.dimensions in parmz_by_dimz:
-        parmz_by_dimz[pd.dimensions].append(pd.id)
+        if pd.id not in parmz_by_dimz[pd.dimensions]:
+            parmz_by_dimz[pd.dimensions].append(pd.id)
     else:
         parmz_by_dimz[pd.dimensions] = [pd.id]
 
+def remove_parm_def(variable):
+    """
+    Remove the parameter definitions of a variable (i.e. the base parameter
+    and all its context parameters) from the `parm_defz` and `parmz_by_dimz`
+    caches when its ParameterDefinition is deleted.
+
+    Args:
+        variable (str):  id of the ParameterDefinition
+    """
+    for pid in [pid for pid, pdz in parm_defz.items()
+                if pdz.get('variable') == variable]:
+        del parm_defz[pid]
+    for pids in parmz_by_dimz.values():
+        if variable in pids:
+            pids.remove(variable)
+
 def add_parameter(oid, pid):
     """
     Add a new parameter to an object, which means adding a parameter's value to
@@ -1040,9 +1292,57 @@ def delete_parameter(oid, pid, local=True):
         if local:
             dispatcher.send(signal='parm del', oid=oid, pid=pid)
 
+# parmz_ready:  cleared while a deferred (background) recompute of the computed
+# parameters is pending -- see orb.start(deferred=True); get_pval() waits on it
+# for computed parameters, except in the thread doing the recompute (whose
+# compute functions call get_pval)
+parmz_ready = threading.Event()
+parmz_ready.set()
+_recompute_thread = None
+
+def begin_deferred_recompute(thread):
+    """
+    Mark computed parameter values as pending until end_deferred_recompute()
+    is called.
+
+    Args:
+        thread (threading.Thread):  the thread that will call
+            recompute_parmz() and then end_deferred_recompute()
+    """
+    global _recompute_thread
+    _recompute_thread = thread
+    parmz_ready.clear()
+
+def end_deferred_recompute():
+    """
+    Mark computed parameter values as ready (releases any waiting get_pval).
+    """
+    global _recompute_thread
+    _recompute_thread = None
+    parmz_ready.set()
+
+def wait_for_parmz(timeout=None):
+    """
+    Wait until a pending deferred recompute of computed parameters is done
+    (returns immediately if none is pending or if called from the thread that
+    is doing the recompute).
+
+    Keyword Args:
+        timeout (float):  maximum number of seconds to wait (None: no limit)
+
+    Returns:
+        bool:  True if computed parameter values are ready
+    """
+    if (parmz_ready.is_set() or
+        threading.current_thread() is _recompute_thread):
+        return True
+    return parmz_ready.wait(timeout)
+
 def get_pval(oid, pid, units='', allow_nan=False):
     """
     Return a cached parameter value in base units or in the units specified.
+    If the parameter is computed and a deferred recompute is pending, waits
+    for the recompute to finish.
 
     Args:
         oid (str): the oid of the object that has the parameter
@@ -1058,6 +1358,8 @@ def get_pval(oid, pid, units='', allow_nan=False):
         # log.debug('* get_pval: "{}" does not have a definition.'.format(
                                                                         # pid))
         return 0.0
+    if not parmz_ready.is_set() and pdz.get('computed'):
+        wait_for_parmz()
     if not parameterz.get(oid):
         parameterz[oid] = {}
     if not units:
@@ -1084,14 +1386,82 @@ def get_pval(oid, pid, units='', allow_nan=False):
                     return 0.0
             else:
                 base_val = parameterz[oid][pid]
-                quan = Q_(base_val, ureg.parse_expression(in_si[dims]))
-                quan_converted = quan.to(units)
+                quan = Q_(base_val, parse_units_expr(in_si[dims]))
+                quan_converted = quan.to(parse_units_expr(units))
                 return quan_converted.magnitude
         except:
             # log.debug('  "{}": something bad happened with units.'.format(
                                                                       # pid))
             return NULL.get(pdz.get('range_datatype', 'float'))
 
+# _unit_convz:  cache of the unit conversions used by get_pvals()
+# format:  {(dimensions, units) : (scale, offset) or None}
+# -- a value in base units is converted to the specified units as
+# (scale * value + offset); None means the conversion is not possible
+_unit_convz = {}
+
+def get_unit_conversion(dims, units):
+    """
+    Return the (scale, offset) tuple that converts a value of the specified
+    dimensions from base units to the specified units, or None if the
+    conversion is not possible.
+
+    Args:
+        dims (str): the dimensions of the value
+        units (str): the units to convert to
+    """
+    if (dims, units) not in _unit_convz:
+        try:
+            base = parse_units_expr(in_si[dims])
+            to_units = parse_units_expr(units)
+            # offset is non-zero only for temperatures
+            offset = Q_(0.0, base).to(to_units).magnitude
+            scale = Q_(1.0, base).to(to_units).magnitude - offset
+            _unit_convz[(dims, units)] = (scale, offset)
+        except:
+            _unit_convz[(dims, units)] = None
+    return _unit_convz[(dims, units)]
+
+def get_pvals(oids, pid, units=''):
+    """
+    Return the cached values of a parameter for a list of objects, in base
+    units or in the units specified -- equivalent to calling get_pval() for
+    each oid, but the parameter definition and the unit conversion are only
+    looked up once (used for reports, e.g. the MEL).
+
+    Args:
+        oids (list of str): the oids of the objects that have the parameter
+        pid (str): the parameter 'id' value
+
+    Keyword Args:
+        units (str):  units in which the return values should be expressed
+    """
+    pdz = parm_defz.get(pid)
+    if not pdz:
+        return [0.0] * len(oids)
+    dims = pdz.get('dimensions')
+    if units and dims in ('percent', 'money'):
+        # special cases -- see get_pval()
+        return [get_pval(oid, pid, units=units) for oid in oids]
+    if not parmz_ready.is_set() and pdz.get('computed'):
+        wait_for_parmz()
+    vals = [(parameterz.get(oid) or {}).get(pid) for oid in oids]
+    if not units:
+        null = NULL.get(pdz.get('range_datatype', 'float') or 'float')
+        return [val or null for val in vals]
+    null = NULL.get(pdz.get('range_datatype', 'float'))
+    conv = get_unit_conversion(dims, units)
+    if conv is None:
+        return [null] * len(oids)
+    scale, offset = conv
+    pvals = []
+    for val in vals:
+        try:
+            pvals.append(scale * val + offset)
+        except:
+            pvals.append(null)
+    return pvals
+
 def get_pval_as_str(oid, pid, units='', allow_nan=False):
     """
     Return a cached parameter value in the specified units (or in base units if
@@ -1133,8 +1503,8 @@ def get_pval_as_str(oid, pid, units='', allow_nan=False):
             base_val = get_pval(oid, pid)
             if units:
                 # TODO: ignore units if not compatible
-                quan = Q_(base_val, ureg.parse_expression(in_si[dims]))
-                quan_converted = quan.to(units)
+                quan = Q_(base_val, parse_units_expr(in_si[dims]))
+                quan_converted = quan.to(parse_units_expr(units))
                 val = quan_converted.magnitude
             else:
                 val = base_val
@@ -1224,12 +1594,17 @@ def _compute_pval(oid, variable, context_id, allow_nan=False):
         val = parameterz[oid].get(pid) or 0.0
     return val
 
-def recompute_parmz():
+def recompute_parmz(send_signal=True):
     """
     Recompute any computed parameters for the configured variables and
     contexts.  This is required at startup or when a parameter is created,
     modified, or deleted, or in several other cases.
 
+    Keyword Args:
+        send_signal (bool):  if True, send the 'parameters recomputed' signal
+            when done (False when run in a background thread, since the
+            signal's receivers may have to run in the main thread)
+
     NOTE: recompute_parmz() is a no-op when running on client side in
     "connected" state; instead, the client must call vger.get_parmz() to
     get the parameter cache data from the server rather than recomputing
@@ -1268,9 +1643,11 @@ def recompute_parmz():
     #     re-allocated
     pid_deletions = []
     oid_deletions = set()
-    for oid in parameterz:
-        if parameterz[oid] is not None:
-            for pid in parameterz[oid]:
+    # (iterate over copies, since in a deferred recompute parameterz may be
+    # modified by other threads)
+    for oid, parms in list(parameterz.items()):
+        if parms is not None:
+            for pid in list(parms):
                 if 'Margin' in pid or 'NTE' in pid:
                     pid_deletions.append((oid, pid))
         else:
@@ -1281,7 +1658,8 @@ def recompute_parmz():
             oid_deletions.add(oid)
     for oid in oid_deletions:
         del parameterz[oid]
-    dispatcher.send('parameters recomputed')
+    if send_signal:
+        dispatcher.send('parameters recomputed')
 
 def set_pval(oid, pid, value, units='', local=True):
     """
@@ -1342,7 +1720,7 @@ def set_pval(oid, pid, value, units='', local=True):
             # TODO:  validate units (ensure they are consistent with dims)
             dims = pdz.get('dimensions')
             try:
-                quan = Q_(value, ureg.parse_expression(units))
+                quan = Q_(value, parse_units_expr(units))
                 quan_base = quan.to_base_units()
                 converted_value = quan_base.magnitude
             except:
@@ -1671,7 +2049,7 @@ def compute_margin(usage_oid, pid, default=0):
         nte = constraint.max
         nte_units = constraint.units
         # convert NTE value to base units, if necessary
-        quan = nte * ureg.parse_expression(nte_units)
+        quan = nte * parse_units_expr(nte_units)
         quan_base = quan.to_base_units()
         converted_nte = quan_base.magnitude
     else:
@@ -1680,7 +2058,7 @@ def compute_margin(usage_oid, pid, default=0):
         return 'undefined'
     mev = _compute_pval(obj_oid, variable, 'MEV')
     # convert NTE value to base units, if necessary
-    quan = nte * ureg.parse_expression(nte_units)
+    quan = nte * parse_units_expr(nte_units)
     quan_base = quan.to_base_units()
     converted_nte = quan_base.magnitude
     # log.debug('  compute_margin: nte is {}'.format(converted_nte))
@@ -1729,7 +2107,7 @@ def compute_requirement_margin(rqt_oid, default=0):
             nte = constraint.max
             nte_units = constraint.units
             # convert NTE value to base units, if necessary
-            quan = nte * ureg.parse_expression(nte_units)
+            quan = nte * parse_units_expr(nte_units)
             quan_base = quan.to_base_units()
             converted_nte = quan_base.magnitude
         except:
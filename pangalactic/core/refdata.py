@@ -1,7 +1,7 @@
 """
 PanGalactic reference data
 """
-import datetime
+import datetime, hashlib
 epoch = '2021-01-01 00:00:00'
 
 initial = [
@@ -5159,6 +5159,19 @@ deprecated = [
     'sysml:Parametric',
     ]
 ############################################################################
+# Reference data version manifest -- used by orb.load_reference_data() to
+# detect new and updated reference data without deserializing anything:
+# ref_mod_dts maps the oid of every reference data object to its
+# 'mod_datetime' (as a datetime, or None if it has none) and ref_digest is a
+# digest of the manifest (and the deprecated oids), which is saved in the
+# "refdata_digest" state variable when reference data has been loaded.
+ref_mod_dts = {d['oid'] : (d.get('mod_datetime') and
+                           datetime.datetime.fromisoformat(d['mod_datetime']))
+               for d in initial + pdc + deds + core}
+ref_digest = hashlib.sha256('\n'.join(
+                [f'{oid} {dt}' for oid, dt in sorted(ref_mod_dts.items())] +
+                sorted(deprecated)).encode('utf-8')).hexdigest()
+############################################################################
 """
 Technology Readiness Levels (TRL)
 
@@ -13,7 +13,7 @@ The Pan Galactic Meta Object Registry
 # [DONE] generate registry schemas from kb classes + properties
 
 # Python
-import glob, os, pkgutil, shutil
+import glob, hashlib, os, pkgutil, shutil
 from collections import OrderedDict
 
 # SqlAlchemy
@@ -29,6 +29,7 @@ from pangalactic.core.kb             import get_ontology_prefix
 from pangalactic.core.meta           import dump_metadata, load_metadata
 from pangalactic.core.meta           import property_to_field
 from pangalactic.core.names          import namespaces, to_table_name
+from pangalactic.core.names          import register_ns, NS
 
 
 # create SqlAlchemy declarative 'Base' class for MetaObject classes
@@ -69,6 +70,7 @@ class PanGalacticRegistry(object):
         classes (dict):  A mapping of `meta_id`s to runtime app classes.
         persistables (set):  The names of schemas for which there are db tables
         kb (p.meta.kb.KB):  An RDF graph containing the app ontology
+            (created when first used -- see the `kb` property)
         ces (dict):  A mapping of `meta_id`s to `Class` extracts
         pes (dict):  A mapping of `meta_id`s to `Property` extracts
         nses (dict):  A mapping of namespace prefixes to namespace extracts
@@ -143,10 +145,18 @@ class PanGalacticRegistry(object):
         if not os.path.exists(self.onto_path): 
             os.makedirs(self.onto_path)
         pgef_owl_path = str(os.path.join(self.onto_path, 'pgef.owl'))
-        f = open(pgef_owl_path, 'w')
-        f.write(str(pkgutil.get_data('pangalactic.core.ontology',
-                                     'pgef.owl').decode('utf-8')))
-        f.close()
+        pgef_owl = pkgutil.get_data('pangalactic.core.ontology',
+                                    'pgef.owl').decode('utf-8')
+        # only (re)write pgef.owl if it is missing or its content has changed
+        owl_hash = hashlib.sha256(pgef_owl.encode('utf-8')).hexdigest()
+        cur_hash = ''
+        if os.path.exists(pgef_owl_path):
+            with open(pgef_owl_path) as f:
+                cur_hash = hashlib.sha256(f.read().encode('utf-8')).hexdigest()
+        if cur_hash != owl_hash:
+            with open(pgef_owl_path, 'w') as f:
+                f.write(pgef_owl)
+        self.pgef_owl_path = pgef_owl_path
         # self.log.debug('* not installed; using pgef.owl in home dir.')
         self.apps_dict = {}   # not currently used
         self.apps = []
@@ -165,12 +175,11 @@ class PanGalacticRegistry(object):
             self.log.info('* initializing local sqlite db.')
             local_db_path = os.path.join(self.home, 'local.db')
             self.db_engine = create_engine('sqlite:///%s' % local_db_path)
-        # create the KB (knowledgebase) and initialize the registry's schemas,
-        # which will be used in generating the database and app classes
-        # self.log.debug('* [registry] creating KB from pgef.owl source ...')
-        # self.log.debug('             (pgef.owl path: "{}")'.format(
-                                                            # pgef_owl_path))
-        self.kb = KB(pgef_owl_path)
+        # initialize the registry's schemas, which will be used in generating
+        # the database and app classes -- NOTE: the KB (knowledgebase) is only
+        # created (see the `kb` property) if the extracts must be created from
+        # an ontology source, i.e. not on a "warm start" from the cache
+        self._kb = None
         self._create_pgef_core_meta_objects(use_cache=(not force_new_core))
         # check for app ontologies -- if any are found, load them
         app_onto_files = [n for n in os.listdir(self.onto_path)
@@ -181,6 +190,18 @@ class PanGalacticRegistry(object):
                     self.build_app_classes_from_ontology(
                                     os.path.join(self.onto_path, fname))
 
+    @property
+    def kb(self):
+        """
+        The KB (knowledgebase), which is created from pgef.owl when first used
+        -- parsing the OWL file is expensive and unnecessary if all extracts
+        can be restored from the cache.
+        """
+        if self._kb is None:
+            # self.log.debug('* [registry] creating KB from pgef.owl ...')
+            self._kb = KB(self.pgef_owl_path)
+        return self._kb
+
     def _create_pgef_core_meta_objects(self, use_cache=True):
         """
         Build schemas and classes based on the pgef ontology.
@@ -300,7 +321,6 @@ class PanGalacticRegistry(object):
         Recreate the extract dictionaries (`nses`, `ces`, and `pes`) from their
         cached json serializations.
         """
-        # TODO:  register the namespaces in kb after getting their extracts
         for ns_prefix in os.listdir(self.cache_path):
             prefix_cache = os.path.join(self.cache_path, ns_prefix)
             nss_dir = os.path.join(prefix_cache, 'namespaces')
@@ -318,6 +338,15 @@ class PanGalacticRegistry(object):
                 for file_path in os.listdir(classes_dir):
                     ce = load_metadata(os.path.join(classes_dir, file_path))
                     self.ces[ce['id']] = ce
+        # register the cached namespaces (otherwise done by the KB when it
+        # reads pgef.owl, but the KB is not created when using the cache)
+        for e in self.nses.values():
+            if e['prefix'] not in namespaces:
+                register_ns(NS(e['prefix'], uri=e['uri'], names=e['names'],
+                               complete=e['complete'],
+                               iteration=e['iteration'],
+                               version=e['version'],
+                               meta_level=e['meta_level']))
 
     def _update_schemas_from_extracts(self):
         """
@@ -7,6 +7,9 @@ from datetime import date, datetime
 # python-dateutil
 import dateutil.parser as dtparser
 
+# Louie: dispatcher
+from pydispatch import dispatcher
+
 from pangalactic.core.meta import asciify, M2M, ONE2M
 from pangalactic.core.refdata     import ref_oids
 from pangalactic.core.utils.datetimes import earlier, EPOCH, EPOCH_DATE
@@ -617,7 +620,7 @@ def deserialize(orb, serialized, include_refdata=False, dictify=False,
     # if len(serialized) < new_len:
         # orb.log.info('  {} ref data object(s) found, ignored.'.format(
                                                # new_len - len(serialized)))
-    current_oids = orb.get_oids()
+    current_oids = set(orb.get_oids())
     # incoming_oids = [so['oid'] for so in serialized]
     for so in serialized:
         so_cname = so.get('_cname')
@@ -884,7 +887,7 @@ def deserialize(orb, serialized, include_refdata=False, dictify=False,
                     orb.db.add(obj)
                     objs.append(obj)
                     created.append(obj.id)
-                    current_oids.append(obj.oid)
+                    current_oids.add(obj.oid)
                     if dictify:
                         output['new'].append(obj)
                     if cname == 'Acu':
@@ -911,6 +914,9 @@ def deserialize(orb, serialized, include_refdata=False, dictify=False,
                     refresh_systemz(obj.project)
                     refresh_systemz_required = False
     orb.db.commit()
+    if any(isinstance(obj, orb.classes['RoleAssignment'])
+           for obj in objs + list(updates.values())):
+        dispatcher.send('role assignments changed')
     # log_txt = '* deserializer:'
     # if created:
         # orb.log.info('{} new object(s) deserialized: {}'.format(
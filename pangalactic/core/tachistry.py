@@ -3,7 +3,8 @@
 The Pan Galactic Tach Registry
 """
 # Python
-import glob, os, pkgutil, shutil
+import glob, hashlib, json, os, pkgutil, shutil, sys
+from collections.abc import MutableMapping
 
 # PanGalactic
 from pangalactic.core.datastructures import OrderedSet
@@ -12,7 +13,7 @@ from pangalactic.core.kb             import get_ontology_prefix
 from pangalactic.core.meta           import (dump_metadata, load_metadata,
                                              MAX_LENGTH, PGEF_PROPS_ORDER,
                                              READONLY)
-from pangalactic.core.names          import namespaces
+from pangalactic.core.names          import namespaces, register_ns, NS
 
 
 class FakeLog(object):
@@ -58,6 +59,10 @@ datatypes = {
     (False, None, False)      : set
     }
 
+# field types by name (used in restoring schemas from the schema bundle, in
+# which datatype field types are stored by name)
+field_types = {t.__name__: t for t in datatypes.values()}
+
 
 def property_to_field(name, pe):
     """
@@ -135,17 +140,287 @@ def property_to_field(name, pe):
 schemas = {}
 
 
-# matrix:  a module-level dictionary containing all class instances
+# SCHEMA_BUNDLE:  name of the file (in the cache directory) that holds a
+# consolidated copy of the cached extracts, the schemas derived from them, and
+# the subclass closure, so that a "warm start" can be done with a single read.
+# The bundle is only used if its 'version' matches SCHEMA_BUNDLE_VERSION and its
+# 'onto_hash' matches the hash of the current ontology files -- otherwise the
+# extracts are read from the per-extract files and the bundle is rewritten.
+# (Bump SCHEMA_BUNDLE_VERSION whenever the format of the bundle changes.)
+
+SCHEMA_BUNDLE = 'schemas.json'
+SCHEMA_BUNDLE_VERSION = 1
+
+
+# matrix:  a module-level mapping containing all class instances
 # and their attributes, accessed by Thing instances.  Its structure is:
 #
 #      {oid: object structure}
 #
-# where "object structure" is a dict in the format of a serialized object but
-# without the "parameters" and "data_elements" sub-dictionaries. It is
+# where "object structure" is a mapping in the format of a serialized object
+# but without the "parameters" and "data_elements" sub-dictionaries. It is
 # persisted in the file 'matrix.json' in the application home directory -- see
 # the functions 'save_matrix' and 'load_matrix'.
+#
+# NOTE:  the matrix is a ColumnarMatrix (see below), which stores the objects
+# of each class in columns (one list per field) rather than one dict per
+# object; `matrix[oid]` is a MatrixRow, a mapping view of an object's row.
+
+# ABSENT:  marker for a field that has no value in a row (i.e. a key that
+# would not be present in the object's dict) -- a column value of ABSENT is
+# read as "no value".
+ABSENT = object()
+
+
+class MatrixTable:
+    """
+    Columnar storage for the objects of one class in the matrix.
+
+    Attributes:
+        cname (str):  the class name
+        oids (list of str):  oids of the objects, indexed by row (None for a
+            free row)
+        columns (dict):  maps field names to lists of values, indexed by row
+            (ABSENT for no value)
+        free (list of int):  indices of free rows (rows of deleted objects)
+    """
+    __slots__ = ('cname', 'oids', 'columns', 'free')
+
+    def __init__(self, cname):
+        self.cname = cname
+        self.oids = []
+        self.columns = {}
+        self.free = []
+
+    def column(self, name):
+        """
+        Return the column for the specified field, creating it if necessary.
+        """
+        col = self.columns.get(name)
+        if col is None:
+            col = self.columns[name] = [ABSENT] * len(self.oids)
+        return col
+
+    def add_row(self, oid):
+        """
+        Add a row for the specified oid and return its index.
+        """
+        if self.free:
+            i = self.free.pop()
+            self.oids[i] = oid
+        else:
+            i = len(self.oids)
+            self.oids.append(oid)
+            for col in self.columns.values():
+                col.append(ABSENT)
+        return i
+
+    def remove_row(self, i):
+        """
+        Clear the specified row and make it available for reuse.
+        """
+        self.oids[i] = None
+        for col in self.columns.values():
+            col[i] = ABSENT
+        self.free.append(i)
+
+
+class MatrixRow(MutableMapping):
+    """
+    Mapping view of an object's row in the matrix -- behaves like the dict
+    of the object's attributes (including 'oid' and '_cname').
+    """
+    __slots__ = ('_matrix', 'oid')
+
+    def __init__(self, matrix, oid):
+        self._matrix = matrix
+        self.oid = oid
+
+    def __getitem__(self, name):
+        value = self._matrix.get_value(self.oid, name, ABSENT)
+        if value is ABSENT:
+            raise KeyError(name)
+        return value
+
+    def get(self, name, default=None):
+        return self._matrix.get_value(self.oid, name, default)
+
+    def __setitem__(self, name, value):
+        self._matrix.set_value(self.oid, name, value)
+
+    def __delitem__(self, name):
+        table, i = self._matrix.index[self.oid]
+        col = table.columns.get(name)
+        if name in ('oid', '_cname') or col is None or col[i] is ABSENT:
+            raise KeyError(name)
+        col[i] = ABSENT
+
+    def __iter__(self):
+        table, i = self._matrix.index[self.oid]
+        yield 'oid'
+        if table.cname is not None:
+            yield '_cname'
+        for name, col in list(table.columns.items()):
+            if col[i] is not ABSENT:
+                yield name
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnarMatrix(MutableMapping):
+    """
+    Mapping of oids to object structures (see `matrix`), in which the objects
+    of each class are stored in a MatrixTable.  Oids are interned.  Assigning
+    a mapping to `matrix[oid]` stores its items in the row for the oid (in the
+    table of its '_cname'); `matrix[oid]` returns a MatrixRow view of the row.
+    """
+    def __init__(self):
+        self._tables = {}
+        # index:  maps oids to (table, row index) -- also used directly by the
+        # FastOrb's attribute descriptors (see fastorb.MatrixField)
+        self.index = {}
 
-matrix = {}
+    def _table(self, cname):
+        table = self._tables.get(cname)
+        if table is None:
+            table = self._tables[cname] = MatrixTable(cname)
+        return table
+
+    def __getitem__(self, oid):
+        if oid not in self.index:
+            raise KeyError(oid)
+        return MatrixRow(self, oid)
+
+    def get(self, oid, default=None):
+        if oid in self.index:
+            return MatrixRow(self, oid)
+        return default
+
+    def __contains__(self, oid):
+        return oid in self.index
+
+    def __setitem__(self, oid, values):
+        values = dict(values)
+        cname = values.pop('_cname', None)
+        values.pop('oid', None)
+        if oid in self.index:
+            del self[oid]
+        oid = sys.intern(oid)
+        table = self._table(cname)
+        i = table.add_row(oid)
+        self.index[oid] = (table, i)
+        for name, value in values.items():
+            table.column(name)[i] = value
+
+    def __delitem__(self, oid):
+        table, i = self.index.pop(oid)
+        table.remove_row(i)
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def clear(self):
+        self._tables.clear()
+        self.index.clear()
+
+    def get_value(self, oid, name, default=None):
+        """
+        Get the value of a field of an object (fast path for attribute access
+        -- equivalent to `matrix[oid].get(name, default)`).
+        """
+        table, i = self.index[oid]
+        if name == 'oid':
+            return table.oids[i]
+        elif name == '_cname':
+            return default if table.cname is None else table.cname
+        col = table.columns.get(name)
+        if col is None:
+            return default
+        value = col[i]
+        return default if value is ABSENT else value
+
+    def set_value(self, oid, name, value):
+        """
+        Set the value of a field of an object (fast path for attribute access
+        -- equivalent to `matrix[oid][name] = value`).
+        """
+        table, i = self.index[oid]
+        if name == 'oid':
+            return
+        elif name == '_cname':
+            if value != table.cname:
+                # move the object to the table of its new class
+                values = dict(MatrixRow(self, oid))
+                values['_cname'] = value
+                self[oid] = values
+            return
+        table.column(name)[i] = value
+
+    def to_columns(self):
+        """
+        Return the contents of the matrix in columnar form (used by
+        `save_matrix`), with free rows removed, in the form:
+
+            {cname: {'oids': [oids],
+                     'columns': {field name: [values]},
+                     'absent': {field name: [indices of rows with no value]}}}
+        """
+        data = {}
+        for cname, table in self._tables.items():
+            rows = [i for i, oid in enumerate(table.oids) if oid is not None]
+            if not rows:
+                continue
+            columns = {}
+            absent = {}
+            for name, col in table.columns.items():
+                vals = [col[i] for i in rows]
+                missing = [j for j, v in enumerate(vals) if v is ABSENT]
+                if len(missing) == len(vals):
+                    continue
+                if missing:
+                    for j in missing:
+                        vals[j] = None
+                    absent[name] = missing
+                columns[name] = vals
+            data[cname or ''] = {'oids': [table.oids[i] for i in rows],
+                                 'columns': columns,
+                                 'absent': absent}
+        return data
+
+    def load_columns(self, data):
+        """
+        Add the contents of columnar data (in the form returned by
+        `to_columns`) to the matrix.
+        """
+        for cname, tdata in data.items():
+            cname = cname or None
+            table = self._table(cname)
+            absent = tdata.get('absent', {})
+            for oid in tdata['oids']:
+                if oid in self.index:
+                    del self[oid]
+            start = len(table.oids)
+            oids = [sys.intern(oid) for oid in tdata['oids']]
+            for name, col in table.columns.items():
+                col.extend([ABSENT] * len(oids))
+            table.oids.extend(oids)
+            for j, oid in enumerate(oids):
+                self.index[oid] = (table, start + j)
+            for name, vals in tdata['columns'].items():
+                vals = list(vals)
+                for j in absent.get(name, []):
+                    vals[j] = ABSENT
+                table.column(name)[start:] = vals
+
+
+matrix = ColumnarMatrix()
 
 
 class Tachistry:
@@ -160,9 +435,15 @@ class Tachistry:
             [default: `apps` -- other values are used only for testing]
         apps (list of str):  list of loaded apps (app ontology prefixes)
         kb (p.meta.kb.KB):  An RDF graph containing the app ontology
+            (created when first used -- see the `kb` property)
         ces (dict):  A mapping of `meta_id`s to `Class` extracts
         pes (dict):  A mapping of `meta_id`s to `Property` extracts
         nses (dict):  A mapping of namespace prefixes to namespace extracts
+        subclasses (dict):  A mapping of `meta_id`s to the set of `meta_id`s of
+            the class and all its subclasses (see `all_your_sub`)
+        onto_hash (str):  sha256 hash of the ontology files in `onto_path`
+        bundle_loaded (bool):  True if the extracts and schemas were restored
+            from the schema bundle (see SCHEMA_BUNDLE)
     """
     def __init__(self, home=None, cache_path='cache', onto_path='onto',
                  apps=None, log=None, version='', debug=False, console=False,
@@ -232,31 +513,64 @@ class Tachistry:
         if not os.path.exists(self.onto_path): 
             os.makedirs(self.onto_path)
         pgef_owl_path = str(os.path.join(self.onto_path, 'pgef.owl'))
-        f = open(pgef_owl_path, 'w')
-        f.write(str(pkgutil.get_data('pangalactic.core.ontology',
-                                     'pgef.owl').decode('utf-8')))
-        f.close()
+        pgef_owl = pkgutil.get_data('pangalactic.core.ontology',
+                                    'pgef.owl').decode('utf-8')
+        # only (re)write pgef.owl if it is missing or its content has changed
+        owl_hash = hashlib.sha256(pgef_owl.encode('utf-8')).hexdigest()
+        cur_hash = ''
+        if os.path.exists(pgef_owl_path):
+            with open(pgef_owl_path) as f:
+                cur_hash = hashlib.sha256(f.read().encode('utf-8')).hexdigest()
+        if cur_hash != owl_hash:
+            with open(pgef_owl_path, 'w') as f:
+                f.write(pgef_owl)
+        self.pgef_owl_path = pgef_owl_path
         # self.log.debug('* not installed; using pgef.owl in home dir.')
+        app_onto_files = sorted(n for n in os.listdir(self.onto_path)
+                                if n != 'pgef.owl')
+        # the ontology hash identifies the version of the schema bundle that
+        # corresponds to the current ontology files
+        onto_hash = hashlib.sha256(owl_hash.encode('utf-8'))
+        for fname in app_onto_files:
+            if fname.endswith('.owl'):
+                with open(os.path.join(self.onto_path, fname), 'rb') as f:
+                    onto_hash.update(fname.encode('utf-8'))
+                    onto_hash.update(f.read())
+        self.onto_hash = onto_hash.hexdigest()
+        self.schema_bundle_path = os.path.join(self.cache_path, SCHEMA_BUNDLE)
+        self.bundle_loaded = False
         self.apps_dict = {}   # not currently used
         self.apps = []
         self.ces = {}
         self.pes = {}
         self.nses = {}
-        # create the KB (knowledgebase) and initialize the registry's schemas,
-        # which will be used in generating the database and app classes
-        # self.log.debug('* [registry] creating KB from pgef.owl source ...')
-        # self.log.debug('             (pgef.owl path: "{}")'.format(
-                                                            # pgef_owl_path))
-        self.kb = KB(pgef_owl_path)
+        self.subclasses = {}
+        # initialize the registry's schemas, which will be used in generating
+        # the database and app classes -- NOTE: the KB (knowledgebase) is only
+        # created (see the `kb` property) if the extracts must be created from
+        # an ontology source, i.e. not on a "warm start" from the cache
+        self._kb = None
         self._create_pgef_core_meta_objects(use_cache=(not force_new_core))
         # check for app ontologies -- if any are found, load them
-        app_onto_files = [n for n in os.listdir(self.onto_path)
-                          if n != 'pgef.owl']
         if app_onto_files:
             for fname in app_onto_files:
                 if fname.endswith('.owl'):
                     self.build_schemas_from_ontology(
                                     os.path.join(self.onto_path, fname))
+        if not self.bundle_loaded:
+            self._save_schema_bundle()
+
+    @property
+    def kb(self):
+        """
+        The KB (knowledgebase), which is created from pgef.owl when first used
+        -- parsing the OWL file is expensive and unnecessary if all extracts
+        can be restored from the cache.
+        """
+        if self._kb is None:
+            # self.log.debug('* [registry] creating KB from pgef.owl ...')
+            self._kb = KB(self.pgef_owl_path)
+        return self._kb
 
     def _create_pgef_core_meta_objects(self, use_cache=True):
         """
@@ -366,35 +680,109 @@ class Tachistry:
         for meta_id, ce in new_ces.items():
             dump_metadata(ce, os.path.join(
                                 class_cache_path, meta_id + '.json'))
+        # the schema bundle (if any) no longer matches the cached extracts
+        if os.path.exists(self.schema_bundle_path):
+            os.remove(self.schema_bundle_path)
+        self.bundle_loaded = False
         # NOTE (CAVEAT!):  if there are any name collisions, new names will
         # clobber existing ones
         self.nses.update(new_nses)
         self.pes.update(new_pes)
         self.ces.update(new_ces)
+        self.subclasses = {}
 
     def _get_extracts_from_cache(self):
         """
         Recreate the extract dictionaries (`nses`, `ces`, and `pes`) from their
-        cached json serializations.
-        """
-        # TODO:  register the namespaces in kb after getting their extracts
-        for ns_prefix in os.listdir(self.cache_path):
-            prefix_cache = os.path.join(self.cache_path, ns_prefix)
-            nss_dir = os.path.join(prefix_cache, 'namespaces')
-            properties_dir = os.path.join(prefix_cache, 'properties')
-            classes_dir = os.path.join(prefix_cache, 'classes')
-            if os.path.exists(nss_dir):
-                for file_path in os.listdir(nss_dir):
-                    e = load_metadata(os.path.join(nss_dir, file_path))
-                    self.nses[e['prefix']] = e
-            if os.path.exists(properties_dir):
-                for file_path in os.listdir(properties_dir):
-                    pe = load_metadata(os.path.join(properties_dir, file_path))
-                    self.pes[pe['id']] = pe
-            if os.path.exists(classes_dir):
-                for file_path in os.listdir(classes_dir):
-                    ce = load_metadata(os.path.join(classes_dir, file_path))
-                    self.ces[ce['id']] = ce
+        cached json serializations -- from the schema bundle if it is current,
+        otherwise from the individual extract files.
+        """
+        if not self._load_schema_bundle():
+            for ns_prefix in os.listdir(self.cache_path):
+                prefix_cache = os.path.join(self.cache_path, ns_prefix)
+                nss_dir = os.path.join(prefix_cache, 'namespaces')
+                properties_dir = os.path.join(prefix_cache, 'properties')
+                classes_dir = os.path.join(prefix_cache, 'classes')
+                if os.path.exists(nss_dir):
+                    for file_path in os.listdir(nss_dir):
+                        e = load_metadata(os.path.join(nss_dir, file_path))
+                        self.nses[e['prefix']] = e
+                if os.path.exists(properties_dir):
+                    for file_path in os.listdir(properties_dir):
+                        pe = load_metadata(os.path.join(properties_dir,
+                                                        file_path))
+                        self.pes[pe['id']] = pe
+                if os.path.exists(classes_dir):
+                    for file_path in os.listdir(classes_dir):
+                        ce = load_metadata(os.path.join(classes_dir,
+                                                        file_path))
+                        self.ces[ce['id']] = ce
+        # register the cached namespaces (otherwise done by the KB when it
+        # reads pgef.owl, but the KB is not created when using the cache)
+        for e in self.nses.values():
+            if e['prefix'] not in namespaces:
+                register_ns(NS(e['prefix'], uri=e['uri'], names=e['names'],
+                               complete=e['complete'],
+                               iteration=e['iteration'],
+                               version=e['version'],
+                               meta_level=e['meta_level']))
+
+    def _load_schema_bundle(self):
+        """
+        Restore the extracts, schemas, and subclass closure from the schema
+        bundle, if it exists and was created from the current ontology files.
+
+        Returns:
+            True if the bundle has been loaded, otherwise False
+        """
+        if self.bundle_loaded:
+            return True
+        if not os.path.exists(self.schema_bundle_path):
+            return False
+        try:
+            with open(self.schema_bundle_path, 'rb') as f:
+                bundle = json.loads(f.read())
+        except (OSError, ValueError):
+            # self.log.debug('  - schema bundle unreadable; ignoring it.')
+            return False
+        if (bundle.get('version') != SCHEMA_BUNDLE_VERSION
+            or bundle.get('onto_hash') != self.onto_hash):
+            # self.log.debug('  - schema bundle is stale; ignoring it.')
+            return False
+        self.nses.update(bundle['nses'])
+        self.pes.update(bundle['pes'])
+        self.ces.update(bundle['ces'])
+        for meta_id, schema in bundle['schemas'].items():
+            if meta_id not in schemas:
+                for field in schema['fields'].values():
+                    if field['field_type'] != 'object':
+                        field['field_type'] = field_types[field['field_type']]
+                schemas[meta_id] = schema
+        self.subclasses = {meta_id: set(subs) for meta_id, subs
+                           in bundle['subclasses'].items()}
+        self.bundle_loaded = True
+        return True
+
+    def _save_schema_bundle(self):
+        """
+        Write the schema bundle, containing the current extracts, their schemas,
+        and the subclass closure, to the cache directory.
+        """
+        if not self.subclasses:
+            self._build_subclass_closure()
+        bundle = dict(version=SCHEMA_BUNDLE_VERSION,
+                      onto_hash=self.onto_hash,
+                      nses=self.nses,
+                      pes=self.pes,
+                      ces=self.ces,
+                      schemas={meta_id: schemas[meta_id]
+                               for meta_id in self.ces if meta_id in schemas},
+                      subclasses={meta_id: sorted(subs) for meta_id, subs
+                                  in self.subclasses.items()})
+        with open(self.schema_bundle_path, 'w') as f:
+            # datatype field types are python types -- store them by name
+            json.dump(bundle, f, sort_keys=True, separators=(',', ':'),
+                      default=lambda t: t.__name__)
 
     def _update_schemas_from_extracts(self):
         """
@@ -419,6 +807,9 @@ class Tachistry:
         documented in property_to_field(), above.
         """
         # self.log.debug('* updating schemas from extracts')
+        if not (set(self.ces) - set(schemas)):
+            # all schemas are registered (e.g., restored from the bundle)
+            return
         to_build = [meta_id for meta_id in self.metaobject_build_order()
                     if meta_id not in schemas]
         for meta_id in to_build:
@@ -512,14 +903,38 @@ class Tachistry:
 
     def all_your_sub(self, e):
         """
-        Given an extract, return the set of all its base class names.
+        Given an extract, return the set of all its subclass names (including
+        its own name).
 
         Args:
             e (dict):  an extract
         """
         # self.log.debug('* all_your_sub')
+        if not self.subclasses:
+            self._build_subclass_closure()
+        if e['id'] in self.subclasses:
+            return set(self.subclasses[e['id']])
         return set(self._extract_subwalk(e))
 
+    def _build_subclass_closure(self):
+        """
+        Compute the subclass closure (`self.subclasses`) of all registered
+        Class extracts in a single pass over the build order, from the leaves
+        up.
+        """
+        children = {meta_id: [] for meta_id in self.ces}
+        for e in self.ces.values():
+            for b in e['bases']:
+                if b in children:
+                    children[b].append(e['id'])
+        subclasses = {}
+        for meta_id in reversed(self.metaobject_build_order()):
+            subs = {meta_id}
+            for c in children[meta_id]:
+                subs |= subclasses[c]
+            subclasses[meta_id] = subs
+        self.subclasses = subclasses
+
     def _extract_subwalk(self, e):
         """
         Given an extract, return a generator that will yield the `id`s of all
@@ -769,6 +1184,9 @@ class Tachistry:
 # metaobject_build_order               _update_schemas_from_extracts
 # all_your_base                        metaobject_build_order
 # _extract_basewalk                    all_your_base
+# _load_schema_bundle                  _get_extracts_from_cache
+# _save_schema_bundle                  __init__
+# _build_subclass_closure              all_your_sub, _save_schema_bundle
 # report                               [end-user]
 # reportHtml                           [end-user]
 
@@ -4,6 +4,7 @@ Unit tests for pangalactic.core.fastorb.orb
 """
 # from math import fsum
 import os, shutil
+from copy import deepcopy
 import unittest
 
 # yaml
@@ -15,10 +16,11 @@ import unittest
 import pangalactic.core.set_fastorb
 
 # core
-from pangalactic.core              import orb, refdata, prefs
+from pangalactic.core              import (__version__, config, orb, refdata,
+                                           prefs)
                                            # write_config, write_prefs)
-from pangalactic.core.parametrics  import (componentz, data_elementz,
-                                           parameterz, rqt_allocz,
+from pangalactic.core.parametrics  import (Comp, componentz, data_elementz,
+                                           parameterz, parm_defz, rqt_allocz,
                                            serialize_des,
                                            serialize_parms)
 from pangalactic.core.test         import data as test_data_module
@@ -30,7 +32,9 @@ from pangalactic.core.test.utils   import (create_test_users,
                                            related_test_objects)
 from pangalactic.core.utils.datetimes import dtstamp
 
+from pangalactic.core.fastorb      import WARM_IMAGE
 from pangalactic.core.smerializers import serialize, deserialize
+from pangalactic.core.tachistry    import matrix
 
 # =============================================================================
 # for testing purposes, create data_elements.json and parameter.json files with
@@ -134,6 +138,27 @@ class OrbTest(unittest.TestCase):
         expected = set()
         self.assertEqual(expected, value)
 
+    def test_04b_startup_profile(self):
+        """
+        CASE:  verify that orb.start() recorded a startup profile with timed
+        phases that add up to the total (objects are only counted if the
+        'profile_startup' config item is set).
+        """
+        profile = orb.startup_profile
+        phases = profile['phases']
+        names = [p['name'] for p in phases]
+        value = [profile['version'],
+                 'registry' in names,
+                 'save caches' in names,
+                 all(p['wall'] >= 0 and p['cpu'] >= 0 for p in phases),
+                 round(sum(p['wall'] for p in phases), 6),
+                 orb._profiler,
+                 profile['count_objects']]
+        expected = [__version__, True, True, True,
+                    round(profile['total']['wall'], 6), None,
+                    bool(config.get('profile_startup'))]
+        self.assertEqual(expected, value)
+
     def test_05_check_serialized_test_objects(self):
         """
         CASE:  check serialized test objects
@@ -228,6 +253,51 @@ class OrbTest(unittest.TestCase):
         obj_attrs = {a: getattr(obj, a) for a in test_obj_attrs}
         self.assertEqual(test_obj_attrs, obj_attrs)
 
+    def test_09a_field_descriptors(self):
+        """
+        CASE:  attribute access through the MatrixField descriptors
+        """
+        obj = orb.get('test:spacecraft0')
+        owner = obj.owner
+        name = obj.name
+        obj.name = 42                         # coerced to str
+        obj.owner = orb.get('test:buckaroo')  # a Person is not allowed
+        value = [type(obj).__dict__['name'].__class__.__name__,
+                 obj.name,
+                 owner is not None,
+                 obj.owner is owner,
+                 obj.no_such_attr]
+        obj.name = name
+        expected = ['MatrixField', '42', True, True, None]
+        self.assertEqual(expected, value)
+
+    def test_09b_field_allowed_types(self):
+        """
+        CASE:  the allowed types of an object-valued field include classes
+        added to the registry after the field's class was created
+        """
+        field = orb.classes['HardwareProduct'].__dict__['owner']
+        before = sorted(field.allowed_types)
+        # add a subclass of Organization, as the registry does for classes
+        # from app ontologies (which resets its subclass closure)
+        orb.registry.ces['Mission'] = dict(oid='test:Mission',
+                                           _meta_id='Mission',
+                                           bases=['Organization'],
+                                           id_ns='test', id='Mission',
+                                           name='Mission', abbreviation='',
+                                           definition='', comment='')
+        orb.registry.subclasses = {}
+        try:
+            added = sorted(field.allowed_types)
+        finally:
+            del orb.registry.ces['Mission']
+            orb.registry.subclasses = {}
+        value = [before, added, sorted(field.allowed_types)]
+        expected = [['Organization', 'Project'],
+                    ['Mission', 'Organization', 'Project'],
+                    ['Organization', 'Project']]
+        self.assertEqual(expected, value)
+
     # def test_09_save(self, savelist):
         # pass
     # test_save.todo = 'not done.'
@@ -547,6 +617,102 @@ class OrbTest(unittest.TestCase):
         expected = [True, False, False, True]
         self.assertEqual(expected, value)
 
+    def test_29_warm_image(self):
+        """
+        CASE:  save the orb's caches to the warm image and load them back
+        """
+        orb.save_warm_image(orb.home)
+        expected = [matrix.to_columns(), deepcopy(parameterz),
+                    dict(componentz), deepcopy(parm_defz), list(orb.user_raz)]
+        for cache in (matrix, parameterz, componentz, parm_defz):
+            cache.clear()
+        orb.user_raz = []
+        status = orb.load_warm_image(orb.home)
+        value = [matrix.to_columns(), parameterz, dict(componentz), parm_defz,
+                 orb.user_raz]
+        self.assertEqual('success', status)
+        self.assertEqual(expected, value)
+
+    def test_30_warm_image_invalid(self):
+        """
+        CASE:  a warm image that is older than a cache file is stale, and one
+        whose content has been altered fails
+        """
+        fpath = os.path.join(orb.home, WARM_IMAGE)
+        orb.save_warm_image(orb.home)
+        mtime = os.path.getmtime(fpath)
+        parms_path = os.path.join(orb.home, 'parameters.json')
+        os.utime(parms_path, (mtime + 10, mtime + 10))
+        stale = orb.load_warm_image(orb.home)
+        os.utime(parms_path, (mtime - 10, mtime - 10))
+        with open(fpath, 'rb') as f:
+            content = f.read()
+        with open(fpath, 'wb') as f:
+            f.write(content.replace(b'Rocinante', b'Rosinante'))
+        fail = orb.load_warm_image(orb.home)
+        os.remove(fpath)
+        self.assertEqual(['stale', 'fail'], [stale, fail])
+
+    def test_31_check_for_cycles(self):
+        """
+        CASE:  an Acu that makes a product a component of itself at the
+        bottom of its assembly is found
+        """
+        sc = orb.get('test:spacecraft3')
+        no_cycles = orb.check_for_cycles(sc)
+        # walk down to a leaf component of the spacecraft
+        path = [sc.oid]
+        while componentz.get(path[-1]):
+            path.append(componentz[path[-1]][0].oid)
+        leaf = path[-1]
+        componentz[leaf] = [Comp(sc.oid, 'test:cyclic-acu', 1, 'X')]
+        msg = orb.check_for_cycles(sc)
+        del componentz[leaf]
+        value = [no_cycles, 'test:cyclic-acu' in msg,
+                 'is a level {} component'.format(len(path)) in msg]
+        self.assertEqual([None, True, True], value)
+
+    def test_32_bom_from_compz(self):
+        """
+        CASE:  bom and assembly computed from 'componentz'
+        """
+        sc = orb.get('test:spacecraft3')
+        bom = orb.get_bom_from_compz(sc)
+        assembly = orb.get_assembly_from_compz(sc)
+        acus = [a for a in assembly if isinstance(a, orb.classes['Acu'])]
+        acu_oids = set(c.usage_oid for oid in [sc.oid] + [p.oid for p in bom]
+                       for c in componentz.get(oid) or [])
+        value = [len(bom) > 0, len(bom) == len(set(bom)),
+                 orb.get_bom_oids(sc) == set(p.oid for p in bom),
+                 set(assembly) - set(acus) == set(bom),
+                 set(a.oid for a in acus) == acu_oids]
+        self.assertEqual([True] * 5, value)
+
+    def test_33_id_exists(self):
+        """
+        CASE:  orb.id_exists() agrees with get_idvs() and follows changes to
+        ids
+        """
+        sc = orb.get('test:spacecraft0')
+        old_id = sc.id
+        idvs = orb.get_idvs('HardwareProduct')
+        before = [orb.id_exists('HardwareProduct', old_id) ==
+                      (old_id in [idv[0] for idv in idvs]),
+                  orb.id_exists('HardwareProduct', old_id,
+                                version=sc.version) ==
+                      ((old_id, sc.version) in idvs),
+                  orb.id_exists('HardwareProduct', 'Rocinante-2')]
+        sc.id = 'Rocinante-2'
+        orb.save([sc])
+        after = [orb.id_exists('HardwareProduct', 'Rocinante-2'),
+                 orb.id_exists('HardwareProduct', 'Rocinante-2', oid=sc.oid)]
+        sc.id = old_id
+        orb.save([sc])
+        value = [before, after,
+                 orb.id_exists('HardwareProduct', 'Rocinante-2')]
+        expected = [[True, True, False], [True, False], False]
+        self.assertEqual(expected, value)
+
     # TODO:  does the orb need to write a MEL?  if so, fix it!
     # def test_50_write_mel(self):
         # """
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Import-time tests (and benchmark) for pangalactic.core modules
+  - checks that lightweight modules do not import rdflib, SqlAlchemy, pint, or
+    the test package when they are imported
+  - run as a script to print cold import times:
+
+      python test_imports.py
+"""
+import json, os, subprocess, sys, unittest
+
+# modules that are expensive to import and should only be imported on demand
+HEAVY = ['rdflib', 'sqlalchemy', 'pint', 'pangalactic.core.test']
+
+# modules that should be importable without importing any HEAVY modules
+LIGHT = ['pangalactic.core', 'pangalactic.core.units',
+         'pangalactic.core.names', 'pangalactic.core.parametrics']
+
+PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {mod}
+dt = time.perf_counter() - t
+print(json.dumps([dt, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def cold_import(mod):
+    """
+    Import a module in a fresh interpreter.
+
+    Args:
+        mod (str):  name of the module
+
+    Returns:
+        tuple of (import time in seconds, list of HEAVY modules imported)
+    """
+    # use the current sys.path, in case pangalactic is not installed
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    out = subprocess.run([sys.executable, '-c',
+                          PROBE.format(mod=mod, heavy=HEAVY)],
+                         capture_output=True, text=True, check=True,
+                         env=env).stdout
+    dt, heavy = json.loads(out.strip().splitlines()[-1])
+    return dt, heavy
+
+
+class ImportTests(unittest.TestCase):
+
+    def test_00_light_imports(self):
+        """
+        CASE:  import lightweight modules
+
+        Importing each LIGHT module should not import any HEAVY module.
+        """
+        value = {mod: cold_import(mod)[1] for mod in LIGHT}
+        expected = {mod: [] for mod in LIGHT}
+        self.assertEqual(expected, value)
+
+    def test_01_lazy_tables(self):
+        """
+        CASE:  lazily-built `datatypes`, `xsd_datatypes`, and `ureg`
+
+        The lazily-built module attributes should be available on first
+        access.
+        """
+        from pangalactic.core import datatypes, xsd_datatypes
+        from pangalactic.core import units
+        value = [datatypes[(True, 'bool', False)],
+                 len(xsd_datatypes) > 0,
+                 units.ureg is units.get_ureg(),
+                 str(units.ureg.parse_expression('kg').units)]
+        expected = [set, True, True, 'kilogram']
+        self.assertEqual(expected, value)
+
+
+if __name__ == '__main__':
+    for mod in LIGHT + ['pangalactic.core.uberorb', 'pangalactic.core.fastorb']:
+        dt, heavy = cold_import(mod)
+        print('{:<32} {:7.3f} s   {}'.format(mod, dt, ', '.join(heavy)))
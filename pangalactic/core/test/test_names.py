@@ -13,6 +13,24 @@ from rdflib.term import URIRef
 from pangalactic.core                import names
 from pangalactic.core.datastructures import OrderedSet
 
+# minimal stand-ins for the objects whose values are cached by 'names'
+class Obj(object):
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class Acu(Obj):
+    pass
+
+
+class Port(Obj):
+    pass
+
+
+class HardwareProduct(Obj):
+    ports = None
+
+
 xmlds = pkgutil.get_data('pangalactic.core.test.data',
                          'test_data.owl').decode('utf-8')
 
@@ -159,3 +177,69 @@ class NamesTests(unittest.TestCase):
         expected = [gean_a, gean_b, gean_c, gean_d, gean_e]
         self.assertEqual(expected, value)
 
+
+    def test_10_get_next_ref_des(self):
+        """CASE: get_next_ref_des (cached, with optional reservations)"""
+        names.clear_seqz()
+        pwr = Obj(abbreviation='PWR', name='Power')
+        sc = HardwareProduct(oid='test:sc', components=[])
+        sc.components.append(Acu(oid='test:acu1', assembly=sc,
+                                 reference_designator='PWR-001'))
+        # the same value until an Acu that uses it is saved
+        a = names.get_next_ref_des(sc, None, product_type=pwr)
+        b = names.get_next_ref_des(sc, None, product_type=pwr)
+        # ... unless it is reserved
+        c = names.get_next_ref_des(sc, None, product_type=pwr, reserve=True)
+        d = names.get_next_ref_des(sc, None, product_type=pwr, reserve=True)
+        # saving an Acu that uses a reserved value consumes its reservation,
+        # and the others are released
+        names.note_saved(Acu(oid='test:acu2', assembly=sc,
+                             reference_designator=c))
+        names.release_seqz()
+        e = names.get_next_ref_des(sc, None, product_type=pwr)
+        # deleting an Acu frees its value
+        names.note_deleted('test:acu1')
+        names.note_deleted('test:acu2')
+        f = names.get_next_ref_des(sc, None)
+        value = [a, b, c, d, e, f]
+        expected = ['PWR-002', 'PWR-002', 'PWR-002', 'PWR-003', 'PWR-003',
+                    'Generic-001']
+        names.clear_seqz()
+        self.assertEqual(expected, value)
+
+    def test_11_get_next_port_seq(self):
+        """CASE: get_next_port_seq (cached, with optional reservations)"""
+        names.clear_seqz()
+        pt = Obj(oid='test:pt')
+        sc = HardwareProduct(oid='test:sc', ports=[])
+        a = names.get_next_port_seq(sc, pt)
+        names.note_saved(Port(oid='test:port0', id='SC-P-0', of_product=sc,
+                              type_of_port=pt))
+        b = names.get_next_port_seq(sc, pt)
+        c = names.get_next_port_seq(sc, pt)
+        d = names.get_next_port_seq(sc, pt, reserve=True)
+        e = names.get_next_port_seq(sc, pt, reserve=True)
+        names.release_seqz()
+        f = names.get_next_port_seq(sc, pt)
+        # objects with no ports
+        g = names.get_next_port_seq(Obj(oid='test:foo'), pt)
+        value = [a, b, c, d, e, f, g]
+        expected = [0, 1, 1, 1, 2, 1, 0]
+        names.clear_seqz()
+        self.assertEqual(expected, value)
+
+    def test_12_get_next_product_id_suffix(self):
+        """CASE: get_product_id_suffixes and get_next_product_id_suffix"""
+        names.clear_seqz()
+        products = [HardwareProduct(oid='test:p1', id='SC-0000001'),
+                    HardwareProduct(oid='test:p2', id='SC-0000005'),
+                    HardwareProduct(oid='test:p3', id='SC-0000005')]
+        sfxs = names.get_product_id_suffixes(lambda: products)
+        a = names.product_id_suffix_is_unique('SC-0000001', sfxs)
+        b = names.product_id_suffix_is_unique('SC-0000005', sfxs)
+        c = names.get_next_product_id_suffix('SC-0000005', sfxs)
+        d = names.get_next_product_id_suffix('TBD', sfxs)
+        value = [a, b, c, d]
+        expected = [True, False, '0000006', '0000006']
+        names.clear_seqz()
+        self.assertEqual(expected, value)
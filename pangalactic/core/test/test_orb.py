@@ -3,7 +3,7 @@
 Unit tests for orb
 """
 from math import fsum
-import json, os, shutil
+import json, os, shutil, subprocess, sys, tempfile, threading
 import unittest
 
 # yaml
@@ -12,39 +12,107 @@ import ruamel_yaml as yaml
 # python-dateutil
 import dateutil.parser as dtparser
 
+# Louie: dispatcher
+from pydispatch import dispatcher
+
 # set the orb
 import pangalactic.core.set_uberorb
+import pangalactic.core.uberorb as uberorb
 
 # pangalactic
-from pangalactic.core             import (orb, refdata, state, prefs,
-                                          write_config, write_prefs)
-from pangalactic.core.access      import get_perms
-from pangalactic.core.parametrics import (compute_margin,
+from pangalactic.core             import (__version__, config, orb, refdata,
+                                          state, prefs, read_state,
+                                          write_config, write_prefs,
+                                          write_state, OidSet,
+                                          SYNCED_OIDS_FILE)
+from pangalactic.core.access      import (get_perms, get_perms_bulk,
+                                          get_user_roles, is_global_admin)
+from pangalactic.core.clone       import clone
+from pangalactic.core.names       import (get_mel_item_name, get_next_ref_des,
+                                          release_seqz)
+from pangalactic.core.parametrics import (Comp, componentz, compute_margin,
                                           compute_requirement_margin,
                                           deserialize_des,
                                           deserialize_parms,
                                           # get_duration,
                                           get_dval, data_elementz,
-                                          get_pval, parameterz,
+                                          get_pval, get_pvals, parameterz,
                                           # get_modal_powerstate_value,
                                           load_parmz, load_data_elementz,
                                           init_mode_defz, mode_defz,
+                                          invalidate_assembly_metrics,
+                                          node_count,
+                                          load_defz, parm_defz, de_defz,
+                                          parmz_by_dimz,
                                           load_mode_defz, save_mode_defz,
                                           recompute_parmz,
                                           # PowerState,
                                           rqt_allocz, round_to,
                                           serialize_des,
-                                          serialize_parms,
+                                          serialize_parms, set_pval,
                                           save_parmz, save_data_elementz)
 from pangalactic.core.serializers import serialize, deserialize
 from pangalactic.core.test        import data as test_data_module
 from pangalactic.core.test        import vault as vault_module
+from pangalactic.core.units       import parsed_units
 from pangalactic.core.test.utils  import (create_test_users,
                                           create_test_project,
                                           locally_owned_test_objects,
                                           owned_test_objects,
                                           related_test_objects)
-from pangalactic.core.utils.reports   import write_mel_xlsx_from_model
+from pangalactic.core.utils.datetimes import dtstamp
+from pangalactic.core.utils.reports   import (get_item_data_tsv,
+                                              get_mel_data, get_mel_lines,
+                                              write_mel_xlsx_from_model)
+from pangalactic.core.validation      import (check_for_cycles,
+                                              check_serialized_for_cycles,
+                                              find_cycles, get_assembly,
+                                              get_level_count,
+                                              get_bom, get_flat_bom,
+                                              validate_all)
+
+# loads the reference data into an empty db in a fresh orb and prints the
+# oids and object references (foreign key values) in the db as json -- if
+# 'bulk' is False, the deserializer path is used instead of the bulk load
+REFDATA_PROBE = """
+import json
+import pangalactic.core.set_uberorb
+from sqlalchemy import select
+from pangalactic.core import orb
+from pangalactic.core.uberorb import UberORB
+if not {bulk}:
+    UberORB._bulk_load_reference_data = lambda self: []
+orb.start(home={home!r}, db_url='sqlite:///' + {home!r} + '/empty.db')
+refs = {{}}
+for cls in orb.classes.values():
+    table = getattr(cls, '__table__', None)
+    cols = [c for c in getattr(table, 'columns', []) if c.name.endswith('_oid')]
+    if cols:
+        for row in orb.db.execute(select(table.c.oid, *cols)):
+            for col, val in zip(cols, row[1:]):
+                refs[row[0] + ' ' + col.name] = val
+print(json.dumps([sorted(orb.get_oids()), refs]))
+"""
+
+
+def load_refdata_in_fresh_orb(bulk=True):
+    """
+    Start a fresh orb with an empty db in a new interpreter and return the
+    (oids, references) of the loaded reference data (see REFDATA_PROBE).
+    """
+    home = tempfile.mkdtemp()
+    # use the current sys.path, in case pangalactic is not installed
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    try:
+        out = subprocess.run([sys.executable, '-c',
+                              REFDATA_PROBE.format(bulk=bulk, home=home)],
+                             capture_output=True, text=True, check=True,
+                             env=env).stdout
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    return json.loads(out.strip().splitlines()[-1])
+
 
 HOME = 'pangalaxian_test'
 orb.start(home=HOME)
@@ -144,6 +212,35 @@ class OrbTest(unittest.TestCase):
         expected = set()
         self.assertEqual(expected, value)
 
+    def test_04a_refdata_digest(self):
+        """
+        CASE:  verify that the digest of the loaded reference data is saved in
+        state.
+        """
+        self.assertEqual(orb.get_refdata_digest(),
+                         state.get('refdata_digest'))
+
+    def test_04b_startup_profile(self):
+        """
+        CASE:  verify that orb.start() recorded a startup profile with timed
+        phases that add up to the total (objects are only counted if the
+        'profile_startup' config item is set).
+        """
+        profile = orb.startup_profile
+        phases = profile['phases']
+        names = [p['name'] for p in phases]
+        value = [profile['version'],
+                 'registry' in names,
+                 'save caches' in names,
+                 all(p['wall'] >= 0 and p['cpu'] >= 0 for p in phases),
+                 round(sum(p['wall'] for p in phases), 6),
+                 orb._profiler,
+                 profile['count_objects']]
+        expected = [__version__, True, True, True,
+                    round(profile['total']['wall'], 6), None,
+                    bool(config.get('profile_startup'))]
+        self.assertEqual(expected, value)
+
     def test_05_check_serialized_test_objects(self):
         """
         CASE:  check serialized test objects
@@ -248,6 +345,48 @@ class OrbTest(unittest.TestCase):
         obj_attrs = {a: getattr(obj, a) for a in test_obj_attrs}
         self.assertEqual(test_obj_attrs, obj_attrs)
 
+    def test_09a_get_oids_and_select(self):
+        """
+        CASE:  test orb.get(oids=...) and orb.select() (prepared statements)
+        """
+        oids = ['test:spacecraft0', 'test:spacecraft1', 'H2G2']
+        objs = orb.get(oids=oids)
+        self.assertEqual(set(oids), set([o.oid for o in objs]))
+        proj = orb.select('Project', id='H2G2')
+        self.assertEqual(proj, orb.get('H2G2'))
+        self.assertEqual(None, orb.select('Project', id='no_such_project'))
+        self.assertTrue('H2G2' in orb.get_oids(cname='Project'))
+
+    def test_09a_get_oids_fresh_statements(self):
+        """
+        CASE:  orb.get(oids=...) is the first lookup after the statement cache
+        has been reset (as it is by init_registry()); orb.get(None) is None
+        """
+        stmts = orb._stmts
+        orb._stmts = {}
+        try:
+            oids = ['test:spacecraft0', 'test:spacecraft1', 'H2G2']
+            value = [set(o.oid for o in orb.get(oids=oids)),
+                     orb.get('H2G2').oid, orb.get(None)]
+        finally:
+            orb._stmts = stmts
+        expected = [set(oids), 'H2G2', None]
+        self.assertEqual(expected, value)
+
+    def test_09b_iter_by_type_and_all_subtypes(self):
+        """
+        CASE:  test orb.iter_by_type() and orb.iter_all_subtypes()
+        """
+        expected = set([o.oid for o in orb.get_by_type('HardwareProduct')])
+        value = set([o.oid for o in orb.iter_by_type('HardwareProduct',
+                                                     batch_size=2)])
+        self.assertEqual(expected, value)
+        expected = set([o.oid for o in orb.get_all_subtypes('Product')])
+        value = set([o.oid for o in orb.iter_all_subtypes('Product',
+                                                          batch_size=2)])
+        self.assertEqual(expected, value)
+        self.assertEqual([], list(orb.iter_by_type('NoSuchClass')))
+
     # def test_09_save(self, savelist):
         # pass
     # test_save.todo = 'not done.'
@@ -1718,6 +1857,103 @@ class OrbTest(unittest.TestCase):
         expected = (set(['view']), '16 PE/rqt:  v')
         self.assertEqual(expected, value)
 
+    def test_26_40_perms_bulk(self):
+        """
+        CASE:  get_perms_bulk() gives the same perms as get_perms(), and
+        memoized perms are discarded when role assignments are saved or
+        deleted
+        """
+        state["synced_oids"] = ['test:spacecraft0', 'test:H2G2:acu-1',
+                                'test:H2G2:system-1',
+                                'test:H2G2:Spacecraft-Mass']
+        state["client"] = True
+        state["connected"] = True
+        buckaroo = orb.get('test:buckaroo')
+        rqt_oid = 'test:H2G2:Spacecraft-Mass'
+        objs = [orb.get(oid) for oid in ['test:spacecraft0',
+                'test:H2G2:acu-1', 'test:H2G2:acu-2', 'test:H2G2:system-1',
+                'H2G2', rqt_oid]]
+        bulk = get_perms_bulk(objs, user=buckaroo)
+        single = {obj.oid: get_perms(obj, user=buckaroo) for obj in objs}
+        # Buckaroo becomes a systems engineer on H2G2 ...
+        now = str(dtstamp())
+        deserialize(orb, [dict(_cname='RoleAssignment',
+                               oid='test:RA.buckaroo_se', id='buckaroo_se',
+                               id_ns='test', creator='pgefobjects:admin',
+                               modifier='pgefobjects:admin',
+                               create_datetime=now, mod_datetime=now,
+                               assigned_role='gsfc:Role.systems_engineer',
+                               assigned_to='test:buckaroo',
+                               role_assignment_context='H2G2')])
+        as_se = set(get_perms_bulk(objs, user=buckaroo)[rqt_oid])
+        # ... and then not
+        orb.delete([orb.get('test:RA.buckaroo_se')])
+        value = [bulk == single, set(bulk[rqt_oid]), as_se,
+                 set(get_perms(orb.get(rqt_oid), user=buckaroo))]
+        expected = [True, {'view'}, {'view', 'add docs', 'modify', 'delete'},
+                    {'view'}]
+        self.assertEqual(expected, value)
+
+    def test_26_41_user_roles(self):
+        """
+        CASE:  the roles of a user (and the product types they authorize) are
+        cached until role assignments change
+        """
+        buckaroo = orb.get('test:buckaroo')
+        steve = orb.get('test:steve')
+        h2g2 = orb.get('H2G2')
+        roles = get_user_roles(buckaroo)
+        cached = get_user_roles(buckaroo) is roles
+        dispatcher.send('role assignments changed')
+        refreshed = get_user_roles(buckaroo) is not roles
+        value = [cached, refreshed,
+                 roles.in_context(h2g2) == {'propulsion_engineer'},
+                 roles.product_types_in_context(h2g2) ==
+                    orb.role_product_types['propulsion_engineer'],
+                 roles.product_types_in_context(None) == set(),
+                 is_global_admin(steve), is_global_admin(buckaroo)]
+        expected = [True, True, True, True, True, True, False]
+        self.assertEqual(expected, value)
+
+    def test_26_42_synced_oids_state(self):
+        """
+        CASE:  state["synced_oids"] is an OidSet that is written to its own
+        file rather than to the state file
+        """
+        saved_state = dict(state)
+        state["synced_oids"] = ['test:spacecraft0', 'test:H2G2:acu-1']
+        # get_perms() converts a list to an OidSet
+        get_perms(orb.get('test:spacecraft0'))
+        converted = isinstance(state["synced_oids"], OidSet)
+        state["synced_oids"].append('test:H2G2:system-1')
+        statepath = os.path.join(orb.home, 'test_state')
+        write_state(statepath)
+        with open(statepath) as f:
+            in_state_file = 'synced_oids' in yaml.safe_load(f.read())
+        state.clear()
+        read_state(statepath)
+        synced = set(state["synced_oids"])
+        # an unchanged OidSet is not rewritten ...
+        synced_path = os.path.join(orb.home, SYNCED_OIDS_FILE)
+        with open(synced_path, 'w') as f:
+            f.write('test:not-rewritten\n')
+        write_state(statepath)
+        with open(synced_path) as f:
+            unchanged = f.read().split()
+        # ... but any in-place change is written
+        state["synced_oids"] -= {'test:H2G2:acu-1'}
+        write_state(statepath)
+        with open(synced_path) as f:
+            changed = f.read().split()
+        value = [converted, in_state_file, synced, unchanged, changed]
+        expected = [True, False, {'test:spacecraft0', 'test:H2G2:acu-1',
+                                  'test:H2G2:system-1'},
+                    ['test:not-rewritten'],
+                    ['test:H2G2:system-1', 'test:spacecraft0']]
+        state.clear()
+        state.update(saved_state)
+        self.assertEqual(expected, value)
+
     # TODO:  revise this test!
     # def test_27_deserialize_object_with_modified_parameters(self):
         # """
@@ -1802,6 +2038,474 @@ class OrbTest(unittest.TestCase):
                         ('test:spacecraft3-acu-5', 'test:BOZO:acu-2')])
         self.assertEqual(expected, value)
 
+    def test_35_read_session(self):
+        """
+        CASE:  read APIs routed to a read session (second sqlite connection)
+        """
+        H2G2 = orb.get('H2G2')
+        expected_mod_dts = orb.get_mod_dts(cnames=['HardwareProduct'])
+        expected_oids = set([o.oid for o in orb.get_objects_for_project(H2G2)])
+        config['read_session'] = True
+        try:
+            orb.init_read_db()
+            self.assertIsNotNone(orb.read_db)
+            with orb.reading():
+                self.assertIsNot(orb.db, orb._db)
+            self.assertIs(orb.db, orb._db)
+            value_mod_dts = orb.get_mod_dts(cnames=['HardwareProduct'])
+            objs = orb.get_objects_for_project(H2G2)
+            value_oids = set([o.oid for o in objs])
+            # the objects returned are those of the primary session, with no
+            # duplicates, and can be modified and saved
+            in_primary = all(o in orb._db for o in objs)
+            sc = [o for o in objs if o.oid == 'test:spacecraft0'][0]
+            desc = sc.description
+            sc.description = 'read session test'
+            orb.save([sc])
+            saved_desc = orb.get('test:spacecraft0').description
+            sc.description = desc
+            orb.save([sc])
+        finally:
+            del config['read_session']
+            orb.init_read_db()
+        self.assertEqual(expected_mod_dts, value_mod_dts)
+        self.assertEqual(expected_oids, value_oids)
+        self.assertEqual(len(value_oids), len(objs))
+        self.assertEqual(len(objs), len(set(id(o) for o in objs)))
+        self.assertTrue(in_primary)
+        self.assertEqual('read session test', saved_desc)
+
+    def test_36_parameter_units(self):
+        """
+        CASE:  set and get parameter values in non-base units (using the
+        pre-parsed unit expressions)
+        """
+        m = get_pval('test:twanger', 'm')
+        set_pval('test:twanger', 'm', 2500, units='g')
+        value = [get_pval('test:twanger', 'm'),
+                 get_pval('test:twanger', 'm', units='g'),
+                 get_pval('test:twanger', 'm', units='lb') > 5.5,
+                 all(u in parsed_units for u in ('kg', 'g', 'lb', 'm/s^2'))]
+        expected = [2.5, 2500.0, True, True]
+        set_pval('test:twanger', 'm', m)
+        self.assertEqual(expected, value)
+
+    def test_37_deferred_startup_work(self):
+        """
+        CASE:  startup caches and computed parameters done in a background
+        thread (as in start(deferred=True)) -- get_pval() for a computed
+        parameter waits for the recompute
+        """
+        # (recompute_parmz() is not done in "connected" state)
+        connected = state.get('connected')
+        state['connected'] = False
+        expected_compz = dict(componentz)
+        expected_cbe = get_pval('test:spacecraft3', 'm[CBE]')
+        parameterz['test:spacecraft3']['m[CBE]'] = 0.0
+        # the 'parameters recomputed' signal is sent from the main thread
+        signal_threads = []
+        def on_recomputed():
+            signal_threads.append(threading.current_thread())
+        dispatcher.connect(on_recomputed, 'parameters recomputed')
+        orb.ready.clear()
+        orb._startup_done.clear()
+        orb._deferred = True
+        orb._start_deferred_work()
+        cbe = get_pval('test:spacecraft3', 'm[CBE]')
+        orb.wait_until_ready(60)
+        dispatcher.disconnect(on_recomputed, 'parameters recomputed')
+        state['connected'] = connected
+        value = [orb.wait_until_ready(60), cbe, dict(componentz) ==
+                 expected_compz, orb._deferred,
+                 [p['name'] for p in orb.startup_profile['deferred']['phases']],
+                 signal_threads == [threading.main_thread()]]
+        expected = [True, expected_cbe, True, False,
+                    ['componentz, systemz', 'recompute parmz'], True]
+        self.assertEqual(expected, value)
+
+    def test_37a_deferred_startup_work_failed(self):
+        """
+        CASE:  if the deferred startup work fails, `ready` is not set (so the
+        startup caches are not trusted) and the error is saved
+        """
+        def fail(lap):
+            raise ValueError('startup caches failed')
+        orb._build_startup_caches = fail
+        try:
+            orb.ready.clear()
+            orb._startup_done.clear()
+            orb._deferred = True
+            orb._start_deferred_work()
+            value = [orb.wait_until_ready(60), orb.ready.is_set(),
+                     'startup caches failed' in (orb.deferred_error or ''),
+                     orb._deferred]
+        finally:
+            del orb._build_startup_caches
+            orb.deferred_error = None
+            orb._startup_done.set()
+            orb.ready.set()
+        expected = [False, False, True, False]
+        self.assertEqual(expected, value)
+
+    def test_37b_deferred_startup_caches_vs_save(self):
+        """
+        CASE:  an Acu saved by the main thread while the startup caches are
+        being built in the background -- the worker's (older) 'componentz'
+        entry for the assembly does not overwrite the one refreshed by save()
+        """
+        acu = orb.get(componentz['test:spacecraft3'][0].usage_oid)
+        quantity = acu.quantity
+        built = threading.Event()
+        resume = threading.Event()
+        get_comps = uberorb.get_comps
+        def get_comps_and_wait(product):
+            comps = get_comps(product)
+            if (product.oid == 'test:spacecraft3' and
+                threading.current_thread().name == 'orb-deferred-startup'):
+                # the worker has read the assembly's components -- wait
+                # while the main thread saves the Acu
+                built.set()
+                resume.wait(60)
+            return comps
+        uberorb.get_comps = get_comps_and_wait
+        try:
+            orb.ready.clear()
+            orb._startup_done.clear()
+            orb._deferred = True
+            orb._start_deferred_work()
+            built.wait(60)
+            acu.quantity = (quantity or 1) + 1
+            # (no recompute, which would wait for the worker's recompute)
+            orb.save([acu], recompute=False)
+            resume.set()
+            ready = orb.wait_until_ready(60)
+            value = [ready, [c.quantity for c in componentz['test:spacecraft3']
+                             if c.usage_oid == acu.oid]]
+        finally:
+            uberorb.get_comps = get_comps
+            resume.set()
+            orb.wait_until_ready(60)
+            acu.quantity = quantity
+            connected = state.get('connected')
+            state['connected'] = False
+            orb.save([acu])
+            state['connected'] = connected
+        expected = [True, [(quantity or 1) + 1]]
+        self.assertEqual(expected, value)
+
+    def test_38_definitions_cache(self):
+        """
+        CASE:  definitions caches (parm_defz, de_defz, parmz_by_dimz) saved
+        to "definitions.json" and reloaded on the next start
+        """
+        orb.init_defz_caches()
+        expected = [json.dumps(parm_defz, sort_keys=True),
+                    json.dumps(de_defz, sort_keys=True),
+                    json.dumps(parmz_by_dimz, sort_keys=True)]
+        key = load_defz(orb.home)
+        value = [key == orb.get_defz_key(),
+                 json.dumps(parm_defz, sort_keys=True),
+                 json.dumps(de_defz, sort_keys=True),
+                 json.dumps(parmz_by_dimz, sort_keys=True)]
+        self.assertEqual([True] + expected, value)
+
+    def test_39_check_for_cycles(self):
+        """
+        CASE:  cycles at any depth of assembly are found (and only cycles)
+        """
+        sc = orb.get('test:spacecraft3')
+        # a 5000-level assembly whose bottom component is its top assembly
+        deep = {'p{}'.format(i): [('p{}'.format(i + 1), 'a{}'.format(i))]
+                for i in range(5000)}
+        deep['p5000'] = [('p0', 'a5000')]
+        # a diamond (shared component, no cycle) and a self-reference
+        diamond = {'a': [('b', 'ab'), ('c', 'ac')], 'b': [('d', 'bd')],
+                   'c': [('d', 'cd')]}
+        itself = {'x': [('y', 'xy'), ('x', 'xx')]}
+        deep_cycles = find_cycles(deep)
+        value = [check_for_cycles(sc), len(deep_cycles),
+                 len(deep_cycles[0]), deep_cycles[0][0],
+                 find_cycles(diamond), find_cycles(itself)]
+        expected = [None, 1, 5001, ('p0', 'p1', 'a0'), [],
+                    [[('x', 'x', 'xx')]]]
+        self.assertEqual(expected, value)
+
+    def test_40_check_serialized_for_cycles(self):
+        """
+        CASE:  cycles formed by serialized Acus, alone or together with the
+        assemblies in 'componentz', are found at any depth
+        """
+        sc_oid = 'test:spacecraft3'
+        # a 20000-level chain of serialized Acus, acyclic and then closed
+        chain = [dict(_cname='Acu', oid='a{}'.format(i), id='a{}'.format(i),
+                      assembly='p{}'.format(i), component='p{}'.format(i + 1))
+                 for i in range(20000)]
+        no_cycles = check_serialized_for_cycles(chain)
+        closed = chain + [dict(_cname='Acu', oid='a20000', id='a20000',
+                               assembly='p20000', component='p0')]
+        chain_cycle = check_serialized_for_cycles(closed)
+        # an Acu that makes the spacecraft a component of its own leaf part
+        path = [sc_oid]
+        while componentz.get(path[-1]):
+            path.append(componentz[path[-1]][0].oid)
+        leaf_acu = dict(_cname='Acu', oid='test:cyclic-acu',
+                        id='cyclic-acu', assembly=path[-1], component=sc_oid)
+        leaf_cycle = check_serialized_for_cycles([leaf_acu])
+        # ... but not if that Acu's component is replaced
+        fixed = check_serialized_for_cycles([dict(leaf_acu,
+                                                  component='test:other')])
+        value = [no_cycles, 'level 20001 component' in (chain_cycle or ''),
+                 'cyclic-acu' in (leaf_cycle or ''), fixed,
+                 check_serialized_for_cycles([leaf_acu], graph={})]
+        expected = [None, True, True, None, None]
+        self.assertEqual(expected, value)
+
+    def test_41_bom(self):
+        """
+        CASE:  bom and assembly from the Acus and from 'componentz' agree; the
+        flattened bom multiplies quantities through shared sub-assemblies
+        """
+        sc = orb.get('test:spacecraft3')
+        bom = get_bom(sc)
+        assembly = get_assembly(sc)
+        # 100 levels, each using the next level twice:  2**100 occurrences
+        shared = {'p{}'.format(i): [Comp('p{}'.format(i + 1), 'a{}'.format(i),
+                                         1, ''),
+                                    Comp('p{}'.format(i + 1), 'b{}'.format(i),
+                                         1, '')]
+                  for i in range(100)}
+        shared['p100'] = [Comp('bolt', 'c100', 4, '')]
+        flat = get_flat_bom('p0', graph=shared)
+        # until the orb is ready, 'componentz' is not used
+        sc_comps = componentz[sc.oid]
+        componentz[sc.oid] = []
+        orb.ready.clear()
+        try:
+            not_ready_bom_oids = orb.get_bom_oids(sc)
+        finally:
+            orb.ready.set()
+            componentz[sc.oid] = sc_comps
+        value = [len(bom) > 0, len(bom) == len(set(bom)),
+                 set(bom) == set(get_bom(sc, orb=orb)),
+                 set(assembly) == set(get_assembly(sc, orb=orb)),
+                 orb.get_bom_oids(sc) == set(p.oid for p in bom),
+                 not_ready_bom_oids == set(p.oid for p in bom),
+                 len(flat), flat['p1'], flat['p100'], flat['bolt']]
+        expected = [True, True, True, True, True, True,
+                    101, 2, 2**100, 4 * 2**100]
+        self.assertEqual(expected, value)
+
+    def test_41a_project_fuel_mass(self):
+        """
+        CASE:  get_project_parameters() counts the fuel in a shared
+        sub-assembly once for each use of the sub-assembly
+        """
+        NOW = str(dtstamp())
+        meta = dict(creator='test:steve', modifier='test:steve',
+                    create_datetime=NOW, mod_datetime=NOW)
+        def hw(oid, product_type=None):
+            return dict(_cname='HardwareProduct', oid=oid, id=oid, name=oid,
+                        owner='test:FUEL', product_type=product_type, **meta)
+        def acu(assembly, component, rd):
+            return dict(_cname='Acu', oid=f'{assembly}-{rd}', id=rd, name=rd,
+                        assembly=assembly, component=component,
+                        reference_designator=rd, quantity=1, **meta)
+        # the propulsion assembly uses the tank (which contains the fuel)
+        # twice
+        sobjs = [dict(_cname='Project', oid='test:FUEL', id='FUEL',
+                      name='Fuel Test', **meta),
+                 hw('test:fuel-top'),
+                 hw('test:fuel-sc', 'pgefobjects:ProductType.spacecraft'),
+                 hw('test:fuel-prop'), hw('test:fuel-tank'),
+                 hw('test:fuel-fuel', 'pgefobjects:ProductType.fuel'),
+                 acu('test:fuel-top', 'test:fuel-sc', 'SC-1'),
+                 acu('test:fuel-sc', 'test:fuel-prop', 'Prop-1'),
+                 acu('test:fuel-prop', 'test:fuel-tank', 'Tank-1'),
+                 acu('test:fuel-prop', 'test:fuel-tank', 'Tank-2'),
+                 acu('test:fuel-tank', 'test:fuel-fuel', 'Fuel-1'),
+                 dict(_cname='ProjectSystemUsage', oid='test:FUEL:system-1',
+                      id='system-1', name='system-1', project='test:FUEL',
+                      system='test:fuel-top', **meta)]
+        objs = deserialize(orb, sobjs)
+        for so in sobjs[1:6]:
+            set_pval(so['oid'], 'm', 0.0)
+        set_pval('test:fuel-fuel', 'm', 10.0)
+        # (recompute_parmz() is not done in "connected" state)
+        connected = state.get('connected')
+        state['connected'] = False
+        recompute_parmz()
+        state['connected'] = connected
+        data = orb.get_project_parameters(orb.get('test:FUEL'))
+        orb.delete([orb.get(so['oid']) for so in reversed(sobjs)])
+        value = [len(objs), data['fuel_mass'], data['wet_mass'],
+                 data['dry_mass']]
+        expected = [len(sobjs), 20.0, 20.0, 0.0]
+        self.assertEqual(expected, value)
+
+    def test_42_assembly_metrics(self):
+        """
+        CASE:  cached level and node counts match a full traversal of
+        'componentz', before and after an assembly is changed
+        """
+        def levels_and_nodes(oid):
+            comps = componentz.get(oid) or []
+            subs = [levels_and_nodes(c.oid) for c in comps]
+            return (1 + max([0] + [s[0] for s in subs]),
+                    len(comps) + sum(s[1] for s in subs))
+        sc = orb.get('test:spacecraft3')
+        before = [get_level_count(sc), node_count(sc.oid)]
+        expected_before = list(levels_and_nodes(sc.oid))
+        # give a leaf part of the spacecraft 2 components
+        path = [sc.oid]
+        while componentz.get(path[-1]):
+            path.append(componentz[path[-1]][0].oid)
+        leaf = path[-1]
+        componentz[leaf] = [Comp('test:x', 'test:x-acu', 1, ''),
+                            Comp('test:y', 'test:y-acu', 1, '')]
+        invalidate_assembly_metrics(leaf)
+        after = [get_level_count(sc), node_count(sc.oid)]
+        expected_after = list(levels_and_nodes(sc.oid))
+        del componentz[leaf]
+        invalidate_assembly_metrics(leaf)
+        # until the orb is ready, the Acus are traversed instead
+        sc_comps = componentz[sc.oid]
+        componentz[sc.oid] = []
+        invalidate_assembly_metrics(sc.oid)
+        orb.ready.clear()
+        try:
+            not_ready_levels = get_level_count(sc)
+        finally:
+            orb.ready.set()
+            componentz[sc.oid] = sc_comps
+            invalidate_assembly_metrics(sc.oid)
+        value = [before, after, after[0] >= len(path) + 1,
+                 [get_level_count(sc), node_count(sc.oid)],
+                 not_ready_levels]
+        expected = [expected_before, expected_after, True, expected_before,
+                    expected_before[0]]
+        self.assertEqual(expected, value)
+
+    def test_43_id_exists(self):
+        """
+        CASE:  orb.id_exists() agrees with get_idvs() and follows changes to
+        ids; validate_all() uses it to find duplicate ids
+        """
+        def idv_checks(id_value, version):
+            idvs = orb.get_idvs('HardwareProduct')
+            return [orb.id_exists('HardwareProduct', id_value) ==
+                        (id_value in [idv[0] for idv in idvs]),
+                    orb.id_exists('HardwareProduct', id_value,
+                                  version=version) ==
+                        ((id_value, version) in idvs)]
+        sc = orb.get('test:spacecraft0')
+        old_id = sc.id
+        idv = (old_id, sc.version)
+        others = orb.get_idvs('HardwareProduct').count(idv) - 1
+        before = [orb.id_exists('HardwareProduct', old_id, version=sc.version),
+                  orb.id_exists('HardwareProduct', old_id, version=sc.version,
+                                oid=sc.oid) == bool(others),
+                  orb.id_exists('HardwareProduct', 'Rocinante-2'),
+                  orb.id_exists('Project', 'H2G2'),
+                  orb.id_exists('Project', 'H2G2', oid='H2G2')]
+        sc.id = 'Rocinante-2'
+        orb.save([sc])
+        after = (idv_checks('Rocinante-2', sc.version) +
+                 idv_checks(old_id, sc.version) +
+                 [orb.id_exists('HardwareProduct', 'Rocinante-2', oid=sc.oid)])
+        schema = orb.schemas['HardwareProduct']
+        fields = dict(id='Rocinante-2', version=sc.version, name='x')
+        msgs = [list(validate_all(fields, 'HardwareProduct', schema, ['id'],
+                                  orb=orb)),
+                list(validate_all(dict(fields, oid=sc.oid), 'HardwareProduct',
+                                  schema, ['id'], orb=orb))]
+        sc.id = old_id
+        orb.save([sc])
+        value = [before, after, msgs,
+                 orb.id_exists('HardwareProduct', 'Rocinante-2')]
+        expected = [[True, True, False, True, False], [True] * 4 + [False],
+                    [['Duplicate id + version'], []], False]
+        self.assertEqual(expected, value)
+
+    def test_44_next_ids(self):
+        """
+        CASE:  gen_product_id() and get_next_rqt_seq() return the same value
+        until an object that uses it is saved (allocation has no side
+        effects), unless a rqt seq is reserved
+        """
+        def max_int(values):
+            ints = []
+            for v in values:
+                try:
+                    ints.append(int(v))
+                except:
+                    continue
+            return max(ints, default=0)
+        HW = orb.classes['HardwareProduct']
+        products = orb.get_by_type('HardwareProduct') + orb.get_by_type(
+                                                                'Template')
+        n = max_int((p.id or '').split('-')[-1] for p in products)
+        if str(n).zfill(7) in [(p.id or '').split('-')[-1]
+                               for p in products]:
+            n += 1
+        hw1 = HW(oid='test:next-ids-hw1', id='', name='hw1')
+        hw2 = HW(oid='test:next-ids-hw2', id='', name='hw2')
+        product_ids = [orb.gen_product_id(hw1), orb.gen_product_id(hw2)]
+        project = orb.get('H2G2')
+        reqs = [r for r in orb.search_exact(cname='Requirement', owner=project)
+                if not getattr(r, 'level', 0)]
+        m = max(1, max_int((r.id or '').split('.')[-1] for r in reqs) + 1)
+        seqs = [orb.get_next_rqt_seq(project, 0),
+                orb.get_next_rqt_seq(project, 0),
+                orb.get_next_rqt_seq(project, 0, reserve=True),
+                orb.get_next_rqt_seq(project, 0, reserve=True)]
+        release_seqz()
+        seqs.append(orb.get_next_rqt_seq(project, 0))
+        value = [product_ids, seqs]
+        expected = [['TBD-' + str(n).zfill(7)] * 2, [m, m, m, m + 1, m]]
+        self.assertEqual(expected, value)
+
+    def test_44a_clone_ref_des(self):
+        """
+        CASE:  clone() gives the Acus of a clone distinct reference
+        designators, and leaves no values reserved
+        """
+        # (its components have the same product type)
+        sc = orb.get('test:h2g2.propsubsystem0')
+        new_sc = clone(sc, save_hw=False)
+        rds = [acu.reference_designator for acu in new_sc.components]
+        # no reservations are left:  allocation is idempotent
+        next_rds = [get_next_ref_des(new_sc, None), get_next_ref_des(new_sc,
+                                                                     None)]
+        orb.db.rollback()
+        value = [len(rds), len(set(rds)), next_rds[0] == next_rds[1],
+                 next_rds[0] in rds]
+        expected = [len(sc.components), len(sc.components), True, False]
+        self.assertEqual(expected, value)
+
+    def test_45_bulk_load_reference_data(self):
+        """
+        CASE:  loading reference data into an empty db in bulk gives the same
+        objects and references (all objects owned) as the deserializer path,
+        plus the ParameterDefinition port types that the deserializer path
+        misses
+        """
+        bulk_oids, bulk_refs = load_refdata_in_fresh_orb(bulk=True)
+        oids, refs = load_refdata_in_fresh_orb(bulk=False)
+        value = [len(bulk_oids) == len(refdata.initial + refdata.pdc +
+                                       refdata.deds + refdata.core),
+                 bulk_oids == oids,
+                 sorted(bulk_refs) == sorted(refs),
+                 {k: v for k, v in bulk_refs.items() if refs[k] != v},
+                 [k for k, v in bulk_refs.items()
+                  if k.endswith(' owner_oid') and not v]]
+        expected = [True, True, True,
+                    {'pgef:ParameterDefinition.P port_type_oid':
+                        'pgefobjects:PortType.electrical_power',
+                     'pgef:ParameterDefinition.R_D port_type_oid':
+                        'pgefobjects:PortType.digital_data'},
+                    []]
+        self.assertEqual(expected, value)
+
     def test_50_write_mel(self):
         """
         CASE:  test success of mel_writer
@@ -1814,6 +2518,73 @@ class OrbTest(unittest.TestCase):
         value = 1
         self.assertEqual(expected, value)
 
+    def test_51_mel_data(self):
+        """
+        CASE:  MEL data for a system, with and without summary, and the
+        column-wise get_pvals()
+        """
+        sc = orb.get('test:spacecraft0')
+        schema = ['m[CBE]', 'm[Ctgcy]', 'T[operational_max]', 'Vendor', 'x']
+        acus = sorted(sc.components, key=get_mel_item_name)
+        oids = [sc.oid] + [acu.component.oid for acu in acus]
+        pvals = [get_pvals(oids, 'm[CBE]', units='g'),
+                 get_pvals(oids, 'T[operational_max]', units='degC'),
+                 get_pvals(oids, 'm[Ctgcy]'),
+                 get_pvals(oids, 'nonexistent')]
+        lines = get_mel_lines(sc)
+        data = get_mel_data(sc, schema=schema)
+        summary = get_mel_data(sc, schema=schema, summary=True)
+        tsv = get_item_data_tsv(sc, schema, 1).splitlines()
+        value = [pvals,
+                 [(line[1].oid, line[2], line[3])
+                  for line in lines if line[2] < 3],
+                 [d['m[CBE]'] for d in data if d['level'] != '3'],
+                 [d['x'] for d in data[:1]] + tsv[0].split('\t')[-1:],
+                 len(tsv),
+                 sum(int(d['qty']) for d in summary if d['level'] == '2')]
+        expected = [[[get_pval(oid, 'm[CBE]', units='g') for oid in oids],
+                     [get_pval(oid, 'T[operational_max]', units='degC')
+                      for oid in oids],
+                     [get_pval(oid, 'm[Ctgcy]') for oid in oids],
+                     [0.0] * len(oids)],
+                    [(sc.oid, 1, 1)] + [(acu.component.oid, 2,
+                                         acu.quantity or 1)
+                                        for acu in acus],
+                    [str(round_to(get_pval(oid, 'm[CBE]', units='kg')))
+                     for oid in oids],
+                    ['-', 'unknown'],
+                    len(data),
+                    sum(acu.quantity or 1 for acu in acus)]
+        self.assertEqual(expected, value)
+
+    def test_51a_mel_lines_cycle(self):
+        """
+        CASE:  a component that is used in its own assembly gets a MEL line
+        but its assembly is not expanded again
+        """
+        sc = orb.get('test:spacecraft0')
+        acus = sorted(sc.components, key=get_mel_item_name)
+        # a leaf component of the spacecraft that uses itself
+        acu = [a for a in acus if not componentz.get(a.component.oid)][0]
+        leaf = acu.component
+        componentz[leaf.oid] = [Comp(leaf.oid, acu.oid, 1, '')]
+        try:
+            lines = get_mel_lines(sc)
+            summary_lines = get_mel_lines(sc, summary=True)
+        finally:
+            del componentz[leaf.oid]
+        expected_lines = [(sc.oid, 1)]
+        for a in acus:
+            expected_lines.append((a.component.oid, 2))
+            if a is acu:
+                expected_lines.append((leaf.oid, 3))
+        value = [[(line[1].oid, line[2]) for line in lines if line[2] < 3
+                  or line[1] is leaf],
+                 [line[2] for line in summary_lines
+                  if line[1] is leaf]]
+        expected = [expected_lines, [2, 3]]
+        self.assertEqual(expected, value)
+
     # def test_upload_file(self, obj_oid, file_name):
         # pass
 
@@ -7,7 +7,7 @@ import unittest
 from functools import reduce
 
 # PanGalactic
-from pangalactic.core.tachistry import Tachistry, schemas
+from pangalactic.core.tachistry import ColumnarMatrix, Tachistry, schemas
 
 r = Tachistry(home='marvin_test', force_new_core=1)
 
@@ -134,3 +134,62 @@ class TachistryTests(unittest.TestCase):
         expected = [expected_1, expected_2]
         self.assertEqual(expected, value)
 
+
+    def test_06_warm_start(self):
+        """
+        CASE:  warm start from the extract cache
+
+        A Tachistry started on an existing home (no force_new_core) should
+        load its extracts from the cache, leave the KB unparsed, and register
+        the cached namespaces.
+        """
+        from pangalactic.core.names import namespaces
+        r2 = Tachistry(home='marvin_test')
+        value = [r2._kb is None,
+                 set(r.ces) <= set(r2.ces),
+                 'pgef' in namespaces]
+        expected = [True, True, True]
+        self.assertEqual(expected, value)
+
+    def test_07_schema_bundle(self):
+        """
+        CASE:  warm start from the schema bundle
+
+        After a warm start has written the schema bundle, the next start should
+        restore everything from the bundle, and the bundled subclass closure
+        should agree with a walk of the class extracts.
+        """
+        r3 = Tachistry(home='marvin_test')
+        subs = r3.all_your_sub(r3.ces['Product'])
+        value = [r3.bundle_loaded,
+                 set(r.ces) <= set(r3.ces),
+                 subs == set(r3._extract_subwalk(r3.ces['Product'])),
+                 'HardwareProduct' in subs]
+        expected = [True, True, True, True]
+        self.assertEqual(expected, value)
+
+    def test_08_columnar_matrix(self):
+        """
+        CASE:  ColumnarMatrix behaves like a dict of object dicts
+
+        Rows can be added, updated, deleted (and their storage reused), and the
+        matrix survives a round trip through its columnar form.
+        """
+        m = ColumnarMatrix()
+        m['a'] = dict(oid='a', _cname='Person', id='alpha', name='Alpha')
+        m['b'] = dict(oid='b', _cname='Person', id='beta')
+        m['c'] = dict(oid='c', _cname='Project', id='gamma')
+        m['b']['name'] = 'Beta'
+        del m['a']['name']
+        del m['c']
+        m['d'] = dict(oid='d', _cname='Project', id='delta')
+        m2 = ColumnarMatrix()
+        m2.load_columns(m.to_columns())
+        value = [dict(m['a']), dict(m['b']), 'c' in m, sorted(m2),
+                 dict(m2['d']), m2['a'].get('name'),
+                 len(m._tables['Project'].oids)]
+        expected = [dict(oid='a', _cname='Person', id='alpha'),
+                    dict(oid='b', _cname='Person', id='beta', name='Beta'),
+                    False, ['a', 'b', 'd'],
+                    dict(oid='d', _cname='Project', id='delta'), None, 1]
+        self.assertEqual(expected, value)
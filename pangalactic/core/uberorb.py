@@ -35,9 +35,10 @@ intended to be a singleton).
 # ANY SUCH MATTER SHALL BE THE IMMEDIATE, UNILATERAL TERMINATION OF THIS
 # AGREEMENT.
 
-import json, os, shutil, sys, traceback
+import json, os, shutil, sys, threading, traceback
+from contextlib import contextmanager
 from copy import deepcopy
-from functools import reduce
+from functools import wraps
 from pathlib import Path
 from typing import Optional
 
@@ -48,8 +49,10 @@ from pydispatch import dispatcher
 import ruamel_yaml as yaml
 
 # SQLAlchemy
-from sqlalchemy     import sql
-from sqlalchemy.orm import sessionmaker, with_polymorphic
+from sqlalchemy     import (create_engine, event, inspect as sa_inspect,
+                            sql)
+from sqlalchemy.orm import scoped_session, sessionmaker, with_polymorphic
+from sqlalchemy.orm.util import identity_key
 
 # PanGalactic
 from pangalactic.core             import __version__
@@ -62,18 +65,28 @@ from pangalactic.core             import refdata, ref_db
 from pangalactic.core.registry    import PanGalacticRegistry
 from pangalactic.core.mapping     import schema_maps, schema_version
 from pangalactic.core.meta        import TEXT_PROPERTIES
+from pangalactic.core.names       import (clear_seqz,
+                                          get_next_product_id_suffix,
+                                          get_next_rqt_seq,
+                                          get_product_id_suffixes,
+                                          note_deleted, note_saved,
+                                          product_id_suffix_is_unique)
 from pangalactic.core.parametrics import (add_context_parm_def,
                                           add_default_parameters,
                                           add_default_data_elements,
+                                          begin_deferred_recompute,
                                           componentz,
                                           compute_requirement_margin,
                                           data_elementz, de_defz,
+                                          deserialize_des, deserialize_parms,
+                                          end_deferred_recompute,
                                           get_parameter_id,
                                           get_dval, get_pval,
                                           set_dval, set_pval,
                                           get_dval_as_str,
                                           get_pval_as_str,
-                                          load_data_elementz,
+                                          get_comps, get_systems,
+                                          load_data_elementz, load_defz,
                                           save_data_elementz,
                                           load_mode_defz, save_mode_defz,
                                           load_parmz, save_parmz,
@@ -83,20 +96,25 @@ from pangalactic.core.parametrics import (add_context_parm_def,
                                           parmz_by_dimz, refresh_componentz,
                                           refresh_rqt_allocz, rqt_allocz,
                                           refresh_systemz,
-                                          recompute_parmz,
-                                          round_to,
-                                          save_systemz, systemz)
-from pangalactic.core.serializers import (serialize, deserialize,
+                                          merge_startup_caches,
+                                          recompute_parmz, remove_componentz,
+                                          remove_parm_def, remove_systemz,
+                                          round_to, save_defz,
+                                          save_systemz, systemz,
+                                          track_cache_refreshes,
+                                          update_de_defz, update_parm_defz,
+                                          update_parmz_by_dimz)
+from pangalactic.core.serializers import (serialize, deserialize, uncookers,
                                           uncook_datetime)
-from pangalactic.core.test        import data as test_data_mod
-from pangalactic.core.test        import vault as test_vault_mod
-from pangalactic.core.test.utils  import gen_test_dvals, gen_test_pvals
 from pangalactic.core.units       import in_si
 from pangalactic.core.utils.datetimes import (dtstamp, file_dts,
                                               file_date_stamp, dt2local_tz_str)
+from pangalactic.core.utils.profiling import StartupProfiler
 from pangalactic.core.log         import get_loggers
-# from pangalactic.core.validation  import check_for_cycles
-from pangalactic.core.validation  import get_assembly
+from pangalactic.core.validation  import (IdIndex, find_cycles,
+                                          format_cycles, get_assembly,
+                                          get_assembly_oids, get_bom,
+                                          get_flat_bom)
 
 DEPRECATED_PARAMETERS = ['P[max]', 'P[min]',
                          'T', 'T[max]', 'T[min]', 'T[Survival]']
@@ -114,6 +132,19 @@ NULL_VALUE = {'str' : '',
               'set' : set([])}
 
 
+def read_api(method):
+    """
+    Decorator for orb methods that only read from the db:  if a read session
+    has been configured, route the method's db access to it (see
+    UberORB.reading).
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kw):
+        with self.reading():
+            return method(self, *args, **kw)
+    return wrapper
+
+
 
 
 class UberORB(object):
@@ -131,7 +162,8 @@ class UberORB(object):
 
     Attributes:
         classes (dict):  a mapping of `meta_id`s to runtime app classes.
-        db (Session):  interface to the local db
+        db (Session):  interface to the local db (within a `reading()`
+            context, the current thread's read session, if configured)
         db_engine (SQLAlchemy orm):  result of registry `create_engine`
         error_log (Logger):  instance of pgorb_error_logger
         home (str):  full path to the application home directory -- populated
@@ -139,11 +171,21 @@ class UberORB(object):
         log (Logger):  instance of pgorb_logger
         new_oids (list of str):  oids of objects that have been created but not
             saved
+        deferred_error (str):  traceback of the failure of the deferred
+            startup work, if it failed (`ready` is then not set)
+        ready (threading.Event):  set when startup is complete, including the
+            deferred startup work if start() was called with `deferred=True`
+            -- until it is set, the `componentz` and `systemz` caches may be
+            incomplete (see start())
+        read_db (scoped_session):  optional read-only session factory used by
+            read APIs (None if not configured) -- see init_read_db()
         registry (PanGalacticRegistry):  instance of PanGalacticRegistry
         remote (TBD) interface to remote services [TO BE IMPLEMENTED]
         role_product_types: cache that maps Role ids to corresponding
             ProductType ids (used by the 'access' module, which determines user
             permissions relative to domain objects
+        startup_profile (dict):  per-phase timing of the last orb.start() --
+            see p.core.utils.profiling.StartupProfiler.finish()
         schemas (dict):  a dict containing the equivalent of the ontology
             content -- the structure of the dict is defined in
             p.core.registry._update_schemas_from_extracts ...
@@ -196,10 +238,45 @@ class UberORB(object):
     parmz_status: str = 'unknown'
     # all_pt_abbrs will be updated by load_reference_data()
     all_pt_abbrs = []
+    # startup_profile is populated by start(); _profiler only exists while
+    # start() is running
+    startup_profile: Optional[dict] = None
+    _profiler: Optional[StartupProfiler] = None
+    # ready:  see start() -- _deferred is True while start() is running in
+    # deferred mode; _startup_done is set when startup is over, whether or not
+    # the deferred startup work succeeded; _pending_signals are the signals
+    # queued by the deferred startup work (see send_pending_signals)
+    ready = threading.Event()
+    deferred_error: Optional[str] = None
+    _startup_done = threading.Event()
+    _deferred: bool = False
+    _pending_signals: list = []
+    # _stmts:  cache of prepared (bound-parameter) select statements used by
+    # the hot lookup methods (get, get_by_type, get_oids, etc.) -- reset by
+    # init_registry() since the statements reference the registry classes
+    _stmts: dict = {}
+    # _id_index:  index of ids and versions by class, used by id_exists() --
+    # built on first use and maintained by the primary session's flushes
+    _id_index: Optional[IdIndex] = None
+    # _db:  the primary session; _local.db:  the read session in use by the
+    # current thread (set only within a `reading()` context)
+    _db = None
+    _local = threading.local()
+    read_db = None
+
+    @property
+    def db(self):
+        session = getattr(self._local, 'db', None)
+        return self._db if session is None else session
+
+    @db.setter
+    def db(self, session):
+        self._db = session
 
     def start(self, home: str = '', db_url: str = '',
               console: bool = False, debug: bool = False,
-              log_msgs: Optional[list[str]] = None, **kw) -> str:
+              log_msgs: Optional[list[str]] = None, deferred: bool = False,
+              **kw) -> str:
         """
         Initialization logic.
 
@@ -212,14 +289,38 @@ class UberORB(object):
                 if False: redirect stdout/stderr to log file
             debug (bool):  (default: False) log in debug mode
             log_msgs (list of str):  initial log message(s)
+            deferred (bool):  (default: False) if True (or if the
+                'deferred_startup' config item is set), build the
+                componentz, systemz and all_pt_abbrs caches and recompute
+                the computed parameters in a background thread after start()
+                returns -- `orb.ready` is set when that is done, and get_pval()
+                for a computed parameter waits for it.  NOTE:  until then,
+                the `componentz` and `systemz` caches are incomplete:  the
+                orb's assembly functions (get_bom_from_compz,
+                get_assembly_from_compz, get_bom_oids) and
+                p.core.validation.get_level_count fall back to the db, but
+                any other code that reads those caches directly must call
+                wait_until_ready() first.  The 'parameters recomputed' signal
+                is queued and sent from the main thread (see
+                send_pending_signals).
         """
         if self.started:
             return ''
+        self.ready.clear()
+        self._startup_done.clear()
+        self.deferred_error = None
+        self._pending_signals = []
+        # counting objects walks the gc object list at each lap, so is only
+        # done when the profile is to be written (see _finish_profile)
+        self._profiler = StartupProfiler(
+                            version=__version__,
+                            count_objects=bool(config.get('profile_startup')))
         self.log_msgs = log_msgs or []
         # if using sqlite, begin with a db file that is pre-populated with ref
         # data -- this saves a minute or so of startup time ...
         if not db_url or db_url.startswith('sqlite'):
             self.setup_ref_db_and_version(home, __version__)
+        self._lap('ref db setup')
         # set home directory -- in order of precedence (A, B, C):
         # [A] 'home' kw arg (this should be set by the application, if any)
         pgx_home: str = ''
@@ -302,6 +403,7 @@ class UberORB(object):
         if 'units' not in prefs:
             prefs['units'] = {}
         self.cache_path = os.path.join(pgx_home, 'cache')
+        self._lap('config, state, logging')
         if not db_url:
             # if no db_url is specified, create a local sqlite db
             local_db_path = os.path.join(pgx_home, 'local.db')
@@ -330,7 +432,7 @@ class UberORB(object):
             self.log.debug('  [1] removing caches ...')
             for prefix in ['data_elements', 'diagrams', 'parameters',
                            'mode_defs', 'parms_by_dims', 'systems',
-                           'components']:
+                           'components', 'definitions']:
                 fpath = os.path.join(pgx_home, prefix + '.json')
                 if os.path.exists(fpath):
                     os.remove(fpath)
@@ -380,7 +482,12 @@ class UberORB(object):
                 shutil.rmtree(os.path.join(pgx_home, '.creds'),
                               ignore_errors=True)
                 self.log.debug('      done with keys.')
+        self._lap('registry')
         # * copy test data files from 'p.test.data' module to test_data_dir
+        # (test modules are imported here, not at module level, so that the
+        # orb module does not depend on the test package at import time)
+        from pangalactic.core.test import data as test_data_mod
+        from pangalactic.core.test import vault as test_vault_mod
         self.test_data_dir = os.path.join(pgx_home, 'test_data')
         current_test_files = set()
         # self.log.debug('* checking for test data in [pgx_home]/test_data...')
@@ -440,12 +547,15 @@ class UberORB(object):
         # basically, versionables == {Product and all its subclasses}
         self.versionables = [cname for cname in self.classes if 'version' in
                              self.schemas[cname]['field_names']]
+        self._lap('test data, vault')
         # load (and update) ref data ... note that this must be done AFTER
         # config and state have been created and updated (except in the case
         # that the schema version doesn't match and we have to load data from a
         # dump)
+        self._deferred = bool(deferred or config.get('deferred_startup'))
         self.load_reference_data()
         self._load_diagramz()
+        self._lap('diagrams')
         # create 'role_product_types' cache
         self.role_product_types = {}
         # discipline_subsystems maps Discipline ids to ProductType ids
@@ -477,14 +587,144 @@ class UberORB(object):
                     else:
                         self.role_product_types[role_id] = set(
                             discipline_subsystems.get(discipline_id))
+        self._lap('role caches')
         load_mode_defz(self.home)
         self.log.info('  + mode defs loaded.')
+        self._lap('mode defs')
         self.started = True
         # TODO:  clean up boilerplate ...
         save_data_elementz(self.home)
         save_parmz(self.home)
+        self._lap('save caches')
+        self._finish_profile()
+        if self._deferred:
+            self._start_deferred_work()
+        else:
+            self.ready.set()
+            self._startup_done.set()
         return self.home
 
+    def _start_deferred_work(self):
+        """
+        Start the background thread that does the startup work deferred by
+        load_reference_data() -- see start().
+        """
+        worker = threading.Thread(target=self._run_deferred_work,
+                                  name='orb-deferred-startup', daemon=True)
+        begin_deferred_recompute(worker)
+        # cache entries the main thread refreshes from now on are newer than
+        # the ones built by the worker (see _build_startup_caches)
+        track_cache_refreshes()
+        self.log.info('* starting deferred startup work ...')
+        worker.start()
+
+    def _run_deferred_work(self):
+        """
+        Do the deferred startup work (run in the background thread), using a
+        session private to the thread (the primary session must not be shared
+        between threads), then set `ready`.  If the work fails, `ready` is not
+        set, since the startup caches are incomplete (so the functions that
+        check `ready` do not use them), and the error is saved in
+        `deferred_error`.
+        """
+        profiler = StartupProfiler(version=__version__)
+        failed = False
+        try:
+            with self._private_session():
+                self._build_startup_caches(profiler.lap)
+            self.log.info('* deferred startup work completed.')
+        except:
+            failed = True
+            self.deferred_error = traceback.format_exc()
+            self.log.error('* deferred startup work failed -- startup caches '
+                           'are incomplete:')
+            self.log.error(self.deferred_error)
+        finally:
+            self._deferred = False
+            if failed:
+                # stop tracking cache refreshes (nothing to merge)
+                merge_startup_caches()
+            end_deferred_recompute()
+            if self.startup_profile is not None:
+                self.startup_profile['deferred'] = profiler.finish()
+            if not failed:
+                self.ready.set()
+            self._startup_done.set()
+
+    @contextmanager
+    def _private_session(self):
+        """
+        Context in which `self.db` is, for the current thread only, the read
+        session (if one is configured) or a new session on the primary engine.
+        """
+        if self.read_db is not None:
+            with self.reading():
+                yield
+            return
+        session = sessionmaker(bind=self.db_engine)()
+        self._local.db = session
+        try:
+            yield
+        finally:
+            self._local.db = None
+            session.close()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until startup (including any deferred startup work) is complete.
+        If called from the main thread, then sends any pending signals (see
+        send_pending_signals).
+
+        Keyword Args:
+            timeout (float):  maximum number of seconds to wait (None: no
+                limit)
+
+        Returns:
+            bool:  True if the orb is ready (False if the deferred startup
+                work failed -- see `deferred_error`)
+        """
+        self._startup_done.wait(timeout)
+        if threading.current_thread() is threading.main_thread():
+            self.send_pending_signals()
+        return self.ready.is_set()
+
+    def send_pending_signals(self):
+        """
+        Send the signals queued by the deferred startup work (e.g. 'parameters
+        recomputed').  They are not sent from the background thread because
+        their receivers (e.g. Qt widgets) must run in the main thread, so this
+        must be called from the main thread -- wait_until_ready() does that;
+        an app that does not wait can call it (e.g. from a timer) once `ready`
+        is set.
+        """
+        while self._pending_signals:
+            dispatcher.send(self._pending_signals.pop(0))
+
+    def _lap(self, name):
+        """
+        Record the end of a startup phase (no-op when start() is not running).
+
+        Args:
+            name (str):  name of the phase that just ended
+        """
+        if self._profiler is not None:
+            self._profiler.lap(name)
+
+    def _finish_profile(self):
+        """
+        Set `startup_profile` from the startup profiler and, if the
+        'profile_startup' config item is set, write it to
+        "startup_profile.json" in the home directory.
+        """
+        self.startup_profile = self._profiler.finish()
+        if config.get('profile_startup'):
+            self._profiler.dump(os.path.join(self.home,
+                                             'startup_profile.json'))
+        self.log.debug('* startup profile:')
+        for line in self._profiler.report().split('\n'):
+            self.log.debug('  ' + line)
+        self._profiler = None
+
     def setup_ref_db_and_version(self, home, version):
         """
         Add a local sqlite "local.db" file that is pre-populated with all data from
@@ -521,6 +761,10 @@ class UberORB(object):
         self.schemas = self.registry.schemas
         self.classes = self.registry.classes
         self.mbo = self.registry.metaobject_build_order()
+        # prepared statements reference the classes, so must be rebuilt
+        self._stmts = {}
+        self._id_index = None
+        clear_seqz()
         # init db
         self.init_db()
 
@@ -534,8 +778,61 @@ class UberORB(object):
         if not getattr(self, 'db', None):
             Session = sessionmaker(bind=self.db_engine)
             self.db = Session()
+            event.listen(self.db, 'after_flush', self._update_indexes)
+            event.listen(self.db, 'after_soft_rollback',
+                         self._reset_indexes)
             # NOTE:  DO NOT *EVER* USE 'expire_on_commit = False' here!!!
             #        -> it causes VERY weird behavior ...
+            self.init_read_db()
+
+    def init_read_db(self):
+        """
+        Initialize the optional read session, which is used by read APIs
+        (get_mod_dts, get_objects_for_project, get_project_parameters) so that
+        they do not contend with writers for the primary session.  Configured
+        by either of these config settings:
+
+            read_db_url (str):  url of a read replica of the db
+            read_session (bool):  if True, use a second connection to the
+                primary db (for sqlite, the db is put in WAL mode so that
+                reads do not block on writes)
+
+        Writes always use the primary session.
+        """
+        read_db_url = config.get('read_db_url')
+        if read_db_url:
+            read_engine = create_engine(read_db_url)
+        elif config.get('read_session'):
+            if self.db_engine.url.get_backend_name() == 'sqlite':
+                with self.db_engine.connect() as conn:
+                    conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+            read_engine = create_engine(self.db_engine.url)
+        else:
+            self.read_db = None
+            return
+        self.log.debug('* init_read_db():  read session configured.')
+        # scoped_session -> each thread gets its own read session
+        self.read_db = scoped_session(sessionmaker(bind=read_engine))
+
+    @contextmanager
+    def reading(self):
+        """
+        Context in which `self.db` is the current thread's read session, if a
+        read session is configured (otherwise a no-op).  The read session's
+        transaction is ended on entry, so the reads see the latest data.
+        """
+        if (self.read_db is None or
+            getattr(self._local, 'db', None) is not None):
+            # no read session, or already reading
+            yield
+            return
+        session = self.read_db()
+        session.rollback()
+        self._local.db = session
+        try:
+            yield
+        finally:
+            self._local.db = None
 
     def dump_db(self, fpath=None, dir_path=None):
         """
@@ -562,7 +859,7 @@ class UberORB(object):
                 os.makedirs(dir_path)
             fname = 'db-dump-' + dts + '.yaml'
         self.log.info('  dumping database to yaml ...')
-        s_objs = serialize(self, self.get_all_subtypes('Identifiable'),
+        s_objs = serialize(self, self.iter_all_subtypes('Identifiable'),
                            include_refdata=True)
         f = open(os.path.join(dir_path, fname), 'w')
         f.write(yaml.safe_dump(s_objs, default_flow_style=False))
@@ -761,6 +1058,7 @@ class UberORB(object):
                 elements will be assigned to
         """
         self.log.debug('* assign_test_parameters()')
+        from pangalactic.core.test.utils import gen_test_dvals, gen_test_pvals
         for o in objs:
             cname = o.__class__.__name__
             ptid = getattr(getattr(o, 'product_type', None), 'id', None)
@@ -778,7 +1076,7 @@ class UberORB(object):
         their components) at startup.
         """
         # self.log.debug('  + building componentz cache ...')
-        for product in self.get_all_subtypes('Product'):
+        for product in self.iter_all_subtypes('Product'):
             if product.components:
                 refresh_componentz(product)
         # compz = len(componentz)
@@ -890,48 +1188,69 @@ class UberORB(object):
         elements, "modes" (power modes of systems), and their definitions.
         Performed at orb start up, since new objects created at runtime refer
         to some of the reference objects.
+
+        Two fast paths are used when possible:
+
+          [a] if the db is empty (first-time installation), all reference data
+              is inserted in bulk in a single transaction (see
+              _bulk_load_reference_data), bypassing the deserializer;
+          [b] if the digest of the reference data manifest (refdata.ref_digest)
+              matches the one saved in `state` (i.e. the reference data has
+              not changed since it was last loaded into this db), the checks
+              for missing and updated reference data are skipped entirely.
+
+        Otherwise, missing and updated reference data objects are found by
+        comparing the db against the manifest (refdata.ref_mod_dts).
         """
         # self.log.info('* checking reference data ...')
         # first get the oids of everything in the db ...
-        db_oids = self.get_oids()
-        # [0] load initial reference data (Orgs, Persons, Roles,
-        # RoleAssignments)
-        missing_i = [so for so in refdata.initial if so['oid'] not in db_oids]
-        if missing_i:
-            # self.log.debug('  + missing some initial reference data:')
-            # self.log.debug('  {}'.format([so['oid'] for so in missing_i]))
-            i_objs = deserialize(self, [so for so in missing_i],
-                                 include_refdata=True,
-                                 force_no_recompute=True)
-            self.save(i_objs)
-            # for o in i_objs:
-                # self.db.add(o)
-            # self.db.commit()
-        admin = self.get('pgefobjects:admin')
-        pgana = self.get('pgefobjects:PGANA')
-        # self.log.info('  + initial reference data loaded.')
-        # [1] load any parameter definitions and contexts that may be missing
-        #     from the current db (in a first-time installation, this will of
-        #     course be *all* parameter definitions and contexts)
-        missing_p = [so for so in refdata.pdc if so['oid'] not in db_oids]
-        if missing_p:
-            # self.log.debug('  + missing some reference parameters/contexts:')
-            # self.log.debug('  {}'.format([so['oid'] for so in missing_p]))
-            p_objs = deserialize(self, [so for so in missing_p],
-                                 include_refdata=True,
-                                 force_no_recompute=True)
-            self.save(p_objs)
-        # [1.1] load any data element definitions that may be missing
-        #     from the current db (in a first-time installation, this will of
-        #     course be *all* data element definitions)
-        missing_d = [so for so in refdata.deds if so['oid'] not in db_oids]
-        if missing_d:
-            # self.log.debug('  + missing some reference data elements:')
-            # self.log.debug('  {}'.format([so['oid'] for so in missing_d]))
-            d_objs = deserialize(self, [so for so in missing_d],
-                                 include_refdata=True,
-                                 force_no_recompute=True)
-            self.save(d_objs)
+        db_oids = set(self.get_oids())
+        digest = self.get_refdata_digest()
+        bulk_loaded = []
+        if not db_oids:
+            # fresh db -> bulk insert all reference data
+            bulk_loaded = self._bulk_load_reference_data()
+        # refdata_current:  the ref data in the db is the same as the app's ref
+        # data (PGANA is checked in case the db was replaced but state kept)
+        refdata_current = bool(bulk_loaded or
+                               (state.get('refdata_digest') == digest and
+                                'pgefobjects:PGANA' in db_oids))
+        if not refdata_current:
+            # [0] load initial reference data (Orgs, Persons, Roles,
+            # RoleAssignments)
+            missing_i = [so for so in refdata.initial
+                         if so['oid'] not in db_oids]
+            if missing_i:
+                # self.log.debug('  + missing some initial reference data:')
+                # self.log.debug('  {}'.format([so['oid'] for so in missing_i]))
+                i_objs = deserialize(self, [so for so in missing_i],
+                                     include_refdata=True,
+                                     force_no_recompute=True)
+                self.save(i_objs)
+                # for o in i_objs:
+                    # self.db.add(o)
+                # self.db.commit()
+            # self.log.info('  + initial reference data loaded.')
+            # [1] load any parameter definitions and contexts that may be
+            #     missing from the current db
+            missing_p = [so for so in refdata.pdc if so['oid'] not in db_oids]
+            if missing_p:
+                # self.log.debug('  + missing some ref parameters/contexts:')
+                # self.log.debug('  {}'.format([so['oid'] for so in missing_p]))
+                p_objs = deserialize(self, [so for so in missing_p],
+                                     include_refdata=True,
+                                     force_no_recompute=True)
+                self.save(p_objs)
+            # [1.1] load any data element definitions that may be missing
+            #     from the current db
+            missing_d = [so for so in refdata.deds if so['oid'] not in db_oids]
+            if missing_d:
+                # self.log.debug('  + missing some reference data elements:')
+                # self.log.debug('  {}'.format([so['oid'] for so in missing_d]))
+                d_objs = deserialize(self, [so for so in missing_d],
+                                     include_refdata=True,
+                                     force_no_recompute=True)
+                self.save(d_objs)
         # [2] XXX IMPORTANT!  Create the parameter definitions caches
         # ('parm_defz' and 'parmz_by_dimz') before loading parameters from
         # 'parameters.json' -- the deserializer uses these caches.  Note that
@@ -942,10 +1261,10 @@ class UberORB(object):
         # in config['de_defz'], which may be part of the app config or a
         # user-edited config -- if any are found, it will create
         # DataElementDefinitions from them, add them to the database, and then
-        # add them to 'de_defz'.
-        self.create_de_defz()
-        self.create_parm_defz()
-        self.create_parmz_by_dimz()
+        # add them to 'de_defz'.  (If the definitions cache is current,
+        # the caches are loaded from it instead -- see init_defz_caches.)
+        self.init_defz_caches()
+        self._lap('ref data: initial, definitions')
         # *** NOTE ***********************************************************
         # [3] run _load_parmz() and _load_data_elementz() before checking for
         # updates to data element definitions and parameter definitions and
@@ -956,68 +1275,202 @@ class UberORB(object):
         # ********************************************************************
         self.data_elementz_status = load_data_elementz(self.home)
         self.parmz_status = load_parmz(self.home)
+        self._lap('ref data: load parmz, data elementz')
         # self.log.debug('  dmz: {}'.format(str(dmz)))
-        # [4] check for updates to parameter definitions and contexts
-        # self.log.debug('  + checking for updates to parameter definitions ...')
-        all_pds = refdata.pdc
-        all_pd_oids = [so['oid'] for so in all_pds]
-        # get mod_datetimes of all current ref data objects
-        pd_mod_dts = self.get_mod_dts(oids=all_pd_oids)
-        # compare them to all newly imported refdata objects
-        updated_pds = [so for so in all_pds
-                       if (uncook_datetime(so.get('mod_datetime')) and
-                           uncook_datetime(pd_mod_dts.get(so['oid'])) and
-                           (uncook_datetime(so.get('mod_datetime')) >
-                           uncook_datetime(pd_mod_dts.get(so['oid']))))] 
-        if updated_pds:
-            # self.log.debug('    {} updates found ...'.format(len(updated_pds)))
-            deserialize(self, updated_pds, include_refdata=True)
-            # self.log.debug('    parameter definition updates completed.')
-        # else:
-            # self.log.debug('    no updates found.')
-        # [5] load balance of any reference data missing from db
-        missing_c = [so for so in refdata.core if so['oid'] not in db_oids]
-        objs = []
-        if missing_c:
-            # self.log.debug('  + missing some core reference data:')
-            # self.log.debug('  {}'.format([so['oid'] for so in missing_c]))
-            objs = deserialize(self, [so for so in missing_c],
-                               include_refdata=True,
-                               force_no_recompute=True)
-        for o in objs:
-            if hasattr(o, 'owner'):
-                o.owner = pgana
-                o.creator = o.modifier = admin
-            self.db.add(o)
-        # [6] check for updates to reference data other than parameter defs
-        # self.log.debug('  + checking for updates to reference data ...')
-        all_ref = refdata.initial + refdata.core + refdata.deds
-        all_ref_oids = [so['oid'] for so in all_ref]
-        # get mod_datetimes of all current ref data objects
-        mod_dts = self.get_mod_dts(oids=all_ref_oids)
-        # compare them to all newly imported refdata objects
-        updated_r = [so for so in all_ref
-                     if (uncook_datetime(so.get('mod_datetime')) and
-                         uncook_datetime(mod_dts.get(so['oid'])) and
-                         (uncook_datetime(so.get('mod_datetime')) >
-                         uncook_datetime(mod_dts.get(so['oid']))))] 
-        if updated_r:
-            # self.log.debug('    {} updates found ...'.format(len(updated_r)))
-            deserialize(self, updated_r, include_refdata=True)
-            # self.log.debug('    updates completed.')
-        # else:
-            # self.log.debug('    no updates found.')
+        if bulk_loaded:
+            # parameters and data elements of bulk loaded objects can only be
+            # deserialized now that the definitions caches exist
+            for so in bulk_loaded:
+                deserialize_des(so['oid'], so.get('data_elements'),
+                                cname=so['_cname'])
+                deserialize_parms(so['oid'], so.get('parameters'),
+                                  cname=so['_cname'])
+        if not refdata_current:
+            # [4] check for updates to parameter definitions and contexts
+            # self.log.debug('  + checking for updates to parameter defs ...')
+            updated_pds = self._get_updated_refdata(refdata.pdc)
+            if updated_pds:
+                # self.log.debug('    {} updates found ...'.format(
+                                                        # len(updated_pds)))
+                deserialize(self, updated_pds, include_refdata=True)
+                # self.log.debug('    parameter definition updates completed.')
+            # else:
+                # self.log.debug('    no updates found.')
+            # [5] load balance of any reference data missing from db
+            admin = self.get('pgefobjects:admin')
+            pgana = self.get('pgefobjects:PGANA')
+            missing_c = [so for so in refdata.core if so['oid'] not in db_oids]
+            objs = []
+            if missing_c:
+                # self.log.debug('  + missing some core reference data:')
+                # self.log.debug('  {}'.format([so['oid'] for so in missing_c]))
+                objs = deserialize(self, [so for so in missing_c],
+                                   include_refdata=True,
+                                   force_no_recompute=True)
+            for o in objs:
+                if hasattr(o, 'owner'):
+                    o.owner = pgana
+                    o.creator = o.modifier = admin
+                self.db.add(o)
+            # [6] check for updates to reference data other than parameter defs
+            # self.log.debug('  + checking for updates to reference data ...')
+            updated_r = self._get_updated_refdata(
+                            refdata.initial + refdata.core + refdata.deds)
+            if updated_r:
+                # self.log.debug('    {} updates found ...'.format(
+                                                            # len(updated_r)))
+                deserialize(self, updated_r, include_refdata=True)
+                # self.log.debug('    updates completed.')
+            # else:
+                # self.log.debug('    no updates found.')
+        if state.get('refdata_digest') != digest:
+            state['refdata_digest'] = digest
+            write_state(os.path.join(self.home, 'state'))
+        self._lap('ref data: updates')
         # [7] remove deprecated reference data and parameters
         self.remove_deprecated_data()
+        self._lap('ref data: remove deprecated')
+        if self._deferred:
+            # done in a background thread after start() returns
+            self.log.info('  + startup caches and recompute deferred.')
+        else:
+            self._build_startup_caches(self._lap)
+        self.log.info('  + all reference data loaded.')
+
+    def _build_startup_caches(self, lap):
+        """
+        Build the 'componentz', 'systemz' and 'all_pt_abbrs' caches and
+        recompute the computed parameters.
+
+        Args:
+            lap (function):  called with the name of each phase when it ends
+        """
         # build the 'componentz' and 'systemz' runtime caches
-        self._build_componentz_cache()
-        self._build_systemz_cache()
+        if self._deferred:
+            # running in the background thread -- build the entries apart
+            # and merge them, so that entries refreshed by the main thread in
+            # the meantime are not overwritten with stale ones; the products
+            # are fetched, not streamed (iter_all_subtypes), so that no read
+            # is left open on the db while the main thread commits
+            compz = {product.oid: get_comps(product)
+                     for product in self.get_all_subtypes('Product')
+                     if product.components}
+            sysz = {project.oid: get_systems(project)
+                    for project in self.get_by_type('Project')
+                    if project.systems}
+            merge_startup_caches(compz, sysz)
+        else:
+            self._build_componentz_cache()
+            self._build_systemz_cache()
         # update the all_pt_abbrs cache, used in fix_hwproduct_id()
         self.all_pt_abbrs = [pt.abbreviation
                              for pt in self.get_by_type('ProductType')]
+        lap('componentz, systemz')
         if not state.get('connected'):
-            recompute_parmz()
-        self.log.info('  + all reference data loaded.')
+            if self._deferred:
+                # running in the background thread -- the signal is sent
+                # from the main thread (see send_pending_signals)
+                recompute_parmz(send_signal=False)
+                self._pending_signals.append('parameters recomputed')
+            else:
+                recompute_parmz()
+            lap('recompute parmz')
+
+    def get_refdata_digest(self):
+        """
+        Return the digest (sha256 hex string) of the reference data version
+        manifest, which is computed when the refdata module is imported.  The
+        digest of the reference data most recently loaded into the db is saved
+        in the state variable "refdata_digest".
+        """
+        return refdata.ref_digest
+
+    def _get_updated_refdata(self, sobjs):
+        """
+        Return the serialized reference data objects that have a later
+        'mod_datetime' in the reference data manifest than the corresponding
+        objects in the db.
+
+        Args:
+            sobjs (list of dict):  serialized reference data objects
+        """
+        ref_mod_dts = refdata.ref_mod_dts
+        # only objects with a mod_datetime can have been updated
+        oids = [so['oid'] for so in sobjs if ref_mod_dts.get(so['oid'])]
+        db_mod_dts = self.get_mod_dts(oids=oids, datetimes=True)
+        return [so for so in sobjs
+                if (so['oid'] in db_mod_dts and
+                    ref_mod_dts[so['oid']] > db_mod_dts[so['oid']])]
+
+    def _bulk_load_reference_data(self):
+        """
+        Insert all reference data into an empty db using ORM bulk INSERT
+        statements in a single transaction.  Object properties (foreign keys)
+        are set in a second pass of bulk UPDATEs, since some reference objects
+        refer to each other (e.g. Person.org and Organization.creator).
+
+        NOTE:  the parameters and data elements of the objects are NOT
+        deserialized here, since that requires the definitions caches -- see
+        load_reference_data().
+
+        Returns:
+            list of the serialized objects that were loaded
+        """
+        self.log.info('* bulk loading reference data ...')
+        sobjs = (refdata.initial + refdata.pdc + refdata.deds +
+                 refdata.core)
+        sobjs_by_oid = {so['oid'] : so for so in sobjs}
+        core_oids = set(so['oid'] for so in refdata.core)
+        rows_by_cname = {}
+        fk_rows_by_cname = {}
+        for so in sobjs:
+            cname = so['_cname']
+            schema = self.schemas[cname]
+            fields = schema['fields']
+            cols = set(sa_inspect(self.classes[cname]).column_attrs.keys())
+            row = {'oid': so['oid'], 'pgef_type': cname}
+            fk_row = {'oid': so['oid']}
+            for name in schema['field_names']:
+                field = fields[name]
+                if name == 'oid' or field['is_inverse']:
+                    continue
+                if field['range'] in self.classes:
+                    if name + '_oid' in cols:
+                        fk_row[name + '_oid'] = so.get(name) or None
+                elif name in cols:
+                    if field['range'] in ['date', 'datetime']:
+                        row[name] = uncookers[(field['range'],
+                                               field['functional'])](
+                                                            so.get(name))
+                    else:
+                        row[name] = so.get(name)
+            if 'owner_oid' in fk_row:
+                # same ownership rules as load_reference_data() and save()
+                if so['oid'] in core_oids:
+                    fk_row['owner_oid'] = 'pgefobjects:PGANA'
+                    fk_row['creator_oid'] = 'pgefobjects:admin'
+                    fk_row['modifier_oid'] = 'pgefobjects:admin'
+                elif not fk_row['owner_oid']:
+                    creator = sobjs_by_oid.get(fk_row.get('creator_oid'), {})
+                    fk_row['owner_oid'] = (creator.get('org') or
+                                           'pgefobjects:PGANA')
+            rows_by_cname.setdefault(cname, []).append(row)
+            if len(fk_row) > 1:
+                fk_rows_by_cname.setdefault(cname, []).append(fk_row)
+        try:
+            for cname, rows in rows_by_cname.items():
+                self.db.execute(sql.insert(self.classes[cname]), rows)
+            for cname, rows in fk_rows_by_cname.items():
+                self.db.execute(sql.update(self.classes[cname]), rows)
+            self.db.commit()
+        except:
+            self.db.rollback()
+            self.log.info('  bulk load failed; using deserializer ...')
+            self.error_log.info('* error in _bulk_load_reference_data():')
+            self.error_log.info(traceback.format_exc())
+            return []
+        self.log.info(f'  {len(sobjs)} reference data objects loaded.')
+        return sobjs
 
     #########################################################################
     # PARAMETER AND DATA ELEMENT STUFF
@@ -1026,6 +1479,95 @@ class UberORB(object):
     # to the parametrics module ...
     #########################################################################
 
+    def get_defz_key(self):
+        """
+        Return the key of the definitions from which the `parm_defz`,
+        `de_defz` and `parmz_by_dimz` caches are created:  the app version,
+        the data element definitions in state, and a dict that maps the oid
+        of each ParameterDefinition, ParameterContext and
+        DataElementDefinition to [class name, id, mod_datetime].
+        """
+        cnames = ['ParameterDefinition', 'ParameterContext',
+                  'DataElementDefinition']
+        stmt = self._prepared('get_defz_key', self._build_defz_key_stmt)
+        defs = {oid : [cname, id_, str(dt or '')]
+                for oid, cname, id_, dt in self.db.execute(stmt,
+                                                        {'vals': cnames})}
+        return dict(version=__version__,
+                    state_de_defz=state.get('de_defz') or {},
+                    defs=defs)
+
+    def _build_defz_key_stmt(self):
+        """
+        Build a statement that selects (oid, pgef_type, id, mod_datetime) for
+        all objects whose class is in a list (expanding bound parameter
+        'vals') -- used by get_defz_key().
+        """
+        ident = self.classes['Identifiable'].__table__
+        return sql.select(ident.c.oid, ident.c.pgef_type, ident.c.id,
+                          ident.c.mod_datetime).where(ident.c.pgef_type.in_(
+                                    sql.bindparam('vals', expanding=True)))
+
+    def init_defz_caches(self):
+        """
+        Initialize the `parm_defz`, `de_defz` and `parmz_by_dimz` caches.  If
+        the definitions cache ("definitions.json") was saved for the current
+        app version and state data element definitions, it is loaded, and
+        then updated for any ParameterDefinitions and DataElementDefinitions
+        that have been created, modified, or deleted since it was saved;
+        otherwise (or if any ParameterContext has changed, since every
+        parameter has a context parameter for each context), the caches are
+        created from the db.  The caches are then saved with the current key.
+        """
+        key = self.get_defz_key()
+        saved_key = load_defz(self.home)
+        changed = deleted = None
+        if (saved_key and saved_key.get('version') == key['version'] and
+            saved_key.get('state_de_defz') == key['state_de_defz']):
+            old, new = saved_key['defs'], key['defs']
+            changed = [oid for oid in new if old.get(oid) != new[oid]]
+            deleted = [oid for oid in old if oid not in new]
+            if any((old.get(oid) or new[oid])[0] == 'ParameterContext'
+                   for oid in changed) or any(
+                   old[oid][0] == 'ParameterContext' for oid in deleted):
+                changed = deleted = None
+        if changed is None:
+            self.log.debug('* creating definitions caches ...')
+            for cache in (parm_defz, de_defz, parmz_by_dimz):
+                cache.clear()
+            self.create_de_defz()
+            self.create_parm_defz()
+            self.create_parmz_by_dimz()
+            # create_de_defz() may have added DataElementDefinitions
+            key = self.get_defz_key()
+        elif changed or deleted:
+            self.log.debug('* updating definitions caches: '
+                           f'{len(changed)} changed, {len(deleted)} deleted')
+            for oid in changed + deleted:
+                if oid in old:
+                    cname, id_, _ = old[oid]
+                    if cname == 'ParameterDefinition':
+                        remove_parm_def(id_)
+                    else:
+                        de_defz.pop(id_, None)
+            contexts = self.get_by_type('ParameterContext')
+            for obj in (self.get(oids=changed) if changed else []):
+                if obj.__class__.__name__ == 'ParameterDefinition':
+                    # (see create_parm_defz)
+                    if ('_operational' not in obj.id and
+                        '_survival' not in obj.id and
+                        '_throughput' not in obj.id):
+                        update_parm_defz(obj)
+                    for c in contexts:
+                        add_context_parm_def(obj, c)
+                    update_parmz_by_dimz(obj)
+                else:
+                    update_de_defz(obj)
+        else:
+            self.log.debug('* definitions caches loaded.')
+            return
+        save_defz(self.home, key)
+
     def create_parm_defz(self):
         """
         Create the `parm_defz` cache of ParameterDefinitions, in the format:
@@ -1300,6 +1842,29 @@ class UberORB(object):
     # DB FUNCTIONS
     ##########################################################################
 
+    def _check_acu_for_cycles(self, acu):
+        """
+        Log an error if a saved Acu makes its assembly a component of itself
+        at any level (uses the 'componentz' cache, so only the assembly
+        structure of the Acu's component is searched).
+
+        Args:
+            acu (Acu): the Acu that was saved
+
+        Returns:
+            list:  the cycles found (see `validation.find_cycles`)
+        """
+        comp_oid = getattr(acu.component, 'oid', None)
+        if not comp_oid or comp_oid not in componentz:
+            return []
+        cycles = find_cycles(componentz, roots=[comp_oid])
+        if cycles:
+            self.log.error('  - Acu "{}" creates an assembly cycle:'.format(
+                                                                    acu.oid))
+            self.log.error(format_cycles(cycles, get_id=lambda oid: getattr(
+                                                self.get(oid), 'id', None)))
+        return cycles
+
     def save(self, objs, recompute=True):
         """
         Save the specified objects to the local db.  (CAVEAT: this will
@@ -1316,9 +1881,12 @@ class UberORB(object):
             objs (iterable of objects):  the objects to be saved
         """
         recompute_required = False
+        roles_changed = False
         for obj in objs:
             cname = obj.__class__.__name__
             oid = getattr(obj, 'oid', None)
+            if cname == 'RoleAssignment':
+                roles_changed = True
             # if the object is used in any assemblies, recompute parameters
             # TODO:  target the recompute to the specific assemblies ...
             if getattr(obj, 'where_used', []):
@@ -1371,6 +1939,7 @@ class UberORB(object):
                     comp_changed = True
                 # after checking for a changed component, refresh 'componentz'
                 refresh_componentz(obj.assembly)
+                self._check_acu_for_cycles(obj)
                 recompute_required = True
             elif cname == 'HardwareProduct':
                 # make sure all HW Products have their default parameters and
@@ -1390,6 +1959,8 @@ class UberORB(object):
         # self.log.debug('  orb.save:  committing db session.')
         # obj has already been "added" to the db (session) above, so commit ...
         self.db.commit()
+        if roles_changed:
+            dispatcher.send('role assignments changed')
         if recompute_required and recompute and not state.get('connected'):
             recompute_parmz()
         return True
@@ -1453,6 +2024,26 @@ class UberORB(object):
                 'mod_datetime': str(dtstamp())}
         # self.log.debug('  done.')
 
+    def _prepared(self, key, build):
+        """
+        Return a prepared statement from the statement cache, building it on
+        first use.  Prepared statements use bound parameters for all variable
+        values, so a single statement object (and therefore a single compiled
+        form in the engine's compiled cache) serves every call.
+
+        Args:
+            key (hashable):  cache key for the statement
+            build (callable):  no-argument function that builds the statement
+
+        Returns:
+            the prepared statement
+        """
+        stmt = self._stmts.get(key)
+        if stmt is None:
+            stmt = build()
+            self._stmts[key] = stmt
+        return stmt
+
     def get(self, *oid, **kw):
         """
         Get an object or objects from the db:
@@ -1461,6 +2052,10 @@ class UberORB(object):
               return value thanks to SqlAlchemy's 'with_polymorphic'.
           [2] if 'oids' kw arg is used, by a list of oids
 
+        NOTE:  for [1], the session's identity map is checked first, so an
+        object that is already loaded in the session is returned without
+        emitting any SQL.
+
         Args:
             oid (str):  the oid of an object in the db
 
@@ -1470,23 +2065,44 @@ class UberORB(object):
         Returns:
             obj (Identifiable or subtype) or None
         """
-        entity = with_polymorphic(self.classes['Identifiable'], '*')
         if oid:
             # self.log.debug('* get(%s)' % oid[0])
-            return self.db.query(entity).filter_by(oid=oid[0]).first()
+            if oid[0] is None:
+                # e.g. get(state.get('project')) -- no object has a null oid
+                return None
+            obj = self.db.identity_map.get(
+                        identity_key(self.classes['Identifiable'], oid[0]))
+            if obj is not None and obj not in self.db.deleted:
+                return obj
+            stmt = self._prepared('get', self._build_get_stmt)
+            return self.db.scalars(stmt, {'oid': oid[0]}).first()
         elif kw:
             oids = kw.get('oids')
             # self.log.debug('* get(oids=%s)' % str(oids))
             # self.log.debug('* get(oids=({} oids))'.format(len(oids)))
             if oids:
-                return self.db.query(entity).filter(
-                                        entity.oid.in_(oids)).all()
+                stmt = self._prepared('get_oids_in',
+                                      lambda: self._build_get_stmt(many=True))
+                return self.db.scalars(stmt, {'oids': list(oids)}).all()
             else:
                 return []
         else:
             # self.log.debug('* get() [no arguments provided]')
             return None
 
+    def _build_get_stmt(self, many=False):
+        """
+        Build the polymorphic select statement used by get():  for a single
+        oid (bound parameter 'oid') or, if `many` is True, for a list of oids
+        (expanding bound parameter 'oids').
+        """
+        entity = with_polymorphic(self.classes['Identifiable'], '*')
+        if many:
+            return sql.select(entity).where(
+                    entity.oid.in_(sql.bindparam('oids', expanding=True)))
+        return sql.select(entity).where(
+                entity.oid == sql.bindparam('oid')).limit(1)
+
     def get_count(self, cname):
         """
         Get a count of the objects of a given class in local db.
@@ -1516,7 +2132,34 @@ class UberORB(object):
         cls = self.classes.get(cname)
         if not cls:
             return []
-        return list(self.db.query(cls).filter(cls.pgef_type == cname))
+        stmt = self._prepared(('get_by_type', cname),
+                              lambda: sql.select(cls).where(
+                                      cls.pgef_type == sql.bindparam('cname')))
+        return self.db.scalars(stmt, {'cname': cname}).all()
+
+    def iter_by_type(self, cname, batch_size=1000):
+        """
+        Generator version of get_by_type():  yields objects of the specified
+        class, fetching rows from the db in batches of `batch_size` so that
+        passes over large numbers of objects use constant memory.
+
+        Args:
+            cname (str):  the class name of the objects to be retrieved
+
+        Keyword Args:
+            batch_size (int):  number of rows fetched per batch
+
+        Yields:
+            objects of the specified class
+        """
+        cls = self.classes.get(cname)
+        if not cls:
+            return
+        stmt = self._prepared(('get_by_type', cname),
+                              lambda: sql.select(cls).where(
+                                      cls.pgef_type == sql.bindparam('cname')))
+        yield from self.db.scalars(stmt, {'cname': cname},
+                                   execution_options={'yield_per': batch_size})
 
     def get_all_subtypes(self, cname):
         """
@@ -1532,6 +2175,28 @@ class UberORB(object):
         # self.log.debug('* get_all_subtypes(%s)' % cname)
         return self.db.query(self.classes[cname]).all()
 
+    def iter_all_subtypes(self, cname, batch_size=1000):
+        """
+        Generator version of get_all_subtypes():  yields objects of the
+        specified class or any subclass, fetching rows from the db in batches
+        of `batch_size` so that passes over the whole db (e.g. dump_db) use
+        constant memory.
+
+        Args:
+            cname (str):  the class name to be referenced
+
+        Keyword Args:
+            batch_size (int):  number of rows fetched per batch
+
+        Yields:
+            objects of the specified class or a subclass
+        """
+        cls = self.classes[cname]
+        stmt = self._prepared(('all_subtypes', cname),
+                              lambda: sql.select(cls))
+        yield from self.db.scalars(stmt,
+                                   execution_options={'yield_per': batch_size})
+
     def get_oids(self, cname=None):
         """
         Get all oids from the local db -- used for checking whether a given
@@ -1543,11 +2208,14 @@ class UberORB(object):
         Keyword Args:
             cname (str):  class name of the objects to be used
         """
-        Identifiable = self.classes['Identifiable']
-        query = self.db.query(Identifiable.oid)
         if cname:
-            query = query.filter(Identifiable.pgef_type == cname)
-        return [row[0] for row in query.all()]
+            stmt = self._prepared('get_oids_by_type',
+                                  lambda: self._build_ident_col_stmt('oid',
+                                                                     True))
+            return self.db.scalars(stmt, {'cname': cname}).all()
+        stmt = self._prepared('get_oids',
+                              lambda: self._build_ident_col_stmt('oid'))
+        return self.db.scalars(stmt).all()
 
     def get_ids(self, cname=None):
         """
@@ -1559,11 +2227,25 @@ class UberORB(object):
         Keyword Args:
             cname (str):  class name of the objects to be used
         """
-        Identifiable = self.classes['Identifiable']
-        query = self.db.query(Identifiable.id)
         if cname:
-            query = query.filter(Identifiable.pgef_type == cname)
-        return [row[0] for row in query.all()]
+            stmt = self._prepared('get_ids_by_type',
+                                  lambda: self._build_ident_col_stmt('id',
+                                                                     True))
+            return self.db.scalars(stmt, {'cname': cname}).all()
+        stmt = self._prepared('get_ids',
+                              lambda: self._build_ident_col_stmt('id'))
+        return self.db.scalars(stmt).all()
+
+    def _build_ident_col_stmt(self, col_name, by_type=False):
+        """
+        Build a statement that selects a single column of the "Identifiable"
+        table, optionally restricted to a class (bound parameter 'cname').
+        """
+        Identifiable = self.classes['Identifiable']
+        stmt = sql.select(getattr(Identifiable, col_name))
+        if by_type:
+            stmt = stmt.where(Identifiable.pgef_type == sql.bindparam('cname'))
+        return stmt
 
     def get_digital_file_checksums(self):
         """
@@ -1744,18 +2426,12 @@ class UberORB(object):
         if not isinstance(obj, (self.classes['HardwareProduct'],
                                 self.classes['Template'])):
             return ''
-        all_ids = self.get_ids(cname='HardwareProduct')
-        all_ids += self.get_ids(cname='Template')
-        # self.log.debug('  all_ids:')
-        # self.log.debug('  {}'.format(str(all_ids)))
-        id_suffixes = [(i or '').split('-')[-1] for i in all_ids]
-        # self.log.debug('  id_suffixes:')
-        # self.log.debug('  {}'.format(str(id_suffixes)))
+        # the id suffixes of all saved products are cached (see p.core.names)
+        id_suffixes = get_product_id_suffixes(self._get_product_oids_ids)
         current_id_parts = (obj.id or '').split('-')
         # self.log.debug('  current_id_parts: {}'.format(
                                                 # str(current_id_parts)))
-        if current_id_parts[-1] in id_suffixes:
-            id_suffixes.remove(current_id_parts[-1])
+        unique = product_id_suffix_is_unique(obj.id, id_suffixes)
         # NOTE: as of 3.2.dev9, the product id will only include the "owner_id"
         # if the owner is a Project, and therefore the spec would be
         # inappropriate for direct reuse and should be immediately identifiable
@@ -1772,28 +2448,14 @@ class UberORB(object):
             # self.log.debug(f'  owner id: {owner_id}')
             if (len(current_id_parts) >= 3 and
                 ((obj.id or '').startswith(owner_id + '-' + pt_abbr + '-')) and
-                # suffix is unique (has been removed from id_suffixes once)
-                current_id_parts[-1] not in id_suffixes):
+                unique):
                 return obj.id
         else:
             if (len(current_id_parts) >= 2 and
                 ((obj.id or '').startswith(pt_abbr + '-')) and
-                # suffix is unique (has been removed from id_suffixes once)
-                current_id_parts[-1] not in id_suffixes):
+                unique):
                 return obj.id
-        hw_id_ints = [0]
-        for i in id_suffixes:
-            try:
-                hw_id_ints.append(int(i))
-            except:
-                continue
-        next_sufx = str(max(hw_id_ints)).zfill(7)
-        while 1:
-            if next_sufx not in id_suffixes:
-                break
-            else:
-                next_int = max(hw_id_ints) + 1
-                next_sufx = str(next_int).zfill(7)
+        next_sufx = get_next_product_id_suffix(obj.id, id_suffixes)
         abbrev = getattr(obj.product_type, 'abbreviation', 'TBD') or 'TBD'
         if not isinstance(obj.product_type, self.classes['ProductType']):
             # no product_type assigned yet
@@ -1805,6 +2467,15 @@ class UberORB(object):
         else:
             return '-'.join([abbrev, next_sufx])
 
+    def _get_product_oids_ids(self):
+        """
+        Get (oid, id) rows for all HardwareProducts and Templates.
+        """
+        Identifiable = self.classes['Identifiable']
+        stmt = sql.select(Identifiable.oid, Identifiable.id).where(
+                    Identifiable.pgef_type.in_(['HardwareProduct', 'Template']))
+        return self.db.execute(stmt).all()
+
     def fix_hwproduct_id(self, obj, all_proj_ids):
         """
         If 'id' attribute for a HardwareProduct or Template does not conform to
@@ -1852,7 +2523,7 @@ class UberORB(object):
         self.log.debug(f'  generated id: {new_id}')
         return new_id
 
-    def get_next_rqt_seq(self, owner, level):
+    def get_next_rqt_seq(self, owner, level, reserve=False):
         """
         Get the next sequence number for a given project and requirement level.
         This is intended for use in creating a new requirement "id" in the
@@ -1863,27 +2534,88 @@ class UberORB(object):
         Args:
             owner (Organization or Project):  the owner of the requirement
             level (int):  the level of the requirement
+
+        Keyword Args:
+            reserve (bool):  if True, reserve the sequence number (see
+                p.core.names.get_next_rqt_seq)
         """
         level = level or 0
-        reqs = self.search_exact(cname='Requirement', level=level, owner=owner)
-        seq = 0
-        rqt_ids = [getattr(req, 'id', None) or 'unknown'
-                   for req in reqs]
-        real_ids = [rid for rid in rqt_ids if rid != 'unknown']
-        prev_seqs = [rqt_id.split('.')[-1] for rqt_id in real_ids]
-        if prev_seqs:
-            n = 1
-            prev_seqs.reverse()
-            for seq in prev_seqs:
-                try:
-                    seq = int(seq)
-                except:
-                    continue
-                while 1:
-                    if n > seq:
-                        break
-                    n += 1
-        return n
+        # the sequence numbers in use are cached (see p.core.names)
+        return get_next_rqt_seq(owner, level,
+                                lambda: self.search_exact(cname='Requirement',
+                                                          level=level,
+                                                          owner=owner),
+                                reserve=reserve)
+
+    def id_exists(self, cname, id_value, version=None, oid=None):
+        """
+        Check whether an object of the specified class has the specified id
+        (and version, if one is specified), using the orb's id index (built on
+        the first call) rather than querying the db.
+
+        Args:
+            cname (str):  class name
+            id_value (str):  the id
+
+        Keyword Args:
+            version (str):  the version (None -> any version; '' -> blank)
+            oid (str):  oid of an object to be ignored (e.g. the object being
+                edited)
+
+        Returns:
+            bool
+        """
+        if self._id_index is None:
+            self._id_index = self._build_id_index()
+        return self._id_index.exists(cname, id_value, version=version,
+                                     oid=oid)
+
+    def _build_id_index(self):
+        """
+        Build the id index from the db (see id_exists()).
+        """
+        versions = {}
+        for cname in self.versionables:
+            cls = self.classes[cname]
+            versions.update(self.db.execute(
+                                sql.select(cls.oid, cls.version)).all())
+        ident = self.classes['Identifiable'].__table__
+        rows = self.db.execute(sql.select(ident.c.oid, ident.c.pgef_type,
+                                          ident.c.id))
+        return IdIndex((oid, cname, id_value,
+                        versions.get(oid) if cname in self.versionables
+                        else '')
+                       for oid, cname, id_value in rows)
+
+    def _update_indexes(self, session, flush_context):
+        """
+        Update the id index (if it has been built) and the caches used to
+        allocate ids (see p.core.names) with the objects that have been
+        added, modified, or deleted in a flush of the primary session.
+        """
+        for obj in session.deleted:
+            oid = getattr(obj, 'oid', None)
+            if self._id_index is not None:
+                self._id_index.remove(oid)
+            note_deleted(oid)
+        for obj in list(session.new) + list(session.dirty):
+            oid = getattr(obj, 'oid', None)
+            if oid and hasattr(obj, 'id'):
+                if self._id_index is not None:
+                    cname = obj.__class__.__name__
+                    version = ''
+                    if cname in self.versionables:
+                        version = obj.version
+                    self._id_index.add(oid, cname, obj.id, version)
+                note_saved(obj)
+
+    def _reset_indexes(self, session, previous_transaction):
+        """
+        Discard the id index and the caches used to allocate ids when the
+        primary session is rolled back (they are rebuilt when next used).
+        """
+        self._id_index = None
+        clear_seqz()
 
     def get_idvs(self, cname=None):
         """
@@ -1905,6 +2637,7 @@ class UberORB(object):
                 s = sql.select(ident).where(ident.c.pgef_type == cname)
             return [(row._mapping['id'], '') for row in self.db.execute(s)]
 
+    @read_api
     def get_mod_dts(self, cnames=None, oids=None, datetimes=False):
         """
         Get a dict that maps oids of objects to their 'mod_datetime' stamps as
@@ -1925,25 +2658,36 @@ class UberORB(object):
         Returns:
             dict:  mapping of oids to 'mod_datetime' strings.
         """
-        ident = self.classes['Identifiable'].__table__
         if not cnames and not oids:
-            s = sql.select(ident).where(ident.c.mod_datetime != None)
+            stmt = self._prepared('get_mod_dts',
+                                  lambda: self._build_mod_dts_stmt())
+            params = {}
         elif cnames:
-            s = sql.select(ident).where(sql.and_(
-                                        ident.c.mod_datetime != None,
-                                        ident.c.pgef_type.in_(cnames)
-                                        ))
+            stmt = self._prepared('get_mod_dts_by_types',
+                                  lambda: self._build_mod_dts_stmt('pgef_type'))
+            params = {'vals': list(cnames)}
         elif oids:
-            s = sql.select(ident).where(sql.and_(
-                                        ident.c.mod_datetime != None,
-                                        ident.c.oid.in_(oids)
-                                        ))
+            stmt = self._prepared('get_mod_dts_by_oids',
+                                  lambda: self._build_mod_dts_stmt('oid'))
+            params = {'vals': list(oids)}
         if datetimes:
-            return {row._mapping['oid'] : row._mapping['mod_datetime']
-                    for row in self.db.execute(s)}
+            return {oid : dt for oid, dt in self.db.execute(stmt, params)}
         else:
-            return {row._mapping['oid'] : str(row._mapping['mod_datetime'])
-                    for row in self.db.execute(s)}
+            return {oid : str(dt) for oid, dt in self.db.execute(stmt, params)}
+
+    def _build_mod_dts_stmt(self, in_col=None):
+        """
+        Build a statement that selects (oid, mod_datetime) for all objects with
+        a non-null 'mod_datetime', optionally restricted to rows whose `in_col`
+        value is in a list (expanding bound parameter 'vals').
+        """
+        ident = self.classes['Identifiable'].__table__
+        stmt = sql.select(ident.c.oid, ident.c.mod_datetime).where(
+                                            ident.c.mod_datetime != None)
+        if in_col:
+            stmt = stmt.where(ident.c[in_col].in_(
+                                sql.bindparam('vals', expanding=True)))
+        return stmt
 
     def get_oid_cnames(self, oids=None, cname=None):
         """
@@ -1982,7 +2726,21 @@ class UberORB(object):
         """
         # self.log.debug('* select(%s, **(%s))' % (cname, str(kw)))
         kw['pgef_type'] = cname
-        return self.db.query(self.classes[cname]).filter_by(**kw).first()
+        cls = self.classes[cname]
+        fields = self.schemas[cname]['fields']
+        # only criteria on non-null datatype values can be bound parameters;
+        # object (relationship) and null criteria change the SQL itself, so
+        # those use an ad hoc query
+        if all(v is not None and (k == 'pgef_type' or
+               (k in fields and fields[k]['field_type'] != 'object'))
+               for k, v in kw.items()):
+            names = tuple(sorted(kw))
+            stmt = self._prepared(('select', cname, names),
+                                  lambda: sql.select(cls).filter_by(
+                                    **{n: sql.bindparam(n) for n in names}
+                                    ).limit(1))
+            return self.db.scalars(stmt, kw).first()
+        return self.db.query(cls).filter_by(**kw).first()
 
     def search_exact(self, **kw):
         """
@@ -2208,6 +2966,10 @@ class UberORB(object):
         as assemblies and related components, ports, flows, RepresentationFiles
         related to Models and Documents, etc.
 
+        If a read session is configured (see init_read_db), the objects are
+        found using the read session, but the objects returned are those of
+        the primary session, so that they can be modified and saved.
+
         Args:
             project (Project):  the specified project
         """
@@ -2219,6 +2981,31 @@ class UberORB(object):
         if not isinstance(project, self.classes['Project']):
             self.log.debug('  - object provided is not a Project.')
             return []
+        if (self.read_db is None or
+            getattr(self._local, 'db', None) is not None):
+            # no read session, or already reading
+            return self._get_objects_for_project(project)
+        with self.reading():
+            # NOTE:  the traversal must start from the read session's own
+            # instance of the project -- lazy loads of relationships of the
+            # primary session's instance would use the primary session
+            read_project = self.get(project.oid)
+            if read_project is not None:
+                oids = [obj.oid for obj in
+                        self._get_objects_for_project(read_project)]
+        if read_project is None:
+            # the project has not been committed yet
+            return self._get_objects_for_project(project)
+        return self.get(oids=oids)
+
+    def _get_objects_for_project(self, project):
+        """
+        Get all the objects relevant to the specified project from the current
+        session (see get_objects_for_project).
+
+        Args:
+            project (Project):  the specified project
+        """
         # objs now includes Activities, Documents, and Models owned by the
         # project
         objs = set(self.search_exact(owner=project))
@@ -2236,8 +3023,8 @@ class UberORB(object):
                 # if cycles:
                     # self.log.info(f'  - {cycles}')
             for system in systems:
-                # NOTE:  get_assembly is recursive, gets *all* sub-assemblies
-                assemblies |= set(get_assembly(system))
+                # NOTE:  gets *all* sub-assemblies
+                assemblies |= set(self.get_assembly_from_compz(system))
             if assemblies:
                 self.log.debug('  - {} assemblies found'.format(
                                len(assemblies)))
@@ -2319,6 +3106,7 @@ class UberORB(object):
         self.log.debug('  - reqts count: {n}')
         return n
 
+    @read_api
     def get_project_parameters(self, project):
         """
         Get the critical parameters of the specified project's "observatory".
@@ -2389,14 +3177,28 @@ class UberORB(object):
                     system_mass = mass
         included_fuel_mass = 0
         external_fuel_mass = 0
-        system_assembly_items = get_assembly(system)
+        system_assembly_items = self.get_assembly_from_compz(system)
         project_assembly_items = []
         # look for the top-level project system containing the selected system
         for a_system in top_level_systems:
-            assembly_items = get_assembly(a_system)
+            assembly_items = self.get_assembly_from_compz(a_system)
             if system in assembly_items:
                 project_assembly_items = assembly_items
                 break
+        # the assembly items include each Acu only once, but an Acu in a
+        # shared sub-assembly occurs once for each use of the sub-assembly --
+        # count the occurrences of each assembly (quantities are applied
+        # only to the fuel Acus, below)
+        occurrences = {}
+        if project_assembly_items:
+            graph = {}
+            for item in project_assembly_items:
+                if (isinstance(item, self.classes['Acu'])
+                    and item.component is not None):
+                    graph.setdefault(item.assembly.oid, []).append(
+                                                (item.component.oid, item.oid))
+            occurrences = get_flat_bom(a_system.oid, graph=graph)
+            occurrences[a_system.oid] = 1
         fuel_pt = self.select('ProductType', name='Fuel')
         # all fuel being used internal to the system
         system_fuel_usages = [item for item in system_assembly_items
@@ -2413,9 +3215,11 @@ class UberORB(object):
         if project_fuel_usages:
             for fuel_usage in project_fuel_usages:
                 quantity = 1
+                n = 1
                 if hasattr(fuel_usage, 'component'):
                     fuel_item = fuel_usage.component
                     quantity = fuel_usage.quantity or 1
+                    n = occurrences.get(fuel_usage.assembly.oid, 1)
                 elif hasattr(fuel_usage, 'system'):
                     fuel_item = fuel_usage.system
                 fid = getattr(fuel_item, 'id', 'no id')
@@ -2423,12 +3227,12 @@ class UberORB(object):
                     self.log.debug(f'  adding mass of included fuel "{fid}"')
                     mass = get_pval(fuel_item.oid, 'm[CBE]')
                     total_usage_mass = round_to(quantity * mass)
-                    included_fuel_mass += total_usage_mass
+                    included_fuel_mass += n * total_usage_mass
                 else:
                     self.log.debug(f'  adding mass of external fuel "{fid}"')
                     mass = get_pval(fuel_item.oid, 'm[CBE]')
                     total_usage_mass = round_to(quantity * mass)
-                    external_fuel_mass += total_usage_mass
+                    external_fuel_mass += n * total_usage_mass
         else:
             self.log.debug('  no fuel was found.')
         data['fuel_mass'] = round_to(included_fuel_mass + external_fuel_mass)
@@ -2459,11 +3263,17 @@ class UberORB(object):
         assemblies_to_refresh = []
         systems_to_refresh = []
         local_user_obj = self.get(state.get('local_user_oid', 'me'))
+        # deleting any of these may delete role assignments
+        role_classes = (self.classes['RoleAssignment'],
+                        self.classes['Organization'], self.classes['Person'])
+        roles_changed = False
         for obj in objs:
             delete_not_allowed = False
             if not obj:
                 info.append('   None (ignored)')
                 continue
+            if isinstance(obj, role_classes):
+                roles_changed = True
             if isinstance(obj, self.classes['Project']):
                 # delete all related role assignments:
                 ras = self.search_exact(cname='RoleAssignment',
@@ -2491,8 +3301,7 @@ class UberORB(object):
                     txt = 'attempting to delete PSUs from project '
                     info.append('   - {} "{}" ...'.format(txt, obj.id))
                     self.delete(obj.systems)
-                if obj.oid in systemz:
-                    del systemz[obj.oid]
+                remove_systemz(obj.oid)
             elif isinstance(obj, self.classes['Person']):
                 # Note that it is assumed the permissions of the user have been
                 # checked and the user is a Global Administrator -- only they
@@ -2580,8 +3389,7 @@ class UberORB(object):
                 comp_acus = obj.components
                 if comp_acus:
                     self.delete(comp_acus)
-                if obj.oid in componentz:
-                    del componentz[obj.oid]
+                remove_componentz(obj.oid)
             elif isinstance(obj, self.classes['Port']):
                 # for Ports, first delete all related Flows, both outgoing and
                 # incoming (in which it is the start or end)
@@ -2686,6 +3494,8 @@ class UberORB(object):
         if systems_to_refresh:
             for project in systems_to_refresh:
                 refresh_systemz(project)
+        if roles_changed:
+            dispatcher.send('role assignments changed')
         if recompute_required and not state.get('connected'):
             recompute_parmz()
 
@@ -2701,49 +3511,37 @@ class UberORB(object):
     def get_bom_from_compz(self, product):
         """
         Return a list of all known components at every level of assembly in the
-        specified product.
+        specified product, computed from the 'componentz' cache (see
+        `validation.get_bom`).  Until any deferred startup work is done,
+        'componentz' may not be complete, so the product's Acus are traversed
+        instead.
 
         Args:
             product (Product) the subject product
         """
-        try:
-            # NOTE: this will explode if assembly contains cycles!
-            if product:
-                comps = [self.get(comp.oid)
-                         for comp in (componentz.get(product.oid) or [])]
-                if comps:
-                    comps = reduce(lambda x,y: x+y,
-                                   [self.get_bom_from_compz(c)
-                                    for c in comps],
-                                   comps)
-                return comps
-            return []
-        except:
-            # self.log.debug('bom exploded -- probably contained a cycle.')
-            return []
+        return get_bom(product, orb=self if self.ready.is_set() else None)
 
     def get_assembly_from_compz(self, product):
         """
         Return the product's assembly structure, including all Acu instances plus
         all (known) components used at every level of assembly of the specified
-        product.
-        """
-        if product:
-            comps = self.get_bom_from_compz(product)
-            base_acus = [self.get(c.usage_oid)
-                         for c in (componentz.get(product.oid) or [])]
-            acus = reduce(lambda x,y: x + y,
-                          [[self.get(comp.usage_oid) for comp in
-                            (componentz.get(c.oid) or [])]
-                           for c in comps],
-                          base_acus)
-            return comps + acus
-        return []
+        product, computed from the 'componentz' cache (see
+        `validation.get_assembly`).
+        """
+        return get_assembly(product, orb=self if self.ready.is_set() else None)
 
     def get_bom_oids(self, product):
-        return set([getattr(p, 'oid', '')
-                    for p in self.get_bom_from_compz(product)
-                    if getattr(p, 'oid', '')])
+        """
+        Return the set of oids of all known components at every level of
+        assembly in the specified product (no objects are loaded).  Until any
+        deferred startup work is done, 'componentz' may not be complete, so
+        the product's Acus are traversed instead.
+        """
+        if not product:
+            return set()
+        if not self.ready.is_set():
+            return set(comp.oid for comp in get_bom(product))
+        return set(get_assembly_oids(product.oid)[0])
 
     def is_a(self, obj, cname):
         """
@@ -8,9 +8,62 @@ PGEF units:  reference data for numeric values with units.
 # [e.g.]
 #   unit = getattr(u, 'A')    # the "Amperes" object)
 
-import pint
+# NOTE:  the pint unit registry (`ureg`) is expensive to create (pint parses
+# its unit definitions file), so it is created when first used -- by
+# get_ureg() or by accessing `units.ureg` (see `__getattr__` at the end of
+# this module).  pint caches its parsed definitions in UREG_CACHE_FOLDER
+# (':auto:' -> the user cache directory of the platform; None -> no cache), so
+# only the first process to create the registry pays for parsing them.
 
-ureg = pint.UnitRegistry()
+UREG_CACHE_FOLDER = ':auto:'
+
+_ureg = None
+
+def get_ureg():
+    """
+    Return the pint unit registry, creating it if it does not yet exist.
+    When the registry is created, all the unit expressions in `in_si` and
+    `alt_units` are parsed into the `parsed_units` table.
+    """
+    global _ureg
+    if _ureg is None:
+        import pint
+        try:
+            _ureg = pint.UnitRegistry(cache_folder=UREG_CACHE_FOLDER)
+        except Exception:
+            # cache could not be used -- parse the definitions
+            _ureg = pint.UnitRegistry()
+        exprs = set(in_si.values())
+        for unit_exprs in alt_units.values():
+            exprs.update(unit_exprs)
+        for expr in exprs:
+            try:
+                parsed_units[expr] = _ureg.parse_expression(expr)
+            except Exception:
+                # not a pint unit (e.g. '$') -- callers handle those
+                pass
+    return _ureg
+
+# parsed_units:  maps unit expressions (e.g. 'kg*m^2') to the pint quantities
+# returned by ureg.parse_expression(), so that each expression is only parsed
+# once -- see parse_units_expr().
+parsed_units = {}
+
+def parse_units_expr(expr):
+    """
+    Return the pint quantity for a unit expression, parsing the expression
+    only the first time it is seen.  (Equivalent to
+    `ureg.parse_expression(expr)`, and raises the same exceptions.)
+
+    Args:
+        expr (str):  a unit expression, e.g. 'm/s^2'
+    """
+    try:
+        return parsed_units[expr]
+    except KeyError:
+        quan = get_ureg().parse_expression(expr)
+        parsed_units[expr] = quan
+        return quan
 
 # in_si maps "dimensions" to their associated base SI units
 in_si = dict([
@@ -153,3 +206,12 @@ prefixes = dict(
     Yi='yobi (2**80)'
     )
 
+
+def __getattr__(name):
+    """
+    Provide the module attribute `ureg` (the pint unit registry), which is
+    created when first accessed.
+    """
+    if name == 'ureg':
+        return get_ureg()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
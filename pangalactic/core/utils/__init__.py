@@ -5,5 +5,6 @@ Various tools that may be used by multiple packages
 __all__ = [
 # "checksum",
 "datetimes",
+"profiling",
 "reports"
 ]
@@ -0,0 +1,110 @@
+"""
+Startup profiling:  per-phase wall time, CPU time, peak RSS, and object counts.
+"""
+import gc, json, sys, time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+def peak_rss_kb():
+    """
+    Get the peak resident set size of the current process in KiB.
+
+    Returns:
+        int:  peak RSS in KiB, or 0 if it cannot be determined
+    """
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # macOS reports ru_maxrss in bytes, linux in KiB
+        rss //= 1024
+    return rss
+
+
+class StartupProfiler(object):
+    """
+    Records a sequence of named phases, each measured from the end of the
+    previous phase (or from the creation of the profiler) to the call to
+    `lap()` that names it.
+
+    Keyword Args:
+        version (str):  version of the package being profiled
+        count_objects (bool):  if True, record the change in the number of
+            gc-tracked objects for each phase (this walks the gc object list
+            so it adds some overhead to each lap)
+    """
+    def __init__(self, version='', count_objects=False):
+        self.version = version
+        self.count_objects = count_objects
+        self.started = time.time()
+        self.phases = []
+        self._t0 = self._wall = time.perf_counter()
+        self._c0 = self._cpu = time.process_time()
+        self._rss0 = self._rss = peak_rss_kb()
+        self._nobj0 = self._nobj = self._object_count()
+
+    def _object_count(self):
+        if self.count_objects:
+            return len(gc.get_objects())
+        return 0
+
+    def lap(self, name):
+        """
+        End the current phase and record it under the specified name.
+
+        Args:
+            name (str):  name of the phase that just ended
+        """
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        rss = peak_rss_kb()
+        nobj = self._object_count()
+        self.phases.append(dict(name=name,
+                                wall=wall - self._wall,
+                                cpu=cpu - self._cpu,
+                                peak_rss_kb=rss,
+                                peak_rss_delta_kb=rss - self._rss,
+                                objects_delta=nobj - self._nobj))
+        self._wall, self._cpu, self._rss, self._nobj = wall, cpu, rss, nobj
+
+    def finish(self):
+        """
+        Return the profile as a dict (suitable for json serialization).
+        """
+        return dict(version=self.version,
+                    started=self.started,
+                    count_objects=self.count_objects,
+                    phases=list(self.phases),
+                    total=dict(wall=self._wall - self._t0,
+                               cpu=self._cpu - self._c0,
+                               peak_rss_kb=self._rss,
+                               peak_rss_delta_kb=self._rss - self._rss0,
+                               objects_delta=self._nobj - self._nobj0))
+
+    def dump(self, path):
+        """
+        Write the profile to a json file.
+
+        Args:
+            path (str):  path of the file to be written
+        """
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.finish(), indent=2))
+
+    def report(self):
+        """
+        Return a plain-text table of the phases.
+        """
+        lines = ['{:<28} {:>9} {:>9} {:>11} {:>10}'.format(
+                 'phase', 'wall (s)', 'cpu (s)', 'rss+ (KiB)', 'objects+')]
+        profile = self.finish()
+        for p in profile['phases'] + [dict(profile['total'], name='TOTAL')]:
+            lines.append('{:<28} {:>9.3f} {:>9.3f} {:>11} {:>10}'.format(
+                         p['name'], p['wall'], p['cpu'],
+                         p['peak_rss_delta_kb'], p['objects_delta']))
+        return '\n'.join(lines)
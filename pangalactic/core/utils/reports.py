@@ -11,7 +11,8 @@ from pangalactic.core.names        import (get_mel_item_name, pname_to_header,
 from pangalactic.core.parametrics  import (componentz, systemz,
                                            get_modal_context,
                                            get_modal_power,
-                                           get_pval, get_dval, de_defz,
+                                           get_pval, get_pvals, get_dval,
+                                           de_defz,
                                            parm_defz, round_to)
 from pangalactic.core.units        import in_si
 from pangalactic.core.utils.styles import xlsx_styles
@@ -494,9 +495,10 @@ def write_component_rows_xlsx(sheet, level_fmts, name_fmts, data_fmts,
             dtype = (de_defz.get(col_id) or {}).get('range_datatype')
             sheet.write(row, i, val, dt_map.get(dtype, txt_fmt))
     real_comps = []
-    component_acus = [orb.get(comp.usage_oid)
-                      for comp in componentz.get(component.oid, [])
-                      if orb.get(comp.usage_oid) is not None]
+    # NOTE:  the order of the acus doesn't matter -- rows are sorted by name
+    component_acus = orb.get(oids=[comp.usage_oid
+                                   for comp in componentz.get(component.oid,
+                                                              [])])
     if component_acus:
         real_comps = [acu for acu in component_acus
                       if hasattr(acu.component, 'oid') and
@@ -538,6 +540,183 @@ def write_component_rows_xlsx(sheet, level_fmts, name_fmts, data_fmts,
     return row
 
 
+def get_mel_lines(item, level=1, summary=False, qty=1):
+    """
+    Flatten the assembly tree of a MEL item into a list of MEL line items, in
+    the order in which they appear in the MEL.  The tree is walked using the
+    `componentz` cache, and all the usages (Acus) in it are fetched from the
+    db at once.
+
+    Args:
+        item (Acu, ProjectSystemUsage, or Product): item is an Acu or a
+            ProjectSystemUsage unless it is the "root" of the MEL, in which
+            case it is a Product
+
+    Keyword Args:
+        level (int): assembly level of item
+        summary (bool):  if True, combine all instances of a product in a given
+            asssembly into one line item with a computed quantity; otherwise,
+            show a line item for each usage, tagged with its reference
+            designator
+        qty (int):  quantity of the item (used for summary)
+
+    Returns:
+        list of (name, component, level, qty) tuples
+    """
+    if not item:
+        return []
+    if hasattr(item, 'component'):
+        top = item.component
+    elif hasattr(item, 'system'):
+        top = item.system
+    else:
+        top = item
+    # collect the oids of all usages and components in the tree (fetching the
+    # components too means that acu.component is not loaded one at a time)
+    oids = set()
+    todo = [getattr(top, 'oid', None)]
+    seen = set()
+    while todo:
+        oid = todo.pop()
+        if oid in seen:
+            continue
+        seen.add(oid)
+        for comp in componentz.get(oid, []):
+            oids.add(comp.usage_oid)
+            if comp.oid:
+                oids.add(comp.oid)
+            todo.append(comp.oid)
+    oids.discard(None)
+    objs = {obj.oid : obj for obj in orb.get(oids=list(oids))}
+    # NB:  levels are 1-based
+    lines = []
+    top_level = level
+    # oids of the components on the path from the top to the current item (a
+    # component that is already on the path closes a cycle and its assembly
+    # is not expanded again)
+    path = []
+    on_path = set()
+    stack = [(item, level, qty, None)]
+    while stack:
+        item, level, qty, item_name = stack.pop()
+        # leaving the items below this level
+        depth = level - top_level
+        for oid in path[depth:]:
+            on_path.discard(oid)
+        del path[depth:]
+        if hasattr(item, 'component'):
+            # Acu
+            component = item.component
+            qty = item.quantity or 1
+        elif hasattr(item, 'system'):
+            # ProjectSystemUsage
+            component = item.system
+            qty = 1
+        else:
+            # Product
+            if not summary:
+                # if not summary, the item being a Product instance implies
+                # that it's the "root" item, so level and qty are 1
+                level = 1
+                qty = 1
+            component = item
+            item_name = (getattr(item, 'name', '') or 'Unknown').replace(
+                                                            '\n', ' ').strip()
+        if component is None:
+            continue
+        item_name = item_name or get_mel_item_name(item)
+        lines.append(((level - 1) * '  ' + item_name, component, level, qty))
+        if component.oid in on_path:
+            orb.log.info(f'  - cycle: "{component.id}" is used in its own '
+                         'assembly -- not expanded again.')
+            continue
+        path.append(component.oid)
+        on_path.add(component.oid)
+        comps = componentz.get(component.oid)
+        if not comps:
+            continue
+        next_level = level + 1
+        children = []
+        if summary:
+            products_by_oid = {}
+            qty_by_oid = {}
+            for comp in comps:
+                if (comp.oid != 'pgefobjects:TBD'
+                    and objs.get(comp.oid) is not None):
+                    products_by_oid[comp.oid] = objs[comp.oid]
+                acu = objs.get(comp.usage_oid)
+                if acu is not None and acu.component is not None:
+                    oid = acu.component.oid
+                    qty_by_oid[oid] = (qty_by_oid.get(oid, 0)
+                                       + (acu.quantity or 1))
+            for oid, product in products_by_oid.items():
+                children.append((product, next_level, qty_by_oid.get(oid, 1),
+                                 None))
+        else:
+            acus = [objs.get(comp.usage_oid) for comp in comps]
+            named_acus = sorted(((get_mel_item_name(acu), acu)
+                                 for acu in acus if acu is not None),
+                                key=lambda x: x[0])
+            for item_name, acu in named_acus:
+                children.append((acu, next_level, 1, item_name))
+        stack.extend(reversed(children))
+    return lines
+
+
+def get_mel_rows(item, schema, level=1, summary=False, qty=1,
+                 pref_units=True, missing='-'):
+    """
+    Return the rows of a MEL for an item and its assembly tree, as lists of
+    strings:  [name, id, level, qty] + the values of the schema columns.  The
+    values are fetched one column at a time for all components.
+
+    Args:
+        item (Acu, ProjectSystemUsage, or Product): see get_mel_lines()
+        schema (list of str):  ids of the parameters and data elements to be
+            included
+
+    Keyword Args:
+        level (int): assembly level of item
+        summary (bool):  see get_mel_lines()
+        qty (int):  quantity of the item (used for summary)
+        pref_units (bool):  express values in the user's preferred units; if
+            False, use base (mks) units
+        missing (str):  value for a column that is neither a parameter nor a
+            data element
+    """
+    lines = get_mel_lines(item, level=level, summary=summary, qty=qty)
+    oids = list(dict.fromkeys(line[1].oid for line in lines))
+    cols = []
+    for col_id in schema:
+        # Excel doesn't like space between the number and "%" --
+        # hence, fix_ctgcy() ...
+        if col_id in parm_defz:
+            # it's a parameter ...
+            if 'Ctgcy' in col_id:
+                cols.append([fix_ctgcy(str(100 * pval))
+                             for pval in get_pvals(oids, col_id)])
+            else:
+                units = ''
+                if pref_units:
+                    # get all values in user's preferred units
+                    dims = parm_defz[col_id]['dimensions']
+                    units = (prefs['units'].get(dims, '')
+                             or in_si.get(dims, ''))
+                cols.append([str(round_to(pval))
+                             for pval in get_pvals(oids, col_id,
+                                                   units=units)])
+        elif col_id in de_defz:
+            # it's a data_element ...
+            cols.append([str(get_dval(oid, col_id)) for oid in oids])
+        else:
+            # neither a parameter nor data element
+            cols.append([missing] * len(oids))
+    vals_by_oid = dict(zip(oids, zip(*cols))) if cols else {}
+    return [[name, component.id, str(level), str(qty)]
+            + list(vals_by_oid.get(component.oid, ()))
+            for name, component, level, qty in lines]
+
+
 def get_mel_data(root, schema=None, summary=False):
     """
     Generate a customized Master Equipment List (MEL) as a list of dicts.
@@ -585,8 +764,8 @@ def get_mel_data(root, schema=None, summary=False):
 
 def get_item_data(item, cols, schema, level, summary=False, qty=1):
     """
-    Recursively return a lists of dicts containing the parameter and data
-    element data for MEL items of an assembly.
+    Return a list of dicts containing the parameter and data element data
+    for the MEL items of an assembly (see get_mel_rows()).
 
     Args:
         item (Acu, ProjectSystemUsage, or HardwareProduct): item is an Acu
@@ -604,97 +783,9 @@ def get_item_data(item, cols, schema, level, summary=False, qty=1):
             designator
         qty (int):  quantity of the item (used for summary)
     """
-    # orb.log.debug('* get_item_data()')
-    # item_id = getattr(item, 'id', 'unknown') or 'no id'
-    # item_oid = getattr(item, 'oid', 'unknown') or 'no oid'
-    # orb.log.debug(f'  - item: {item_id} ({item_oid})')
-    # NB:  levels are 1-based
-    if not item:
-        return []
-    if isinstance(item, orb.classes['HardwareProduct']):
-        # orb.log.debug('  - item is a HardwareProduct')
-        if not summary:
-            # if not summary, the item being a Product instance implies that
-            # it's the "root" item, so level and qty are 1
-            level = 1
-            qty = 1
-        component = item
-        comp_name = (getattr(item, 'name', '') or 'Unknown').replace(
-                                                        '\n', ' ').strip()
-        comp_name = (level - 1) * '  ' + comp_name
-    else:
-        # Acu or ProjectSystemUsage
-        if hasattr(item, 'component'):
-            # Acu
-            # orb.log.debug('  - item is an Acu')
-            component = item.component
-            qty = item.quantity or 1
-        else:
-            # ProjectSystemUsage
-            # orb.log.debug('  - item is a PSU')
-            component = item.system
-            qty = 1
-        comp_name = (level - 1) * '  ' + get_mel_item_name(item)
-    # orb.log.debug(f'  - "component" is {component}')
-    data = []
-    vals = []
-    for col_id in schema:
-        # TODO: predetermine whether each schema element is a pid or deid
-        # Excel doesn't like space between the number and "%" --
-        # hence, fix_ctgcy() ...
-        if col_id in parm_defz:
-            # it's a parameter ...
-            if 'Ctgcy' in col_id:
-                pval = fix_ctgcy(str(100 * get_pval(component.oid, col_id)))
-            else:
-                # get all values in user's preferred units
-                pd = parm_defz.get(col_id)
-                units = prefs['units'].get(pd['dimensions'], '') or in_si.get(
-                                                        pd['dimensions'], '')
-                pval = str(round_to(get_pval(
-                                        component.oid, col_id, units=units)))
-            vals.append(pval)
-        elif col_id in de_defz:
-            # it's a data_element ...
-            dval = str(get_dval(component.oid, col_id))
-            vals.append(dval)
-        else:
-            # neither a parameter nor data element
-            vals.append('-')
-    comp_id = component.id
-    data.append(dict(zip(cols, [comp_name, comp_id, str(level), str(qty)]
-                                + vals)))
-    # orb.log.debug(f'getting "{comp_name}" at level {str(level)}')
-    if component.oid in componentz:
-        next_level = level + 1
-        if summary:
-            products_by_oid = {comp.oid : orb.get(comp.oid)
-                               for comp in componentz[component.oid]
-                               if comp.oid != 'pgefobjects:TBD'}
-            qty_by_oid = {}
-            acus = [orb.get(c.usage_oid) for c in componentz[component.oid]
-                    if orb.get(c.usage_oid) is not None]
-            for acu in acus:
-                oid = acu.component.oid
-                if qty_by_oid.get(oid):
-                    qty_by_oid[oid] += acu.quantity or 1
-                else:
-                    qty_by_oid[oid] = acu.quantity or 1
-            for oid in products_by_oid:
-                data += get_item_data(products_by_oid[oid], cols,
-                                      schema, next_level, qty=qty_by_oid[oid],
-                                      summary=True)
-        else:
-            acus = [orb.get(c.usage_oid) for c in componentz[component.oid]]
-            item_names = [get_mel_item_name(acu)
-                          for acu in acus]
-            item_names.sort()
-            acus_by_item_name = {get_mel_item_name(acu) : acu
-                                 for acu in acus}
-            for item_name in item_names:
-                data += get_item_data(acus_by_item_name[item_name], cols,
-                                      schema, next_level)
-    return data
+    return [dict(zip(cols, row))
+            for row in get_mel_rows(item, schema, level=level,
+                                    summary=summary, qty=qty)]
 
 
 def get_contextual_mel_data(context, root, schema=None, summary=False):
@@ -752,8 +843,8 @@ def get_contextual_mel_data(context, root, schema=None, summary=False):
 
 def get_contextual_item_data(item, cols, schema, level, summary=False, qty=1):
     """
-    Recursively return a lists of dicts containing the parameter and data
-    element data for MEL items of an assembly.
+    Return a list of dicts containing the parameter and data element data
+    for the MEL items of an assembly (see get_mel_rows()).
 
     Args:
         item (Acu, ProjectSystemUsage, or HardwareProduct): item is an Acu
@@ -771,85 +862,9 @@ def get_contextual_item_data(item, cols, schema, level, summary=False, qty=1):
             designator
         qty (int):  quantity of the item (used for summary)
     """
-    # NB:  levels are 1-based
-    if isinstance(item, orb.classes['Product']):
-        if not summary:
-            # if not summary, the item being a Product instance implies that
-            # it's the "root" item, so level and qty are 1
-            level = 1
-            qty = 1
-        component = item
-        comp_name = (getattr(item, 'name', '') or 'Unknown').replace(
-                                                        '\n', ' ').strip()
-        comp_name = (level - 1) * '  ' + comp_name
-    else:
-        # Acu or ProjectSystemUsage
-        if hasattr(item, 'component'):
-            # Acu
-            component = item.component
-            qty = item.quantity or 1
-        else:
-            # ProjectSystemUsage
-            component = item.system
-            qty = 1
-        comp_name = (level - 1) * '  ' + get_mel_item_name(item)
-    data = []
-    vals = []
-    for col_id in schema:
-        # TODO: predetermine whether each schema element is a pid or deid
-        # Excel doesn't like space between the number and "%" --
-        # hence, fix_ctgcy() ...
-        if col_id in parm_defz:
-            # it's a parameter ...
-            if 'Ctgcy' in col_id:
-                pval = fix_ctgcy(str(100 * get_pval(component.oid, col_id)))
-            else:
-                # get all values in user's preferred units
-                pd = parm_defz.get(col_id)
-                units = prefs['units'].get(pd['dimensions'], '') or in_si.get(
-                                                        pd['dimensions'], '')
-                pval = str(round_to(get_pval(
-                                        component.oid, col_id, units=units)))
-            vals.append(pval)
-        elif col_id in de_defz:
-            # it's a data_element ...
-            dval = str(get_dval(component.oid, col_id))
-            vals.append(dval)
-        else:
-            # neither a parameter nor data element
-            vals.append('-')
-    comp_id = component.id
-    data.append(dict(zip(cols, [comp_name, comp_id, str(level), str(qty)]
-                                + vals)))
-    # orb.log.debug(f'getting "{comp_name}" at level {str(level)}')
-    if component.components:
-        next_level = level + 1
-        if summary:
-            products_by_oid = {acu.component.oid : acu.component
-                               for acu in component.components
-                               if acu.component.oid != 'pgefobjects:TBD'}
-            qty_by_oid = {}
-            for acu in component.components:
-                oid = acu.component.oid
-                if qty_by_oid.get(oid):
-                    qty_by_oid[oid] += acu.quantity or 1
-                else:
-                    qty_by_oid[oid] = acu.quantity or 1
-            for oid in products_by_oid:
-                data += get_contextual_item_data(products_by_oid[oid], cols,
-                                                 schema, next_level,
-                                                 qty=qty_by_oid[oid],
-                                                 summary=True)
-        else:
-            item_names = [get_mel_item_name(acu)
-                          for acu in component.components]
-            item_names.sort()
-            acus_by_item_name = {get_mel_item_name(acu) : acu
-                                 for acu in component.components}
-            for item_name in item_names:
-                data += get_contextual_item_data(acus_by_item_name[item_name],
-                                                 cols, schema, next_level)
-    return data
+    return [dict(zip(cols, row))
+            for row in get_mel_rows(item, schema, level=level,
+                                    summary=summary, qty=qty)]
 
 
 def write_mel_to_xlsx(context, schema=None, pref_units=False, summary=False,
@@ -1063,7 +1078,7 @@ def get_item_data_tsv(item, schema, level, pref_units=False, summary=False,
                       qty=1):
     """
     Return a tsv string for an assembly of components with parameters / data
-    elements.
+    elements (see get_mel_rows()).
 
     Args:
         component (HardwareProduct): component object
@@ -1078,88 +1093,11 @@ def get_item_data_tsv(item, schema, level, pref_units=False, summary=False,
             designator
         qty (int):  quantity of the item (used for summary)
     """
-    # NB:  levels are 1-based
-    if isinstance(item, orb.classes['HardwareProduct']):
-        # this implies "root" item, so level and qty are 1
-        component = item
-        comp_name = (getattr(item, 'name', '') or 'Unknown').replace(
-                                                            '\n', ' ').strip()
-        comp_name = (level - 1) * '  ' + comp_name
-        if not summary:
-            # if not summary, the item being a Product instance implies that
-            # it's the "root" item, so level and qty are 1
-            level = 1
-            qty = 1
-    else:
-        # Acu or ProjectSystemUsage
-        if hasattr(item, 'component'):
-            # Acu
-            component = item.component
-            qty = item.quantity or 1
-        else:
-            # ProjectSystemUsage
-            component = item.system
-            qty = 1
-        comp_name = (level - 1) * '  ' + get_mel_item_name(item)
-    data = ''
-    vals = []
-    for col_id in schema:
-        # TODO: predetermine whether each schema item is a pid or deid
-        # Excel doesn't like space between the number and "%" --
-        # hence, fix_ctgcy() ...
-        if col_id in parm_defz:
-            # it's a parameter ...
-            if 'Ctgcy' in col_id:
-                pval = fix_ctgcy(str(100 * get_pval(component.oid, col_id)))
-            else:
-                if pref_units:
-                    # get all values in user's preferred units
-                    pd = parm_defz.get(col_id)
-                    units = prefs['units'].get(pd['dimensions'], '')
-                    units = units or in_si.get(pd['dimensions'], '')
-                    pval = str(round_to(get_pval(
-                                            component.oid, col_id, units=units)))
-                else:
-                    # get all values in SI units
-                    pval = str(round_to(get_pval(component.oid, col_id)))
-            vals.append(pval)
-        elif col_id in de_defz:
-            # it's a data_element ...
-            dval = str(get_dval(component.oid, col_id))
-            vals.append(dval)
-        else:
-            # neither a parameter nor data element
-            vals.append('unknown')
-    comp_id = component.id
-    data += '\t'.join([comp_name, comp_id, str(level), str(qty)] + vals) + '\n'
-    if component.components:
-        next_level = level + 1
-        if summary:
-            products_by_oid = {acu.component.oid : acu.component
-                               for acu in component.components
-                               if acu.component.oid != 'pgefobjects:TBD'}
-            qty_by_oid = {}
-            for acu in component.components:
-                oid = acu.component.oid
-                if qty_by_oid.get(oid):
-                    qty_by_oid[oid] += acu.quantity or 1
-                else:
-                    qty_by_oid[oid] = acu.quantity or 1
-            for oid in products_by_oid:
-                data += get_item_data_tsv(products_by_oid[oid],
-                                          schema, next_level,
-                                          qty=qty_by_oid[oid],
-                                          summary=True)
-        else:
-            item_names = [get_mel_item_name(acu)
-                          for acu in component.components]
-            item_names.sort()
-            acus_by_item_name = {get_mel_item_name(acu) : acu
-                                 for acu in component.components}
-            for item_name in item_names:
-                data += get_item_data_tsv(acus_by_item_name[item_name], schema,
-                                          next_level)
-    return data
+    return ''.join('\t'.join(row) + '\n'
+                   for row in get_mel_rows(item, schema, level=level,
+                                           summary=summary, qty=qty,
+                                           pref_units=pref_units,
+                                           missing='unknown'))
 
 
 def write_power_modes_to_xlsx(act, usage, pref_units=False,
@@ -3,10 +3,11 @@ Utility functions to support validation checks.
 """
 import re
 from collections import OrderedDict
-from functools import reduce
 from string import ascii_letters, digits
 
-from pangalactic.core.meta import PGXN_REQD
+import pangalactic.core
+from pangalactic.core.meta        import PGXN_REQD
+from pangalactic.core.parametrics import componentz, get_assembly_metrics
 
 # dispatcher (Louie)
 from pydispatch import dispatcher
@@ -28,269 +29,414 @@ PID_FMT = """letters and numbers separated by a single underscore "_"
  ... Examples: "X_y", "Angle_32", "XXX_Range"."""
 
 
+def find_cycles(graph, roots=None):
+    """
+    Find the cycles in a product structure graph at any depth of assembly.
+    This is an iterative form of Tarjan's strongly connected components
+    algorithm, so it runs in O(V+E) time and is not limited by the recursion
+    limit.
+
+    Args:
+        graph (dict):  maps the oid of an assembly to a list of tuples that
+            begin with (component oid, acu oid) -- the `componentz` cache
+            (whose `Comp` namedtuples begin with (oid, usage_oid)) can be
+            used as is
+
+    Keyword Args:
+        roots (iterable of str):  oids of the products from which to search
+            (if None, search from every assembly in the graph)
+
+    Returns:
+        list:  one cycle for each Acu that makes a product a component of
+            itself and one cycle for each other group of mutually recursive
+            products, where a cycle is a list of (assembly oid, component oid,
+            acu oid) tuples that leads from a product back to itself
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    cycles = []
+    sccs = []
+    for root in (graph if roots is None else roots):
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root) or []))]
+        while work:
+            node, edges = work[-1]
+            for edge in edges:
+                comp_oid = edge[0]
+                if comp_oid is None:
+                    continue
+                if comp_oid not in index:
+                    index[comp_oid] = low[comp_oid] = len(index)
+                    comp_edges = graph.get(comp_oid)
+                    if comp_edges:
+                        stack.append(comp_oid)
+                        on_stack.add(comp_oid)
+                        work.append((comp_oid, iter(comp_edges)))
+                        break
+                    # a part with no components can't be in a cycle
+                elif comp_oid == node:
+                    cycles.append([(node, node, edge[1])])
+                elif comp_oid in on_stack:
+                    low[node] = min(low[node], index[comp_oid])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    if stack[-1] == node:
+                        stack.pop()
+                        on_stack.discard(node)
+                        continue
+                    scc = set()
+                    while True:
+                        oid = stack.pop()
+                        on_stack.discard(oid)
+                        scc.add(oid)
+                        if oid == node:
+                            break
+                    sccs.append(scc)
+    for scc in sccs:
+        # shortest cycle through the first product found in the group
+        cycles.append(_shortest_cycle(graph, scc, min(scc, key=index.get)))
+    return cycles
+
+
+def _shortest_cycle(graph, scc, start):
+    """
+    Find the shortest cycle through the `start` product within a group of
+    mutually recursive products (breadth-first search).
+    """
+    via = {start: None}
+    queue = [start]
+    for oid in queue:
+        for edge in graph.get(oid) or []:
+            comp_oid = edge[0]
+            if comp_oid == start:
+                cycle = [(oid, comp_oid, edge[1])]
+                while via[oid]:
+                    cycle.insert(0, via[oid])
+                    oid = via[oid][0]
+                return cycle
+            if comp_oid in scc and comp_oid not in via:
+                via[comp_oid] = (oid, comp_oid, edge[1])
+                queue.append(comp_oid)
+    return []
+
+
+def format_cycles(cycles, get_id=None):
+    """
+    Format a list of cycles (as returned by `find_cycles`) as a message.
+
+    Args:
+        cycles (list):  the cycles
+
+    Keyword Args:
+        get_id (callable):  function that returns the `id` of the object with
+            a specified oid (or None)
+    """
+    get_id = get_id or (lambda oid: None)
+    msgs = []
+    for cycle in cycles:
+        product_oid = cycle[0][0]
+        msgs.append(' *** product {} (id: "{}") is a level {} '.format(
+                    product_oid, get_id(product_oid) or 'no id', len(cycle))
+                    + 'component of itself -- offending Acus are:')
+        for assembly_oid, comp_oid, acu_oid in cycle:
+            msgs.append('     {} (id: "{}"):  {} --> {}'.format(
+                        acu_oid, get_id(acu_oid) or 'no id',
+                        get_id(assembly_oid) or assembly_oid,
+                        get_id(comp_oid) or comp_oid))
+    return '<br>'.join(msgs)
+
+
 def check_for_cycles(product):
     """
     Check for cyclical data structures among all [known] components used at
-    up to 5 levels of assembly of the specified product.
+    every level of assembly of the specified product.
 
     Args:
         product (Product): the Product in which to look for cycles
+
+    Returns:
+        str:  a message describing the cycles found, or None
     """
-    # log.debug('* checking product with id "{}" ({})'.format(str(product.id),
-                                                        # product.oid))
-    if product and product.components:
-        comps = [acu.component for acu in product.components]
-        # acus_by_comp_oid = {acu.component.oid : acu
-                            # for acu in product.components}
-        if product.oid in [getattr(c, 'oid', None) for c in comps]:
-            txt = 'is a component of itself.'
-            msg = 'product oid "{}" (id: "{}" {}'.format(
-                      product.oid, product.id or 'no id', txt)
-            log.debug(msg)
-            return msg
-        # else:
-            # log.debug('  - level 1 components ok.')
-        comps1 = []
-        acus1_by_comp_oid = {}
-        for comp in comps:
-            if comp:
-                comps1 += [acu.component for acu in comp.components
-                           if acu.component]
-                acus1_by_comp_oid.update(
-                    {getattr(acu.component, 'oid', None) : acu
-                     for acu in comp.components})
-        if comps1:
-            comps += comps1
-        else:
-            # log.debug('  - no more levels.')
-            return
-        if product.oid in [c.oid for c in comps1]:
-            txt = 'is a 2nd-level component of itself.'
-            msgs = []
-            msg = ' *** product {} (id: "{}" {}'.format(
-                      product.oid, product.id or 'no id', txt)
-            msgs.append(msg)
-            log.debug(msg)
-            acu1 = acus1_by_comp_oid[product.oid]
-            msg1 = ' *** offending Acu is:'
-            msgs.append(msg1)
-            log.debug(msg1)
-            msg2 = '     id: {}'.format(str(acu1.id))
-            msgs.append(msg2)
-            log.debug(msg2)
-            msg3 = '     creator: {}'.format(acu1.creator.id)
-            msgs.append(msg3)
-            log.debug(msg3)
-            assy1 = acu1.assembly
-            msg4 = '     assembly: {}'.format(str(assy1.id))
-            msgs.append(msg4)
-            log.debug(msg4)
-            msg5 = '     assembly oid: {}'.format(str(assy1.oid))
-            msgs.append(msg5)
-            log.debug(msg5)
-            # acu = acus_by_comp_oid[assy1.oid]
-            return '<br>'.join(msgs)
-        # else:
-            # log.debug('  - level 2 components ok.')
-        comps2 = []
-        for comp in comps1:
-            comps2 += [acu.component for acu in comp.components
-                       if acu.component]
-        if comps2:
-            comps += comps2
-        else:
-            # log.debug('  - no more levels.')
-            return
-        if product.oid in [c.oid for c in comps2]:
-            txt = 'is a 3nd-level component of itself.'
-            msg = 'product {} (id: "{}" {}'.format(
-                      product.oid, product.id or 'no id', txt)
-            log.debug(msg)
-            return msg
-        # else:
-            # log.debug('  - level 3 components ok.')
-        comps3 = []
-        for comp in comps2:
-            comps3 += [acu.component for acu in comp.components
-                       if acu.component]
-        if comps3:
-            comps += comps3
-        else:
-            # log.debug('  - no more levels.')
-            return
-        if product.oid in [c.oid for c in comps3]:
-            txt = 'is a 4th-level component of itself.'
-            msg = 'product {} (id: "{}" {}'.format(
-                      product.oid, product.id or 'no id', txt)
-            log.debug(msg)
-            return msg
-        else:
-            # log.debug('no cycles')
-            return
-    # log.debug('no cycles')
+    if not product:
+        return
+    # build the graph of the product's assembly structure from its Acus
+    graph = {}
+    ids = {}
+    todo = [product]
+    while todo:
+        p = todo.pop()
+        if p.oid in graph:
+            continue
+        ids[p.oid] = p.id
+        graph[p.oid] = []
+        for acu in getattr(p, 'components', None) or []:
+            comp = acu.component
+            if comp is not None:
+                ids[acu.oid] = acu.id
+                graph[p.oid].append((comp.oid, acu.oid))
+                if comp.oid not in graph:
+                    todo.append(comp)
+    cycles = find_cycles(graph, roots=[product.oid])
+    if cycles:
+        msg = format_cycles(cycles, get_id=ids.get)
+        log.debug(msg)
+        return msg
 
 
-def check_serialized_for_cycles(sobjs):
+def get_serialized_acu_graph(sobjs, graph=None, exact=True):
     """
-    Check for cyclical data structures among all [known] components used at
-    up to 2 levels of assembly in the Acu assemblies in the collection of
-    serialized objects.
+    Build a product structure graph (as used by `find_cycles`) from the Acus
+    in a collection of serialized objects, merged with an existing graph --
+    a serialized Acu replaces the Acu with the same oid in the existing graph.
+    The existing graph is not modified.
 
     Args:
         sobjs (list of dict): a list of serialized objects
+
+    Keyword Args:
+        graph (dict):  the existing graph (e.g. the `componentz` cache)
+        exact (bool):  if False, skip the scan of the whole existing graph
+            for replaced Acus that have moved to a different assembly, so
+            such an Acu also keeps its old edge (the result may contain
+            cycles that the exact graph would not have, but never misses one)
+
+    Returns:
+        tuple:  (the merged graph, list of oids of the assemblies of the
+            serialized Acus)
+    """
+    graph = graph or {}
+    new_edges = {}
+    acu_oids = set()
+    for so in sobjs:
+        if so.get('_cname') == 'Acu' and so.get('assembly'):
+            acu_oids.add(so['oid'])
+            edges = new_edges.setdefault(so['assembly'], [])
+            if so.get('component'):
+                edges.append((so['component'], so['oid']))
+    merged = dict(graph)
+    if exact:
+        affected = [oid for oid, edges in graph.items()
+                    if not acu_oids.isdisjoint([edge[1] for edge in edges])]
+    else:
+        affected = [oid for oid in new_edges if oid in graph]
+    for assembly_oid in affected:
+        merged[assembly_oid] = [(edge[0], edge[1])
+                                for edge in graph[assembly_oid]
+                                if edge[1] not in acu_oids]
+    for assembly_oid, edges in new_edges.items():
+        merged[assembly_oid] = merged.get(assembly_oid, []) + edges
+    return merged, list(new_edges)
+
+
+def check_serialized_for_cycles(sobjs, graph=None):
+    """
+    Check for cyclical data structures at every level of assembly that would
+    result from deserializing the Acus in a collection of serialized objects.
+
+    Args:
+        sobjs (list of dict): a list of serialized objects
+
+    Keyword Args:
+        graph (dict):  the existing product structure graph (default: the
+            `componentz` cache)
+
+    Returns:
+        str:  a message describing the cycles found, or None
     """
     log.debug('* check_serialized_for_cycles()')
     if not isinstance(sobjs, list):
         log.debug('  incorrect arg: should be list of dicts.')
         return
-    sacus = [so for so in sobjs if so['_cname'] == 'Acu']
-    if not sacus:
+    if graph is None:
+        graph = componentz
+    merged, assembly_oids = get_serialized_acu_graph(sobjs, graph=graph,
+                                                     exact=False)
+    if not assembly_oids:
         log.debug('  serialized objs contain no Acus.')
         return
-    for sacu in sacus:
-        product_oid = sacu.get('assembly')
-        comp_oids = [a['component'] for a in sacus
-                     if a['assembly'] == product_oid]
-        if product_oid in comp_oids:
-            txt = 'is a component of itself.'
-            msg = 'product with oid "{}" {}'.format(
-                      product_oid, txt)
-            log.debug(msg)
-            return msg
-        comp_oids_1 = []
-        for comp_oid in comp_oids:
-            if comp_oid:
-                comp_oids_1 += [sacu['component'] for sacu in sacus
-                                if sacu['assembly'] == comp_oid]
-        if comp_oids_1:
-            comp_oids += comp_oids_1
-        else:
-            log.debug('  - no more levels for acu "{}".')
-        if product_oid in comp_oids_1:
-            txt = 'is a 2nd-level component of itself.'
-            msg = ' *** product with oid "{}" {}'.format(
-                      product_oid, txt)
-            log.debug(msg)
-            return msg
+    # any new cycle must include a serialized Acu, so it can be found by
+    # searching from the assemblies of the serialized Acus
+    cycles = find_cycles(merged, roots=assembly_oids)
+    if cycles:
+        # confirm them using the exact graph
+        merged, assembly_oids = get_serialized_acu_graph(sobjs, graph=graph)
+        cycles = find_cycles(merged, roots=assembly_oids)
+    if cycles:
+        ids = {so.get('oid'): so.get('id') for so in sobjs}
+        msg = format_cycles(cycles, get_id=ids.get)
+        log.debug(msg)
+        return msg
     log.debug('  no cycles found.')
 
-        # comps2 = []
-        # for comp in comps1:
-            # comps2 += [acu.component for acu in comp.components]
-        # if comps2:
-            # comps += comps2
-        # else:
-            # # log.debug('  - no more levels.')
-            # return
-        # if product.oid in [c.oid for c in comps2]:
-            # txt = 'is a 3nd-level component of itself.'
-            # msg = 'product {} (id: "{}" {}'.format(
-                      # product.oid, product.id or 'no id', txt)
-            # log.debug(msg)
-            # return msg
-        # # else:
-            # # log.debug('  - level 3 components ok.')
-        # comps3 = []
-        # for comp in comps2:
-            # comps3 += [acu.component for acu in comp.components]
-        # if comps3:
-            # comps += comps3
-        # else:
-            # # log.debug('  - no more levels.')
-            # return
-        # if product.oid in [c.oid for c in comps3]:
-            # txt = 'is a 4th-level component of itself.'
-            # msg = 'product {} (id: "{}" {}'.format(
-                      # product.oid, product.id or 'no id', txt)
-            # log.debug(msg)
-            # return msg
-        # else:
-            # # log.debug('no cycles')
-            # return
-
 
 def get_level_count(product):
     """
-    Get the number of levels of assembly for the specified product.
+    Get the number of levels of assembly for the specified product (from the
+    `assembly_metricz` cache, which is derived from `componentz`).  Until any
+    deferred startup work is done (`orb.ready`), `componentz` may not be
+    complete, so the product's Acus are traversed instead.
 
     Args:
         product (Product): the Product
     """
-    # log.debug('* get_level_count()')
     if not product:
-        # log.debug('  got null product.')
         return 0
-    if product.components:
-        levels = 2
-        comps = [acu.component for acu in product.components
+    ready = getattr(getattr(pangalactic.core, 'orb', None), 'ready', None)
+    if ready is not None and not ready.is_set():
+        return _get_acu_level_count(product)
+    return get_assembly_metrics(product.oid)[0]
+
+
+def _get_acu_level_count(product):
+    """
+    Get the number of levels of assembly for the specified product by
+    traversing its Acus, counting the levels of each sub-assembly only once
+    and ignoring the assembly of a component that closes a cycle (as
+    `get_assembly_metrics` does).
+    """
+    levels = {}
+    on_path = set()
+    todo = [(product, False)]
+    while todo:
+        p, expanded = todo.pop()
+        if p.oid in levels:
+            continue
+        comps = [acu.component
+                 for acu in getattr(p, 'components', None) or []
                  if acu.component is not None]
-        comps1 = []
+        if not expanded:
+            if p.oid in on_path:
+                continue
+            on_path.add(p.oid)
+            todo.append((p, True))
+            todo += [(comp, False) for comp in comps
+                     if comp.oid not in levels and comp.oid not in on_path]
+            continue
+        on_path.discard(p.oid)
+        levels[p.oid] = 1 + max([0] + [levels.get(comp.oid, 0)
+                                       for comp in comps])
+    return levels[product.oid]
+
+
+def get_assembly_oids(product_oid, graph=None):
+    """
+    Get the oids of all [known] components and Acus used at every level of
+    assembly of the specified product from a product structure graph.  Each
+    shared sub-assembly is expanded only once, and cycles are ignored.
+
+    Args:
+        product_oid (str): oid of the Product
+
+    Keyword Args:
+        graph (dict):  the product structure graph (default: the
+            `componentz` cache)
+
+    Returns:
+        tuple:  (list of component oids, list of Acu oids), in the order in
+            which they are found, level by level
+    """
+    graph = componentz if graph is None else graph
+    comp_oids = []
+    acu_oids = []
+    seen = {product_oid}
+    queue = [product_oid]
+    for oid in queue:
+        for comp in graph.get(oid) or []:
+            acu_oids.append(comp[1])
+            if comp[0] is not None and comp[0] not in seen:
+                seen.add(comp[0])
+                comp_oids.append(comp[0])
+                queue.append(comp[0])
+    return comp_oids, acu_oids
+
+
+def get_flat_bom(product_oid, graph=None):
+    """
+    Get the flattened bill of materials of the specified product:  the total
+    quantity of each [known] component used at every level of assembly (the
+    quantities of the Acus at each level are multiplied).  The flattened bom
+    of each sub-assembly is computed only once per call, and Acus that would
+    close a cycle are ignored.
+
+    Args:
+        product_oid (str): oid of the Product
+
+    Keyword Args:
+        graph (dict):  the product structure graph (default: the
+            `componentz` cache) -- tuples that have no `quantity` count as 1
+
+    Returns:
+        dict:  maps component oids to total quantities
+    """
+    graph = componentz if graph is None else graph
+    flat = {}
+    on_path = set()
+    todo = [(product_oid, False)]
+    while todo:
+        oid, expanded = todo.pop()
+        if oid in flat:
+            continue
+        comps = [comp for comp in graph.get(oid) or [] if comp[0] is not None]
+        if not expanded:
+            if oid in on_path:
+                continue
+            on_path.add(oid)
+            todo.append((oid, True))
+            todo += [(comp[0], False) for comp in comps
+                     if comp[0] not in flat and comp[0] not in on_path]
+            continue
+        on_path.discard(oid)
+        totals = {}
         for comp in comps:
-            if comp:
-                comps1 += [acu.component for acu in comp.components
-                           if acu.component]
-        if comps1:
-            levels += 1
-        comps2 = []
-        for comp in comps1:
-            if comp:
-                comps2 += [acu.component for acu in comp.components
-                           if acu.component]
-        if comps2:
-            levels += 1
-        comps3 = []
-        for comp in comps2:
-            if comp:
-                comps3 += [acu.component for acu in comp.components
-                           if acu.component]
-        if comps3:
-            levels += 1
-        comps4 = []
-        for comp in comps3:
-            if comp:
-                comps4 += [acu.component for acu in comp.components
-                           if acu.component]
-        if comps4:
-            levels += 1
-        comps5 = []
-        for comp in comps4:
-            if comp:
-                comps5 += [acu.component for acu in comp.components
-                           if acu.component]
-        if comps5:
-            levels += 1
-        comps6 = []
-        for comp in comps5:
-            if comp:
-                comps6 += [acu.component for acu in comp.components
-                           if acu.component]
-        if comps6:
-            levels += 1
-        # log.debug(f'  - {levels} levels')
-        return levels
-    else:
-        return 1
+            qty = getattr(comp, 'quantity', 1) or 1
+            totals[comp[0]] = totals.get(comp[0], 0) + qty
+            # (a component that closes a cycle is not in 'flat' yet)
+            for sub_oid, n in flat.get(comp[0], {}).items():
+                totals[sub_oid] = totals.get(sub_oid, 0) + qty * n
+        flat[oid] = totals
+    return flat[product_oid]
 
 
-def get_bom(product):
+def _get_objs(orb, oids):
+    """
+    Get the objects with the specified oids in one call to `orb.get`,
+    preserving the order of the oids.
+    """
+    objs = {obj.oid: obj for obj in orb.get(oids=oids)} if oids else {}
+    return [objs[oid] for oid in oids if oid in objs]
+
+
+def get_bom(product, orb=None):
     """
     Return a list (a.k.a. "Bill of Materials") of all [known] components used
-    at every level of assembly of the specified product.
+    at every level of assembly of the specified product.  Each component
+    appears once (see `get_flat_bom` for the quantities), shared
+    sub-assemblies are expanded only once, and cycles are ignored.
 
     Args:
         product (Product): the Product whose bom is to be computed
+
+    Keyword Args:
+        orb (UberORB or FastOrb):  if given, the bom is computed from the
+            `componentz` cache and the components are fetched with a single
+            call to `orb.get` (no Acus are loaded); otherwise the bom is
+            computed by traversing the product's Acus
     """
-    # NOTE: this will explode if assembly is circular!!
-    try:
-        if product:
-            comps = [acu.component for acu in product.components]
-            if comps:
-                comps = reduce(lambda x,y: x+y, [get_bom(c) for c in comps], comps)
-            return comps
-        return []
-    except:
-        log.debug("bom exploded ... cycle encountered.")
+    if not product:
         return []
+    if orb is not None:
+        return _get_objs(orb, get_assembly_oids(product.oid)[0])
+    return _get_assembly_objs(product)[0]
 
 
 def get_bom_oids(product):
@@ -298,7 +444,30 @@ def get_bom_oids(product):
                 if hasattr(p, 'oid')])
 
 
-def get_assembly(product):
+def _get_assembly_objs(product):
+    """
+    Traverse the Acus of a product level by level, expanding each shared
+    sub-assembly only once.
+
+    Returns:
+        tuple:  (list of components, list of Acus)
+    """
+    comps = []
+    acus = []
+    seen = {product.oid}
+    queue = [product]
+    for p in queue:
+        for acu in getattr(p, 'components', None) or []:
+            acus.append(acu)
+            comp = acu.component
+            if comp is not None and comp.oid not in seen:
+                seen.add(comp.oid)
+                comps.append(comp)
+                queue.append(comp)
+    return comps, acus
+
+
+def get_assembly(product, orb=None):
     """
     Return the product's assembly structure, including all Acu instances plus
     all [known] components used at every level of assembly of the specified
@@ -306,19 +475,105 @@ def get_assembly(product):
 
     Args:
         product (Product): the Product whose assembly is to be returned
+
+    Keyword Args:
+        orb (UberORB or FastOrb):  if given, the assembly is computed from the
+            `componentz` cache and its objects are fetched with a single call
+            to `orb.get`; otherwise it is computed by traversing the
+            product's Acus
     """
-    if product:
-        comps = get_bom(product)
-        base_acus = list(product.components)
-        acus = reduce(lambda x,y: x+y,
-                      [getattr(c, 'components', []) for c in comps],
-                      base_acus)
-        return comps + acus
-    return []
+    if not product:
+        return []
+    if orb is not None:
+        comp_oids, acu_oids = get_assembly_oids(product.oid)
+        return _get_objs(orb, comp_oids + acu_oids)
+    comps, acus = _get_assembly_objs(product)
+    return comps + acus
+
+
+class IdIndex(object):
+    """
+    An index of the `id` and `version` values of objects by class, used by
+    the orbs to check id / id + version uniqueness without fetching them
+    (see `orb.id_exists()`).  A blank version (including that of objects of
+    classes that are not versionable) is indexed as ''.
+
+    Attributes:
+        by_oid (dict):  maps each indexed oid to (cname, id, version)
+        by_cname (dict):  maps cname to a dict that maps each id to a dict
+            that maps each version to the number of objects with that id and
+            version
+    """
+    def __init__(self, rows=()):
+        """
+        Args:
+            rows (iterable):  (oid, cname, id, version) tuples
+        """
+        self.by_oid = {}
+        self.by_cname = {}
+        for oid, cname, id_value, version in rows:
+            self.add(oid, cname, id_value, version)
+
+    def add(self, oid, cname, id_value, version=''):
+        """
+        Add an object to the index, replacing any previous entry for its oid.
+        """
+        version = version or ''
+        if self.by_oid.get(oid) == (cname, id_value, version):
+            return
+        self.remove(oid)
+        self.by_oid[oid] = (cname, id_value, version)
+        versions = self.by_cname.setdefault(cname, {}).setdefault(id_value,
+                                                                  {})
+        versions[version] = versions.get(version, 0) + 1
+
+    def remove(self, oid):
+        """
+        Remove an object from the index (if it is indexed).
+        """
+        entry = self.by_oid.pop(oid, None)
+        if entry is None:
+            return
+        cname, id_value, version = entry
+        ids = self.by_cname[cname]
+        versions = ids[id_value]
+        versions[version] -= 1
+        if not versions[version]:
+            del versions[version]
+            if not versions:
+                del ids[id_value]
+
+    def exists(self, cname, id_value, version=None, oid=None):
+        """
+        Check whether an object of the specified class has the specified id
+        (and version, if one is specified).
+
+        Args:
+            cname (str):  class name
+            id_value (str):  the id
+
+        Keyword Args:
+            version (str):  the version (None -> any version; '' -> blank)
+            oid (str):  oid of an object to be ignored (e.g. the object being
+                edited)
+        """
+        versions = self.by_cname.get(cname, {}).get(id_value)
+        if not versions:
+            return False
+        if version is None:
+            n = sum(versions.values())
+        else:
+            version = version or ''
+            n = versions.get(version, 0)
+        entry = self.by_oid.get(oid)
+        if (entry and entry[:2] == (cname, id_value)
+            and (version is None or entry[2] == version)):
+            n -= 1
+        return n > 0
 
 
 def validate_all(fields_dict, cname, schema, view, required=None, idvs=None,
-                 ids=None, html=False):
+                 ids=None, html=False, orb=None):
     """
     Check a dict of form fields for minimum required fields and valid data.
 
@@ -334,26 +589,39 @@ def validate_all(fields_dict, cname, schema, view, required=None, idvs=None,
             PGXN_REQD are used) -- NOTE that a field in 'required' will not be
             validated if it is not also in 'view'
         idvs (list of tuples):  list of current (`id`, `version`) values to be
-            avoided
+            avoided (ignored if `orb` is specified)
         html (bool):  output msgs in a format suitable for embedding in html
             (e.g., "rich text" in a Qt text widget)
+        orb (Uberorb or FastOrb):  if specified, existing ids and versions
+            are looked up using `orb.id_exists()` (ignoring the object whose
+            oid is fields_dict['oid'], if any) rather than in `idvs`
     """
     msg_dict = OrderedDict()
     # field_names has the correct order -- use it for ordering output
     id_value = fields_dict.get('id')
-    idvs = idvs or [('', '')]
+    if orb is not None:
+        oid = fields_dict.get('oid')
+        def exists(*idv):
+            # a blank version is indexed as ''
+            version = (idv[1] or '') if len(idv) > 1 else None
+            return orb.id_exists(cname, idv[0], version=version, oid=oid)
+    else:
+        idvs = idvs or [('', '')]
+        def exists(*idv):
+            if len(idv) > 1:
+                return idv in idvs
+            return idv[0] in set([x[0] for x in idvs])
     if id_value:
         invalid = list(set(id_value) - ID_ALLOWED_CHARS)
         if 'version' in fields_dict:
             idv = (fields_dict.get('id'), fields_dict.get('version'))
-            if idv in idvs:
+            if exists(*idv):
                 msg = '{} with id + version '.format(cname)
                 msg += '"{}.v.{}" exists.'.format(idv[0], idv[1])
                 msg_dict['Duplicate id + version'] = msg
         elif cname != 'Port':
             # Ports are allowed to have duplicate ids
-            ids = set([idv[0] for idv in idvs])
-            if id_value in ids:
+            if exists(id_value):
                 msg_dict['Duplicate id'] = '{} with id "{}" exists.'.format(
                                                             cname, id_value)
         if cname == 'ParameterDefinition':